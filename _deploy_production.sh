@@ -91,8 +91,10 @@ case "$1" in
            python3.8 -c "
            from main import app
            from models import db
+           from db_migrations import apply_schema_upgrades
            with app.app_context():
                db.create_all()
+               apply_schema_upgrades()
                print('✅ Tabelle del database create con successo!')
            "
            echo -e "${GREEN}Inizialize DB completed!${NC}"
@@ -51,9 +51,51 @@ LimitNPROC=4096
 WantedBy=multi-user.target
 EOF
 
+# Collector daemon (only with COLLECTION_DAEMON=true in the app environment)
+COLLECTOR_SERVICE_NAME="${SERVICE_NAME}-collector"
+COLLECTOR_SERVICE_FILE="/etc/systemd/system/${COLLECTOR_SERVICE_NAME}.service"
+INSTALL_COLLECTOR="${INSTALL_COLLECTOR:-false}"
+
+if [ "$INSTALL_COLLECTOR" = "true" ]; then
+cat > "$COLLECTOR_SERVICE_FILE" << EOF
+[Unit]
+Description=Switch Log Analyzer - Collector Daemon
+After=network.target postgresql.service
+Wants=postgresql.service
+
+[Service]
+Type=simple
+User=$USER
+Group=$GROUP
+WorkingDirectory=$APP_DIR
+Environment=PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin
+Environment=PYTHONPATH=$APP_DIR
+ExecStart=$APP_DIR/venv/bin/python $APP_DIR/collector_daemon.py run
+
+# SIGTERM lets the running collection finish
+KillMode=mixed
+TimeoutStopSec=3600
+Restart=always
+RestartSec=10
+ReadWritePaths=$APP_DIR /var/log/nsdevlog /tmp /var/lib/containers
+
+LimitNOFILE=65536
+
+[Install]
+WantedBy=multi-user.target
+EOF
+chmod 644 "$COLLECTOR_SERVICE_FILE"
+fi
+
 # Set proper permissions
 chmod 644 "$SERVICE_FILE"
 sudo systemctl daemon-reload
 sudo systemctl enable $SERVICE_NAME
 sudo systemctl start $SERVICE_NAME
 sudo systemctl status $SERVICE_NAME
+
+if [ "$INSTALL_COLLECTOR" = "true" ]; then
+    sudo systemctl enable $COLLECTOR_SERVICE_NAME
+    sudo systemctl start $COLLECTOR_SERVICE_NAME
+    sudo systemctl status $COLLECTOR_SERVICE_NAME
+fi
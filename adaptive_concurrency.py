@@ -0,0 +1,154 @@
+"""
+Adaptive Concurrency for Switch Log Analyzer
+Decides how many switches a collection processes in parallel: starts small,
+adds a worker while aggregate throughput keeps improving and backs off when
+SSH, insert or connection pool latency rises (AIMD), with a per-site cap
+"""
+
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# A latency signal is congested once its recent average exceeds BACKOFF_RATIO x its
+# best value seen in this run and the floor below (ignores noise on tiny values)
+SIGNAL_FLOORS = {
+    'connect_seconds': 0.5,          # SSH connect + auth per switch
+    'insert_seconds_per_row': 0.002,  # DB insert time per inserted entry
+    'pool_wait_seconds': 0.05,        # Average wait for a pooled DB connection
+}
+
+# Weight of the newest sample in each signal's moving average
+EWMA_ALPHA = 0.5
+
+# Throughput must improve by this fraction between epochs to add a worker
+THROUGHPUT_GAIN = 0.05
+
+# Multiplicative decrease on congestion
+BACKOFF_FACTOR = 0.5
+
+# Inserts smaller than this say nothing about DB latency
+MIN_ROWS_FOR_INSERT_SIGNAL = 100
+
+
+def switch_site(switch_info: str) -> str:
+    """Site of a switches.conf entry (SITE:SWITCH:GEN)"""
+    return switch_info.split(':')[0] if ':' in switch_info else ''
+
+
+class _Signal:
+    def __init__(self, floor: float):
+        self.floor = floor
+        self.baseline = None
+        self.average = None
+
+    def add(self, value: float):
+        self.baseline = value if self.baseline is None else min(self.baseline, value)
+        self.average = value if self.average is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * self.average
+
+    def congested(self, ratio: float) -> bool:
+        return (self.average is not None and self.average > self.floor
+                and self.average > ratio * self.baseline)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit for one collection run (used from the dispatching thread only)
+
+    The caller starts a switch while has_slot() (skipping full_sites()) and
+    reports it with started(); finished() feeds each switch's timings back. The limit grows by one per epoch (as many
+    completions as the current limit) while bytes/s improves, and is halved
+    as soon as a latency signal is congested.
+    """
+
+    def __init__(self, min_workers: int, max_workers: int, max_per_site: int,
+                 initial_workers: Optional[int] = None, backoff_ratio: float = 2.0):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.max_per_site = max(1, max_per_site)
+        self.backoff_ratio = backoff_ratio
+        self.limit = min(self.max_workers, max(self.min_workers, initial_workers or self.min_workers))
+        self.signals = {name: _Signal(floor) for name, floor in SIGNAL_FLOORS.items()}
+        self.in_flight = 0
+        self.site_in_flight = Counter()
+        self.history = [self.limit]
+        self._start_epoch()
+        self._previous_throughput = None
+
+    @classmethod
+    def from_config(cls, switch_count: int) -> 'AdaptiveConcurrency':
+        max_workers = min(Config.COLLECTION_MAX_WORKERS, max(switch_count, 1))
+        return cls(Config.COLLECTION_MIN_WORKERS, max_workers, Config.COLLECTION_MAX_PER_SITE,
+                   Config.COLLECTION_INITIAL_WORKERS, Config.COLLECTION_BACKOFF_RATIO)
+
+    def _start_epoch(self):
+        self._epoch_started = time.monotonic()
+        self._epoch_bytes = 0
+        self._epoch_completions = 0
+
+    def _set_limit(self, limit: int, reason: str):
+        limit = min(self.max_workers, max(self.min_workers, limit))
+        if limit != self.limit:
+            logger.info(f"CONCURRENCY: {self.limit} -> {limit} workers ({reason})")
+            self.limit = limit
+            self.history.append(limit)
+        self._start_epoch()
+
+    def has_slot(self) -> bool:
+        return self.in_flight < self.limit
+
+    def full_sites(self) -> List[str]:
+        """Sites already at the per-site cap"""
+        return [site for site, count in self.site_in_flight.items() if count >= self.max_per_site]
+
+    def started(self, switch_info: str):
+        """Count a switch handed out by the caller (e.g. claimed from the work queue)"""
+        self.in_flight += 1
+        self.site_in_flight[switch_site(switch_info)] += 1
+
+    def finished(self, switch_info: str, timings: Optional[Dict], pool_wait_seconds: Optional[float] = None):
+        """Feed back one switch's timings (None when it failed before collecting) and adapt"""
+        self.in_flight -= 1
+        self.site_in_flight[switch_site(switch_info)] -= 1
+
+        timings = timings or {}
+        if timings.get('connect_seconds'):
+            self.signals['connect_seconds'].add(timings['connect_seconds'])
+        if timings.get('entries_inserted', 0) >= MIN_ROWS_FOR_INSERT_SIGNAL:
+            self.signals['insert_seconds_per_row'].add(timings['insert_seconds'] / timings['entries_inserted'])
+        if pool_wait_seconds is not None:
+            self.signals['pool_wait_seconds'].add(pool_wait_seconds)
+        self._epoch_bytes += timings.get('bytes_received', 0)
+        self._epoch_completions += 1
+
+        congested = [name for name, signal in self.signals.items() if signal.congested(self.backoff_ratio)]
+        if congested:
+            self._set_limit(int(self.limit * BACKOFF_FACTOR), f"congested: {', '.join(congested)}")
+            for name in congested:
+                # Re-measure at the new level instead of backing off again on stale averages
+                self.signals[name].average = None
+            self._previous_throughput = None
+            return
+
+        if self._epoch_completions < self.limit:
+            return
+        throughput = self._epoch_bytes / max(time.monotonic() - self._epoch_started, 1e-6)
+        previous = self._previous_throughput
+        self._previous_throughput = throughput
+        if previous is None or throughput > previous * (1 + THROUGHPUT_GAIN):
+            self._set_limit(self.limit + 1, f"throughput {throughput / 1024:.1f} KB/s")
+        else:
+            self._start_epoch()
+
+    def info(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'min_workers': self.min_workers,
+            'max_workers': self.max_workers,
+            'max_per_site': self.max_per_site,
+            'history': list(self.history),
+        }
@@ -0,0 +1,55 @@
+"""
+Flask Application Factory for Switch Log Analyzer
+Builds the app with its configuration and database only: main.py adds the web
+routes, caching and metrics on top, collector_daemon.py uses it as it is.
+"""
+
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+from flask import Flask
+
+from config import Config
+from metrics import TimedQueuePool, instrument_engine
+from models import db
+
+# Load environment variables from .env file
+load_dotenv()
+
+_app: Optional[Flask] = None
+_app_lock = threading.Lock()
+
+
+def create_app() -> Flask:
+    """New app with the configuration and an instrumented database engine"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+
+    # Database configuration with optimized connection pooling
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://localhost/switch_analyzer')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'pool_timeout': 30,
+        'max_overflow': 20,
+        'poolclass': TimedQueuePool  # QueuePool reporting checkout waits to /metrics
+    }
+
+    # Initialize database
+    db.init_app(app)
+    with app.app_context():
+        instrument_engine(db.engine)
+    return app
+
+
+def get_app() -> Flask:
+    """The process-wide app, created on first use"""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+        return _app
@@ -0,0 +1,347 @@
+"""
+Async Collection Engine for Switch Log Analyzer
+asyncio alternative to the thread-per-switch drain (COLLECTION_ENGINE=asyncio):
+hundreds of asyncssh sessions multiplexed on one event loop, bounded by a
+session limit and per-site semaphores. Parsing and ingest keep the thread
+engine's contract: each context's output goes through parse_context_output
+(in the parse pool when enabled) and rows are stored by store_switch_rows,
+on a small thread pool so the loop never blocks on the database.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+try:
+    import asyncssh
+except ImportError:  # Optional: only needed with COLLECTION_ENGINE=asyncio
+    asyncssh = None
+
+from capture_archive import capture_archive
+from config import Config
+from collection_progress import CollectionProgress, collection_progress
+from final_working_collector import (_failed_result, last_entry_timestamp, store_switch_rows, switch_failed,
+                                     sync_remote_progress)
+from models import db
+from parse_pool import ParsedOutput, parse_context_output, parse_pool
+from simple_switch_collector import SimpleLogCollector
+from work_queue import (POLL_INTERVAL, claim_task, complete_task, finalize_collection, lease_keeper,
+                        requeue_expired, unfinished_task_count, worker_id)
+
+logger = logging.getLogger(__name__)
+
+# Same completion rules as SimpleLogCollector.collect_from_context_simple
+SHELL_SETTLE_SECONDS = 2     # Longest wait for the first prompt before sending the command
+IDLE_TIMEOUT = 30            # No output for this long: assume the command finished
+COMMAND_MAX_SECONDS = 300    # Absolute limit per context
+FINAL_DRAIN_SECONDS = 0.5    # Output still arriving after summary and prompt
+CONTEXT_DELAY = 1            # Pause between contexts, as the thread collector does
+READ_SIZE = 8192
+
+
+def _is_prompt(text: str) -> bool:
+    """Brocade prompt (NAME:FID128:user>) on the last line of text"""
+    line = text.rstrip().rsplit('\n', 1)[-1].strip()
+    return ':FID128:' in line and line.endswith('>')
+
+
+class AsyncLogCollector:
+    """asyncssh counterpart of SimpleLogCollector's SSH side: one connection, one shell per context"""
+
+    def __init__(self, username: str, password: str, progress: Optional[CollectionProgress] = None,
+                 port: int = 22):
+        self.username = username
+        self.password = password
+        self.progress = progress
+        self.port = port
+        self.timings = SimpleLogCollector._empty_timings()
+        self.contexts = [1, 2, 3, 4, 5, 128]
+
+    async def _read(self, stream, timeout: float) -> bytes:
+        """Next chunk, b'' at EOF; raises asyncio.TimeoutError when nothing arrives in time"""
+        return await asyncio.wait_for(stream.read(READ_SIZE), timeout)
+
+    async def collect_from_context(self, conn, switch_name: str, context: int) -> str:
+        """Output of nsdevlog --show for one context ('' when it failed)"""
+        loop = asyncio.get_running_loop()
+        wait_start = time.perf_counter()
+        received = 0
+        output = []
+        try:
+            async with conn.create_process(term_type='vt100', encoding=None) as process:
+                # Skip the banner: up to the first prompt, or SHELL_SETTLE_SECONDS
+                banner = ''
+                settle_until = loop.time() + SHELL_SETTLE_SECONDS
+                while not _is_prompt(banner) and loop.time() < settle_until:
+                    try:
+                        chunk = await self._read(process.stdout, settle_until - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    if not chunk:
+                        break
+                    banner += chunk.decode('utf-8', errors='ignore')
+
+                cmd = f'fosexec --fid {context} -cmd "nsdevlog --show"'
+                process.stdin.write(f'{cmd}\n'.encode('utf-8'))
+
+                has_summary = False
+                tail = ''
+                deadline = loop.time() + COMMAND_MAX_SECONDS
+                while True:
+                    timeout = min(IDLE_TIMEOUT, deadline - loop.time())
+                    if timeout <= 0:
+                        logger.warning(f"ASYNC: {switch_name} ctx {context}: maximum time reached, stopping")
+                        break
+                    try:
+                        data = await self._read(process.stdout, timeout)
+                    except asyncio.TimeoutError:
+                        logger.warning(f"ASYNC: {switch_name} ctx {context}: no activity for "
+                                       f"{timeout:.0f}s, assuming completion")
+                        break
+                    if not data:
+                        break
+                    received += len(data)
+                    if self.progress:
+                        self.progress.add_bytes(switch_name, context, len(data))
+                    chunk = data.decode('utf-8', errors='ignore')
+                    output.append(chunk)
+
+                    # Markers may be split across chunks: look at the recent tail
+                    tail = (tail + chunk)[-1024:]
+                    has_summary = has_summary or 'Total number of' in tail
+                    if has_summary and _is_prompt(tail):
+                        # Collect any remaining data
+                        while True:
+                            try:
+                                data = await self._read(process.stdout, FINAL_DRAIN_SECONDS)
+                            except asyncio.TimeoutError:
+                                break
+                            if not data:
+                                break
+                            received += len(data)
+                            if self.progress:
+                                self.progress.add_bytes(switch_name, context, len(data))
+                            output.append(data.decode('utf-8', errors='ignore'))
+                        break
+            return ''.join(output)
+
+        except Exception as e:
+            logger.error(f"ASYNC: {switch_name} ctx {context}: collection failed: {e}")
+            if self.progress:
+                self.progress.add_error(switch_name, str(e), context)
+            return ''
+
+        finally:
+            self.timings['contexts'][str(context)] = {
+                'wait_seconds': round(time.perf_counter() - wait_start, 3),
+                'bytes': received,
+            }
+
+    async def collect_switch_rows(self, switch_info: str, parse: Callable,
+                                  since: Optional[datetime] = None) -> ParsedOutput:
+        """
+        Read every context of a switch, parsing each one with parse (an async
+        callable taking parse_context_output's arguments) while the next is read;
+        rows newer than since, newest first
+        """
+        self.timings = SimpleLogCollector._empty_timings()
+        parts = switch_info.split(':')
+        site = parts[0]
+        switch_address = parts[1] if len(parts) > 1 else switch_info
+        generation = parts[2] if len(parts) > 2 else 'gen7'
+        session = uuid.uuid4().hex  # Groups this run's contexts in the capture archive
+        loop = asyncio.get_running_loop()
+        parses = []
+        captures = []
+
+        try:
+            connect_start = time.perf_counter()
+            conn = await asyncio.wait_for(
+                asyncssh.connect(switch_address, port=self.port, username=self.username,
+                                 password=self.password, known_hosts=None, client_keys=None,
+                                 agent_path=None, preferred_auth='password,keyboard-interactive'),
+                timeout=30)
+            self.timings['connect_seconds'] = time.perf_counter() - connect_start
+            async with conn:
+                for i, context in enumerate(self.contexts):
+                    if i:
+                        await asyncio.sleep(CONTEXT_DELAY)
+                    if self.progress:
+                        self.progress.context_started(switch_address, context)
+                    raw_output = await self.collect_from_context(conn, switch_address, context)
+                    # Compression and the append run off the loop
+                    captures.append(loop.run_in_executor(None, capture_archive.append, session, site,
+                                                         switch_address, generation, context, raw_output))
+                    args = (raw_output, site, switch_address, context, generation, since)
+                    parses.append((context, asyncio.ensure_future(parse(*args))))
+        except Exception as e:
+            logger.error(f"ASYNC: Failed to collect from {switch_info}: {e}")
+            if self.progress:
+                self.progress.add_error(switch_address, str(e))
+
+        rows = []
+        entries = 0
+        parse_seconds = 0.0
+        lookup_seconds = 0.0
+        errors = []
+        for context, future in parses:
+            try:
+                parsed = await future
+            except Exception as e:
+                logger.error(f"PARSE: {switch_address} context {context} failed: {e}")
+                if self.progress:
+                    self.progress.add_error(switch_address, f"Parse failed: {e}", context)
+                continue
+            if self.progress:
+                self.progress.context_parsed(switch_address, context, parsed.entries)
+            rows.extend(parsed.rows)
+            entries += parsed.entries
+            parse_seconds += parsed.parse_seconds
+            lookup_seconds += parsed.lookup_seconds
+            errors.extend(parsed.errors)
+            self.timings['contexts'][str(context)]['entries'] = parsed.entries
+
+        await asyncio.gather(*captures)
+        rows.sort(key=lambda row: row.timestamp, reverse=True)
+        return ParsedOutput(rows, entries, parse_seconds, lookup_seconds, errors)
+
+
+def _parse_blocking(*args) -> ParsedOutput:
+    """parse_context_output in the parse pool when enabled, otherwise in the calling thread"""
+    if parse_pool.enabled:
+        return parse_pool.result(parse_pool.submit(*args), args)
+    return parse_context_output(*args)
+
+
+class AsyncCollectionEngine:
+    """Claims work queue tasks and runs them as coroutines on one event loop"""
+
+    def __init__(self, username: str, password: str, app, progress: Optional[CollectionProgress] = None,
+                 max_sessions: Optional[int] = None, max_per_site: Optional[int] = None,
+                 db_threads: Optional[int] = None, port: int = 22):
+        self.username = username
+        self.password = password
+        self.app = app
+        self.progress = progress or collection_progress
+        self.max_sessions = max_sessions or Config.COLLECTION_ASYNC_MAX_SESSIONS
+        self.max_per_site = max_per_site or Config.COLLECTION_ASYNC_MAX_PER_SITE
+        self.port = port
+        self.owner = worker_id()
+        # Database work (claims, last timestamps, inserts) and parsing run off the loop
+        self.db_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=db_threads or Config.COLLECTION_ASYNC_DB_THREADS, thread_name_prefix='async-db')
+        self.parse_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(parse_pool.processes, 2), thread_name_prefix='async-parse')
+        self.site_slots = None
+
+    async def _db(self, func, *args):
+        """Run func(*args) in an application context on the database threads"""
+        def call():
+            with self.app.app_context():
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, call)
+
+    async def _parse(self, *args) -> ParsedOutput:
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, _parse_blocking, *args)
+
+    def full_sites(self):
+        return [site for site, slots in self.site_slots.items() if slots.locked()]
+
+    async def process_switch(self, task: Dict) -> Dict:
+        """Async process_single_switch: same progress, parsing, ingest and result"""
+        switch_name = task['switch_name']
+        collection_id = task['collection_id']
+        self.progress.switch_started(switch_name)
+        started_at = datetime.utcnow()
+        switch_start = time.perf_counter()
+        collector = AsyncLogCollector(self.username, self.password, progress=self.progress, port=self.port)
+        try:
+            since = await self._db(last_entry_timestamp, switch_name)
+            parsed = await collector.collect_switch_rows(task['switch_info'], self._parse, since)
+        except Exception as e:
+            return await self._db(switch_failed, switch_name, collection_id, str(e), self.progress,
+                                  started_at, switch_start, collector.timings)
+        return await self._db(store_switch_rows, switch_name, collection_id, parsed, collector.timings,
+                              self.progress, started_at, switch_start, task['id'])
+
+    async def run_task(self, task: Dict) -> Dict:
+        site = task['switch_info'].split(':')[0]
+        async with self.site_slots[site]:
+            try:
+                result = await self.process_switch(task)
+            except Exception as e:
+                result = _failed_result(task['switch_info'], f"Session failed: {e}")
+        lease_keeper.release(task['id'])
+        if await self._db(complete_task, task['id'], self.owner, result):
+            await self._db(finalize_collection, task['collection_id'])
+        return result
+
+    async def drain(self, collection_id: Optional[str] = None) -> Dict:
+        """Same semantics as drain_collection_tasks, with up to max_sessions switches at once"""
+        self.site_slots = defaultdict(lambda: asyncio.Semaphore(self.max_per_site))
+        summary = {'completed': 0, 'failed': 0, 'inserted': 0}
+        running = set()
+        last_poll = 0.0
+
+        while True:
+            # Claim while sessions are free; tasks of sites at their limit are left for later
+            while len(running) < self.max_sessions:
+                task = await self._db(claim_task, self.owner, collection_id, self.full_sites())
+                if task is None:
+                    break
+                lease_keeper.hold(task['id'])
+                running.add(asyncio.ensure_future(self.run_task(task)))
+                # Take the site slot now so the next claim sees it
+                await asyncio.sleep(0)
+            self.progress.set_concurrency(len(running))
+
+            if not running and (collection_id is None or not await self._db(unfinished_task_count, collection_id)):
+                break
+
+            if collection_id and time.monotonic() - last_poll >= POLL_INTERVAL:
+                last_poll = time.monotonic()
+                await self._db(requeue_expired)
+                await self._db(sync_remote_progress, collection_id, self.owner, self.progress)
+
+            if not running:
+                # The remaining tasks are held by other processes
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            done, running = await asyncio.wait(running, timeout=POLL_INTERVAL,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result['success']:
+                    summary['completed'] += 1
+                    summary['inserted'] += result['inserted_count']
+                    logger.info(f"✓ {result['switch_name']}: {result['inserted_count']} new entries")
+                else:
+                    summary['failed'] += 1
+                    logger.error(f"✗ {result['switch_name']}: {result['error']}")
+
+        return summary
+
+    def close(self):
+        self.db_executor.shutdown(wait=True)
+        self.parse_executor.shutdown(wait=True)
+
+
+def drain_collection_tasks_async(username: str, password: str, app, collection_id: Optional[str] = None,
+                                 progress: Optional[CollectionProgress] = None) -> Dict:
+    """drain_collection_tasks with the asyncio engine; runs its own event loop in the calling thread"""
+    if asyncssh is None:
+        raise RuntimeError("COLLECTION_ENGINE=asyncio requires the asyncssh package")
+    lease_keeper.start(db.engine)
+    engine = AsyncCollectionEngine(username, password, app, progress, port=Config.SWITCH_SSH_PORT)
+    logger.info(f"ASYNC: Draining tasks with up to {engine.max_sessions} sessions "
+                f"({engine.max_per_site} per site)")
+    try:
+        return asyncio.run(engine.drain(collection_id))
+    finally:
+        engine.close()
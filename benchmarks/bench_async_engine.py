@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Async Engine Benchmark
+Collects from N fake switches served by a local asyncssh server and reports
+wall time and peak memory of the thread-per-switch collector (paramiko,
+SimpleLogCollector) versus the asyncio engine (async_collector.py).
+
+Usage:
+    python benchmarks/bench_async_engine.py --switches 50 200 500 --engines asyncio threads [--max-per-site 50]
+
+The switches are loopback addresses of one fake_switch_server.py process, so
+the switch name in the FOS prompt differs per connection. Each engine run is a
+separate process, so peak RSS is its own. The asyncio engine keeps its per-site
+session limit (COLLECTION_ASYNC_MAX_PER_SITE unless --max-per-site is given).
+No database is used: the benchmark stops after parsing and enrichment.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from config import Config  # noqa: E402
+from fake_switch_server import CONTEXTS, loopback_switches  # noqa: E402
+
+SITES = 4
+
+
+# --- Engine runs (one process each) ----------------------------------------
+
+def run_threads(switches: list, port: int) -> int:
+    from simple_switch_collector import SimpleLogCollector
+
+    def collect(switch_info):
+        return len(SimpleLogCollector('admin', 'password', port=port).collect_from_switch_simple(switch_info))
+
+    with ThreadPoolExecutor(max_workers=len(switches)) as executor:
+        return sum(executor.map(collect, switches))
+
+
+def run_asyncio(switches: list, port: int, max_per_site: int) -> int:
+    from async_collector import AsyncLogCollector, _parse_blocking
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        parse_executor = ThreadPoolExecutor(max_workers=2)
+        site_slots = {}
+
+        async def parse(*args):
+            return await loop.run_in_executor(parse_executor, _parse_blocking, *args)
+
+        async def collect(switch_info):
+            slots = site_slots.setdefault(switch_info.split(':')[0], asyncio.Semaphore(max_per_site))
+            async with slots:
+                parsed = await AsyncLogCollector('admin', 'password', port=port).collect_switch_rows(
+                    switch_info, parse)
+            return parsed.entries
+
+        counts = await asyncio.gather(*(collect(s) for s in switches))
+        parse_executor.shutdown()
+        return sum(counts)
+
+    return asyncio.run(main())
+
+
+def run_engine(engine: str, count: int, port: int, max_per_site: int) -> dict:
+    import logging
+    logging.basicConfig(level=logging.ERROR)
+    switches = loopback_switches(count, SITES)
+    # Context files and the device index go to the temporary working directory
+    import parse_pool  # noqa: F401  (imports before the baseline)
+    import simple_switch_collector  # noqa: F401
+    import asyncssh  # noqa: F401
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    entries = run_threads(switches, port) if engine == 'threads' else run_asyncio(switches, port, max_per_site)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'seconds': round(elapsed, 1), 'entries': entries,
+            'peak_rss_mb': round(peak_kb / 1024, 1), 'rss_growth_mb': round((peak_kb - baseline_kb) / 1024, 1)}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the asyncio engine against thread-per-switch')
+    parser.add_argument('--switches', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--engines', nargs='+', default=['asyncio', 'threads'], choices=['asyncio', 'threads'])
+    parser.add_argument('--lines', type=int, default=200, help='Entries per context')
+    parser.add_argument('--chunk-bytes', type=int, default=5500, help='Bytes per output chunk (~50 lines)')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='Seconds between chunks')
+    parser.add_argument('--max-per-site', type=int, default=Config.COLLECTION_ASYNC_MAX_PER_SITE,
+                        help='asyncio sessions per site (default COLLECTION_ASYNC_MAX_PER_SITE)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--run', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        engine, count, port, max_per_site = args.run
+        with open(os.devnull, 'w') as devnull:
+            real_stdout, sys.stdout = sys.stdout, devnull  # Year deduction prints
+            try:
+                result = run_engine(engine, int(count), int(port), int(max_per_site))
+            finally:
+                sys.stdout = real_stdout
+        print(json.dumps(result))
+        return
+
+    port = free_port()
+    script = os.path.abspath(__file__)
+    server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, '..', 'fake_switch_server.py'),
+                               '--port', str(port), '--switches', str(max(args.switches)), '--sites', str(SITES),
+                               '--entries', str(args.lines), '--chunk-bytes', str(args.chunk_bytes),
+                               '--chunk-delay', str(args.chunk_delay)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    report = {'lines_per_context': args.lines, 'contexts': len(CONTEXTS), 'sites': SITES,
+              'asyncio_max_per_site': args.max_per_site, 'results': {}}
+    try:
+        server.stdout.readline()  # ready
+        with tempfile.TemporaryDirectory() as workdir:
+            for count in args.switches:
+                for engine in args.engines:
+                    run = subprocess.run([sys.executable, script, '--run', engine, str(count), str(port),
+                                          str(args.max_per_site)],
+                                         cwd=workdir, capture_output=True, text=True)
+                    if run.returncode != 0:
+                        print(run.stderr[-2000:], file=sys.stderr)
+                        raise SystemExit(f"{engine} run with {count} switches failed")
+                    result = json.loads(run.stdout.strip().splitlines()[-1])
+                    report['results'].setdefault(str(count), {})[engine] = result
+                    print(f"  {count} switches, {engine}: {result}", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
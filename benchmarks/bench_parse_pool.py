@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Parse Pool Benchmark
+Generates synthetic "nsdevlog --show" output for a burst of large switches
+returning at once and measures how long parsing and enrichment take with the
+collector threads alone (one GIL) versus the parse pool (parse_pool.py).
+
+Usage:
+    python benchmarks/bench_parse_pool.py --switches 24 --lines 20000 --processes 2 4 8
+
+Runs in a temporary directory (context files and an empty device index), so no
+database or switch is needed.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+EVENTS = ['Device Add', 'Device Del', 'Port Online', 'Port Offline', 'FLOGI', 'PLOGI', 'Device Login']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+CONTEXTS = [1, 2, 3, 4, 5, 128]
+
+# Devices logged in per switch (the same WWNs recur, as on a real fabric)
+DEVICES_PER_SWITCH = 256
+
+
+def random_wwn(rng: random.Random) -> str:
+    return ':'.join(f"{rng.randrange(256):02x}" for _ in range(8))
+
+
+def synthetic_output(lines: int, devices: list, rng: random.Random) -> str:
+    """One context's output: header, entries oldest first (crossing a year boundary), summary, prompt"""
+    out = ['Date/Time                   Slot/Port  PID       Port WWN                 Node WWN                 Event',
+           '=' * 110]
+    month = rng.randrange(12)
+    for i in range(lines):
+        if i and i % max(1, lines // 14) == 0:
+            month = (month + 1) % 12
+        slot_port, pid, port_wwn, node_wwn = rng.choice(devices)
+        out.append(f"{rng.choice(DAYS)} {MONTHS[month]} {rng.randint(1, 28):02d} "
+                   f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}.{rng.randrange(1000):03d}  "
+                   f"{slot_port}  {pid}  {port_wwn}  {node_wwn}  {rng.choice(EVENTS)}")
+    out.append(f"Total number of Entries displayed = {lines}")
+    out.append('bench_sw:FID128:admin>')
+    return '\n'.join(out)
+
+
+def run_threads(jobs: list, threads: int) -> float:
+    """Parse every context in collector-like threads (COLLECTION_PARSE_PROCESSES=0)"""
+    from parse_pool import parse_context_output
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda args: parse_context_output(*args), jobs))
+    elapsed = time.perf_counter() - start
+    assert sum(len(r.rows) for r in results) == sum(r.entries for r in results)
+    return elapsed
+
+
+def run_pool(jobs: list, threads: int, processes: int) -> float:
+    """Same burst with collector threads handing the output to a parse pool"""
+    from parse_pool import ParsePool
+
+    pool = ParsePool(processes)
+    # Start the processes (and their imports) before timing
+    list(pool.result(pool.submit(*job), job) for job in jobs[:processes])
+
+    def parse(args):
+        return pool.result(pool.submit(*args), args)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(parse, jobs))
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    assert sum(len(r.rows) for r in results) == sum(r.entries for r in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing in threads vs the parse pool')
+    parser.add_argument('--switches', type=int, default=24)
+    parser.add_argument('--lines', type=int, default=5000, help='Entries per context')
+    parser.add_argument('--threads', type=int, default=8, help='Collector threads returning at once')
+    parser.add_argument('--processes', type=int, nargs='+', default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    rng = random.Random(args.seed)
+    jobs = []
+    for i in range(args.switches):
+        devices = [(f"{rng.randrange(12)}/{rng.randrange(48)}", f"0x{rng.randrange(1 << 24):06x}",
+                    random_wwn(rng), random_wwn(rng)) for _ in range(DEVICES_PER_SWITCH)]
+        for context in CONTEXTS:
+            jobs.append((synthetic_output(args.lines, devices, rng), 'bench', f"bench_sw{i:02d}", context,
+                         'gen7', None))
+    report = {'switches': args.switches, 'contexts': len(jobs), 'entries': len(jobs) * args.lines,
+              'threads': args.threads, 'cpu_count': os.cpu_count(), 'results': {}}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # Context files and device_lookup.db go here
+        # The parser reports year deduction on stdout (pool processes too); keep it out of the report
+        sys.stdout.flush()
+        real_stdout = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        try:
+            baseline = run_threads(jobs, args.threads)
+            report['results']['threads'] = {'seconds': round(baseline, 2),
+                                            'entries_per_second': round(report['entries'] / baseline)}
+            print(f"  threads: {baseline:.2f}s", file=sys.stderr)
+            for processes in sorted(set(args.processes)):
+                elapsed = run_pool(jobs, args.threads, processes)
+                report['results'][f"pool_{processes}"] = {
+                    'seconds': round(elapsed, 2),
+                    'entries_per_second': round(report['entries'] / elapsed),
+                    'speedup': round(baseline / elapsed, 2),
+                }
+                print(f"  pool {processes}: {elapsed:.2f}s ({baseline / elapsed:.2f}x)", file=sys.stderr)
+        finally:
+            sys.stdout.flush()
+            os.dup2(real_stdout, 1)
+            os.close(real_stdout)
+            os.close(devnull)
+
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Repeatable measurements of every ingest and query stage plus the whole
+pipeline, stored as JSON so runs can be compared against a baseline.
+
+Stages:
+    parse     parse_log_line and parse_log_output_with_verification
+    years     fix_timestamps_with_years
+    lookup    device index build from device_port.json, cold and warm lookups
+    insert    store_switch_rows into log_entries (rollups included)
+    search    /api/db/search and /api/db/stats on the log_entries fixture
+    export    /api/db/export as CSV and NDJSON
+    pipeline  run_simple_collection against fake_switch_server.py (SSH, parse, lookup, insert)
+
+Usage:
+    python benchmarks/bench_suite.py generate-nsdevlog --switches 8 --output-dir /tmp/nsdevlog
+    DATABASE_URL=postgresql://... python benchmarks/bench_suite.py generate-db --rows 5000000
+    DATABASE_URL=postgresql://... python benchmarks/bench_suite.py run --output baseline.json
+    DATABASE_URL=postgresql://... python benchmarks/bench_suite.py run --baseline baseline.json
+    python benchmarks/bench_suite.py compare baseline.json current.json --tolerance 0.15
+    DATABASE_URL=postgresql://... python benchmarks/bench_suite.py drop-db
+
+parse, years and lookup need no database. The other stages write to
+log_entries (bench_* switches, loopback addresses for the pipeline) and clean
+up after themselves; run them against a scratch database. The fixture stays
+until drop-db so search and export timings are comparable between runs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, REPO_DIR)
+
+from fake_switch_server import CONTEXTS, FakeSwitchServer, loopback_switches  # noqa: E402
+
+STAGES = ['parse', 'years', 'lookup', 'insert', 'search', 'export', 'pipeline']
+DATABASE_STAGES = {'insert', 'search', 'export', 'pipeline'}
+
+# Switch names per data set, so cleanup never touches real switches
+CORPUS_PREFIX = 'bench_sw'
+FIXTURE_PREFIX = 'bench_fx'
+INSERT_PREFIX = 'bench_in'
+FIXTURE_COLLECTION = 'bench-fixture'
+
+# Fixture WWNs are 10:00:00:10:9b:xx:xx:xx, one per device number
+FIXTURE_WWN_BASE = 0x100000109b000000
+FIXTURE_DEVICES = 200000
+
+# Metric name suffix -> True when higher is better; other metrics are informational
+METRIC_DIRECTIONS = {'_per_second': True, '_ms': False, '_seconds': False}
+
+# /api/db/search query strings timed by the search stage (fixture values)
+SEARCH_CASES = {
+    'newest_page': {},
+    'switch_week': {'switches': f"{FIXTURE_PREFIX}00", 'date_from': 'DAYS_AGO_7'},
+    'wwn_exact': {'wwn': '10:00:00:10:9b:00:12:34'},
+    'wwn_prefix': {'wwn': '10:00:00:10:9b:01'},
+    'alias': {'alias': 'HOST_01234'},
+    'event': {'event': 'Device Del'},
+    'fulltext': {'q': 'Offline'},
+    'deep_page': {'page': '200'},
+    'facets': {'switches': f"{FIXTURE_PREFIX}01", 'facets': 'switch_name,context,event_type'},
+}
+
+
+# --- Generators ------------------------------------------------------------
+
+def corpus_server(entries: int, devices: int, seed: int) -> FakeSwitchServer:
+    """Fake switch output generator (not listening) shared by the offline stages"""
+    return FakeSwitchServer(entries=entries, devices=devices, seed=seed)
+
+
+def nsdevlog_corpus(server: FakeSwitchServer, switches: int) -> list:
+    """[(switch_name, context, raw nsdevlog output)] for switches bench_sw00.."""
+    corpus = []
+    for i in range(switches):
+        switch_name = f"{CORPUS_PREFIX}{i:02d}"
+        for context in CONTEXTS:
+            text, _ = server.render(switch_name, context)
+            corpus.append((switch_name, context, text + f"{switch_name}:FID128:admin> "))
+    return corpus
+
+
+def device_records(server: FakeSwitchServer, switches: dict) -> list:
+    """
+    device_port.json records for the devices of switches ({pSwitch: fake switch name});
+    every eighth device is an NPIV login behind the previous one
+    """
+    records = []
+    for pswitch, switch_name in switches.items():
+        devices = server.switch_devices(switch_name)
+        for i, (slot_port, _, port_wwn, _) in enumerate(devices):
+            slot, port = slot_port.split('/')
+            physical = devices[i - 1][2] if i % 8 == 7 else port_wwn
+            records.append({'pSwitch': pswitch, 'slotNumber': int(slot), 'portNumber': int(port),
+                            'wwn': port_wwn.upper(), 'physicalPortWwn': physical.upper(),
+                            'zoneAlias': f"{pswitch}_HOST_{i:04d}",
+                            'deviceSymbolicName': f"Server-{i:04d} HBA port", 'symbolicName': None})
+    return records
+
+
+def write_device_port_json(records: list, path: str = 'device_port.json'):
+    with open(path, 'w') as f:
+        json.dump(records, f)
+
+
+def generate_nsdevlog(args):
+    """Write the corpus as one text file per switch context, plus its device_port.json"""
+    server = corpus_server(args.entries, args.devices, args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+    corpus = nsdevlog_corpus(server, args.switches)
+    for switch_name, context, text in corpus:
+        with open(os.path.join(args.output_dir, f"{switch_name}_ctx{context}.txt"), 'w') as f:
+            f.write(text)
+    write_device_port_json(device_records(server, {name: name for name, _, _ in corpus[::len(CONTEXTS)]}),
+                           os.path.join(args.output_dir, 'device_port.json'))
+    print(f"Wrote {len(corpus)} context outputs to {args.output_dir}", file=sys.stderr)
+
+
+def generate_db(args):
+    """Fill log_entries with the bench_fx* fixture in generate_series batches, rollups included"""
+    from sqlalchemy import text
+    from models import db
+    from partitioning import partition_manager
+    from search_cache import notify_log_entries_changed
+    from wwn_utils import wwn_to_db
+
+    app = load_app()
+    now = datetime.utcnow().replace(microsecond=0)
+    span_seconds = args.days * 86400
+    with app.app_context():
+        if partition_manager.is_partitioned():
+            partition_manager.ensure_partitions(oldest=now - timedelta(days=args.days))
+        with db.engine.begin() as conn:
+            existing = conn.execute(text("SELECT count(*) FROM log_entries WHERE collection_id = :c"),
+                                    {'c': FIXTURE_COLLECTION}).scalar()
+        if existing:
+            raise SystemExit(f"Fixture already present ({existing} rows), run drop-db first")
+
+        # Rows spread evenly over the span, newest first; ~FIXTURE_DEVICES devices recur
+        for start in range(0, args.rows, args.batch_size):
+            stop = min(start + args.batch_size, args.rows)
+            with db.engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO log_entries (timestamp, switch_name, context, event_type, wwn, wwn_int,
+                                             port_info, raw_line, alias, node_symbol, collection_id, created_at)
+                    SELECT ts, sw, ctx, ev, w, :wwn_int_base + d, pi,
+                           to_char(ts, 'Dy Mon DD HH24:MI:SS.MS') || '  ' || pi || '  0x' || lpad(to_hex(d % 65536), 6, '0')
+                               || '  ' || w || '  ' || w || '  ' || ev,
+                           'HOST_' || lpad(d::text, 6, '0'),
+                           'Server-' || lpad(d::text, 6, '0') || ' HBA port',
+                           :collection_id, :now
+                    FROM (
+                        SELECT g,
+                               :now - make_interval(secs => g::double precision * :span / :rows) AS ts,
+                               :prefix || lpad((g % :switches)::text, 2, '0') AS sw,
+                               (ARRAY[1, 2, 3, 4, 5, 128])[1 + g % 6] AS ctx,
+                               (ARRAY['Device Add', 'Device Del', 'Port Online', 'Port Offline',
+                                      'FLOGI', 'FDISC', 'PLOGI', 'Zone Change'])[1 + g % 8] AS ev,
+                               (g::bigint * 7919) % :devices AS d,
+                               (g % 12) || '/' || (g % 48) AS pi
+                        FROM generate_series(:start, :stop - 1) AS g
+                    ) s,
+                    LATERAL (
+                        SELECT '10:00:00:10:9b:' || substr(h, 1, 2) || ':' || substr(h, 3, 2) || ':' || substr(h, 5, 2) AS w
+                        FROM (SELECT lpad(to_hex(d), 6, '0') AS h) hx
+                    ) wx
+                """), {'start': start, 'stop': stop, 'now': now, 'span': span_seconds, 'rows': args.rows,
+                       'prefix': FIXTURE_PREFIX, 'switches': args.switches, 'devices': FIXTURE_DEVICES,
+                       'wwn_int_base': wwn_to_db(FIXTURE_WWN_BASE), 'collection_id': FIXTURE_COLLECTION})
+            print(f"  inserted {stop}/{args.rows} rows", file=sys.stderr)
+
+        # Same counters ingest maintains (see rollups.py)
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO log_rollup_hourly (bucket, switch_name, context, event_type, count)
+                SELECT date_trunc('hour', timestamp), switch_name, context, coalesce(event_type, ''), count(*)
+                FROM log_entries WHERE collection_id = :c
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (bucket, switch_name, context, event_type)
+                DO UPDATE SET count = log_rollup_hourly.count + EXCLUDED.count
+            """), {'c': FIXTURE_COLLECTION})
+            conn.execute(text("""
+                INSERT INTO log_rollup_daily (bucket, switch_name, context, event_type, count)
+                SELECT date_trunc('day', bucket), switch_name, context, event_type, sum(count)
+                FROM log_rollup_hourly WHERE switch_name LIKE :pattern
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (bucket, switch_name, context, event_type)
+                DO UPDATE SET count = EXCLUDED.count
+            """), {'pattern': FIXTURE_PREFIX + '%'})
+            conn.execute(text("ANALYZE log_entries"))
+            notify_log_entries_changed(conn, 'bench fixture', rewritten=True)
+    print(f"Fixture ready: {args.rows} rows over {args.days} days, {args.switches} switches", file=sys.stderr)
+
+
+def drop_db(args):
+    app = load_app()
+    with app.app_context():
+        delete_bench_rows(collection_ids=[FIXTURE_COLLECTION], prefixes=[FIXTURE_PREFIX, INSERT_PREFIX])
+    print("Fixture dropped", file=sys.stderr)
+
+
+# --- Database helpers ------------------------------------------------------
+
+def load_app():
+    """The Flask app, without the in-process scheduler"""
+    os.environ.setdefault('DISABLE_INTERNAL_SCHEDULER', 'true')
+    from main import app
+    return app
+
+
+def delete_bench_rows(collection_ids: list = (), prefixes: list = (), switch_names: list = ()):
+    """Remove what a stage stored: entries, rollup counts, switch status, runs and tasks"""
+    from sqlalchemy import text
+    from models import db
+    from search_cache import notify_log_entries_changed
+
+    names = list(switch_names)
+    patterns = [prefix + '%' for prefix in prefixes]
+    match = "(switch_name = ANY(:names) OR switch_name LIKE ANY(:patterns))"
+    params = {'names': names, 'patterns': patterns, 'ids': list(collection_ids)}
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM log_entries WHERE collection_id = ANY(:ids) OR {match}"), params)
+        for table in ('log_rollup_hourly', 'log_rollup_daily', 'switch_status', 'collection_switch_runs',
+                      'collection_tasks'):
+            conn.execute(text(f"DELETE FROM {table} WHERE {match}"), params)
+        conn.execute(text("DELETE FROM collection_runs WHERE id = ANY(:ids)"), params)
+        notify_log_entries_changed(conn, 'bench cleanup', rewritten=True)
+
+
+def fixture_rows() -> int:
+    from sqlalchemy import text
+    from models import db
+    with db.engine.connect() as conn:
+        return conn.execute(text("SELECT count(*) FROM log_entries WHERE collection_id = :c"),
+                            {'c': FIXTURE_COLLECTION}).scalar()
+
+
+def clear_search_caches():
+    from search_cache import count_cache, result_cache
+    result_cache.clear()
+    count_cache.clear()
+
+
+# --- Stages ----------------------------------------------------------------
+
+def median_seconds(func, repeats: int, setup=None) -> float:
+    """Median wall time of func(setup()) over repeats runs (setup not timed)"""
+    samples = []
+    for _ in range(repeats):
+        value = setup() if setup else None
+        start = time.perf_counter()
+        func(value) if setup else func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def stage_parse(state: dict, args) -> dict:
+    from simple_switch_collector import SimpleLogCollector
+
+    parser = SimpleLogCollector('', '')
+    corpus = state['corpus']
+    lines = [line for _, _, text in corpus for line in text.split('\n')]
+    parsed = {}
+
+    def parse_lines():
+        for line in lines:
+            parser.parse_log_line(line)
+
+    def parse_outputs():
+        for switch_name, context, text in corpus:
+            parsed[(switch_name, context)] = parser.parse_log_output_with_verification(text, switch_name, context)
+
+    line_seconds = median_seconds(parse_lines, args.repeats)
+    output_seconds = median_seconds(parse_outputs, args.repeats)
+    entries = sum(len(e) for e in parsed.values())
+    state['parsed'] = parsed
+    return {'lines': len(lines), 'entries': entries,
+            'parse_log_line_per_second': round(len(lines) / line_seconds),
+            'parse_output_per_second': round(entries / output_seconds),
+            'parse_output_seconds': round(output_seconds, 4)}
+
+
+def stage_years(state: dict, args) -> dict:
+    from simple_switch_collector import SimpleLogCollector
+
+    parser = SimpleLogCollector('', '')
+    parsed = state['parsed']
+    entries = sum(len(e) for e in parsed.values())
+
+    def copies():
+        return [[dict(entry) for entry in context_entries] for context_entries in parsed.values()]
+
+    def deduce(contexts):
+        state['dated'] = [parser.fix_timestamps_with_years(context_entries) for context_entries in contexts]
+
+    seconds = median_seconds(deduce, args.repeats, setup=copies)
+    years = sorted({entry['deduced_year'] for context in state['dated'] for entry in context})
+    return {'entries': entries, 'years': years, 'entries_per_second': round(entries / seconds),
+            'seconds': round(seconds, 4)}
+
+
+def stage_lookup(state: dict, args) -> dict:
+    from device_lookup_optimized import device_lookup, extract_slot_port_from_entry, lookup_alias_and_node_symbol
+    from wwn_utils import normalize_wwn
+
+    # Index built the way a collection refreshes it (no docker here: the local device_port.json)
+    write_device_port_json(state['devices'])
+    build_start = time.perf_counter()
+    assert device_lookup.refresh_index(), 'device index refresh failed'
+    build_seconds = time.perf_counter() - build_start
+
+    probes = []
+    for context in state['dated']:
+        for entry in context:
+            slot_number, port_number = extract_slot_port_from_entry(entry)
+            _, wwn = normalize_wwn(entry.get('port_wwn'))
+            probes.append((entry['switch_name'], slot_number, port_number, wwn))
+    hits = 0
+
+    def lookup_all():
+        nonlocal hits
+        hits = sum(1 for probe in probes if lookup_alias_and_node_symbol(*probe) != (None, None))
+
+    cold_seconds = median_seconds(lambda _: lookup_all(), args.repeats,
+                                  setup=device_lookup.lookup_alias_and_node_symbol.cache_clear)
+    warm_seconds = median_seconds(lookup_all, args.repeats)
+    return {'devices': len(state['devices']), 'lookups': len(probes), 'hit_ratio': round(hits / len(probes), 3),
+            'index_build_seconds': round(build_seconds, 4),
+            'cold_lookups_per_second': round(len(probes) / cold_seconds),
+            'warm_lookups_per_second': round(len(probes) / warm_seconds)}
+
+
+def stage_insert(state: dict, args) -> dict:
+    from collection_progress import CollectionProgress
+    from final_working_collector import store_switch_rows
+    from parse_pool import parse_entries
+    from simple_switch_collector import SimpleLogCollector
+
+    # Rows as the collector hands them to the insert step (parsed, dated, enriched)
+    per_switch = {}
+    for context in state['dated']:
+        if context:
+            per_switch.setdefault(context[0]['switch_name'], []).extend(context)
+    batches = [(f"{INSERT_PREFIX}{i:02d}", parse_entries(entries, switch_name))
+               for i, (switch_name, entries) in enumerate(sorted(per_switch.items()))]
+    rows = sum(len(parsed.rows) for _, parsed in batches)
+    samples = []
+    with state['app'].app_context():
+        for _ in range(args.repeats):
+            collection_id = f"bench-insert-{uuid.uuid4().hex[:8]}"
+            progress = CollectionProgress()
+            start = time.perf_counter()
+            for switch_name, parsed in batches:
+                result = store_switch_rows(switch_name, collection_id, parsed, SimpleLogCollector._empty_timings(),
+                                           progress, datetime.utcnow(), time.perf_counter())
+                assert result['success'], result['error']
+            samples.append(time.perf_counter() - start)
+            delete_bench_rows(collection_ids=[collection_id], prefixes=[INSERT_PREFIX])
+    seconds = statistics.median(samples)
+    return {'rows': rows, 'switches': len(batches), 'rows_per_second': round(rows / seconds),
+            'seconds': round(seconds, 3)}
+
+
+def _search_params(case: dict) -> dict:
+    params = dict(case)
+    if params.get('date_from') == 'DAYS_AGO_7':
+        params['date_from'] = (datetime.utcnow() - timedelta(days=7)).strftime('%Y-%m-%d')
+    return params
+
+
+def stage_search(state: dict, args) -> dict:
+    client = state['app'].test_client()
+    metrics = {'fixture_rows': state['fixture_rows']}
+    cases = dict(SEARCH_CASES, stats=None)
+    for name, case in cases.items():
+        url = '/api/db/stats' if case is None else '/api/db/search'
+
+        def request():
+            response = client.get(url, query_string=_search_params(case or {}))
+            assert response.status_code == 200, f"{name}: HTTP {response.status_code} {response.get_data()[:200]}"
+
+        # Uncached: the result and count caches are emptied before every request
+        metrics[f"{name}_ms"] = round(median_seconds(lambda _: request(), args.repeats,
+                                                     setup=clear_search_caches) * 1000, 2)
+        print(f"    {name}: {metrics[f'{name}_ms']} ms", file=sys.stderr)
+    return metrics
+
+
+def stage_export(state: dict, args) -> dict:
+    client = state['app'].test_client()
+    metrics = {'fixture_rows': state['fixture_rows']}
+    params = {'switches': ','.join(f"{FIXTURE_PREFIX}{i:02d}" for i in range(args.export_switches))}
+    for export_format in ('csv', 'ndjson'):
+        rows = 0
+
+        def export():
+            nonlocal rows
+            response = client.get('/api/db/export', query_string=dict(params, format=export_format))
+            assert response.status_code == 200, f"{export_format}: HTTP {response.status_code}"
+            rows = sum(chunk.count(b'\n') for chunk in response.iter_encoded())
+            response.close()
+            if export_format == 'csv':
+                rows -= 1  # Header
+
+        seconds = median_seconds(export, args.repeats)
+        metrics[f"{export_format}_rows"] = rows
+        metrics[f"{export_format}_rows_per_second"] = round(rows / seconds) if rows else 0
+        metrics[f"{export_format}_seconds"] = round(seconds, 3)
+    return metrics
+
+
+def stage_pipeline(state: dict, args) -> dict:
+    from config import Config
+    from final_working_collector import run_simple_collection
+
+    switches = loopback_switches(args.pipeline_switches, sites=2)
+    addresses = [switch_info.split(':')[1] for switch_info in switches]
+    server = FakeSwitchServer(port=free_port(), listen=addresses, entries=args.entries,
+                              devices=args.devices, seed=args.seed).start_in_thread()
+    with open('switches.conf', 'w') as f:
+        f.write('\n'.join(switches) + '\n')
+    write_device_port_json(device_records(server, {a: server.switch_name(a) for a in addresses}))
+    Config.SWITCHES_CONFIG_FILE = os.path.abspath('switches.conf')
+    Config.SWITCH_SSH_PORT = server.port
+
+    samples = []
+    inserted = 0
+    try:
+        with state['app'].app_context():
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                result = run_simple_collection('bench', 'bench')
+                samples.append(time.perf_counter() - start)
+                assert result.get('success'), result.get('error')
+                inserted = result['new_entries']
+                delete_bench_rows(collection_ids=[result['collection_id']], switch_names=addresses)
+    finally:
+        server.stop_thread()
+    seconds = statistics.median(samples)
+    return {'switches': len(switches), 'engine': Config.COLLECTION_ENGINE, 'entries': inserted,
+            'entries_per_second': round(inserted / seconds), 'seconds': round(seconds, 2)}
+
+
+STAGE_FUNCTIONS = {
+    'parse': stage_parse, 'years': stage_years, 'lookup': stage_lookup, 'insert': stage_insert,
+    'search': stage_search, 'export': stage_export, 'pipeline': stage_pipeline,
+}
+
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run(args) -> int:
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    stages = [s for s in STAGES if s in args.stages]
+    # years needs parse's entries; lookup and insert need both
+    if any(s in stages for s in ('years', 'lookup', 'insert')):
+        stages = sorted(set(stages) | {'parse', 'years'}, key=STAGES.index)
+
+    server = corpus_server(args.entries, args.devices, args.seed)
+    state = {'corpus': nsdevlog_corpus(server, args.switches)}
+    state['devices'] = device_records(server, {name: name for name, _, _ in state['corpus'][::len(CONTEXTS)]})
+    report = {
+        'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'host': platform.node(), 'python': platform.python_version(), 'cpu_count': os.cpu_count(),
+        'parameters': {'switches': args.switches, 'entries': args.entries, 'devices': args.devices,
+                       'repeats': args.repeats, 'seed': args.seed},
+        'stages': {},
+    }
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # Context files, device_port.json, the device index and switches.conf go here
+        os.makedirs('logs', exist_ok=True)
+        if DATABASE_STAGES & set(stages):
+            state['app'] = load_app()
+            with state['app'].app_context():
+                state['fixture_rows'] = fixture_rows()
+            if not state['fixture_rows'] and ({'search', 'export'} & set(stages)):
+                print("No fixture (generate-db): search and export run on the existing rows", file=sys.stderr)
+        # Year deduction reports on stdout; keep it out of the report
+        sys.stdout.flush()
+        real_stdout = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        try:
+            for stage in stages:
+                print(f"  {stage}...", file=sys.stderr)
+                report['stages'][stage] = STAGE_FUNCTIONS[stage](state, args)
+                print(f"  {stage}: {report['stages'][stage]}", file=sys.stderr)
+        finally:
+            sys.stdout.flush()
+            os.dup2(real_stdout, 1)
+            os.close(real_stdout)
+            os.close(devnull)
+            os.chdir(REPO_DIR)
+
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            return print_comparison(json.load(f), report, args.tolerance)
+    return 0
+
+
+# --- Comparison ------------------------------------------------------------
+
+def metric_direction(name: str):
+    """True if higher is better, False if lower is better, None for informational metrics"""
+    for suffix, higher_is_better in METRIC_DIRECTIONS.items():
+        if name.endswith(suffix) or name == suffix[1:]:
+            return higher_is_better
+    return None
+
+
+def compare_reports(baseline: dict, current: dict, tolerance: float) -> list:
+    """[(stage, metric, baseline, current, change, regressed)]; change > 0 means worse"""
+    rows = []
+    for stage, metrics in current['stages'].items():
+        for name, value in metrics.items():
+            higher_is_better = metric_direction(name)
+            old = baseline.get('stages', {}).get(stage, {}).get(name)
+            if higher_is_better is None or not old or not isinstance(value, (int, float)):
+                continue
+            change = (old - value) / old if higher_is_better else (value - old) / old
+            rows.append((stage, name, old, value, change, change > tolerance))
+    return rows
+
+
+def print_comparison(baseline: dict, current: dict, tolerance: float) -> int:
+    """Print the comparison table on stderr; 1 when any metric regressed beyond tolerance"""
+    if baseline.get('parameters') != current.get('parameters'):
+        print(f"Warning: parameters differ (baseline {baseline.get('parameters')}, "
+              f"current {current.get('parameters')})", file=sys.stderr)
+    for stage in ('search', 'export'):
+        old_rows = baseline.get('stages', {}).get(stage, {}).get('fixture_rows')
+        new_rows = current.get('stages', {}).get(stage, {}).get('fixture_rows')
+        if old_rows is not None and new_rows is not None and old_rows != new_rows:
+            print(f"Warning: {stage} fixture differs ({old_rows} vs {new_rows} rows)", file=sys.stderr)
+
+    rows = compare_reports(baseline, current, tolerance)
+    regressions = [row for row in rows if row[5]]
+    print(f"{'stage':<10} {'metric':<32} {'baseline':>14} {'current':>14} {'change':>8}", file=sys.stderr)
+    for stage, name, old, value, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{stage:<10} {name:<32} {old:>14} {value:>14} {0.0 - change:>+8.1%}{flag}", file=sys.stderr)
+    print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return print_comparison(baseline, current, args.tolerance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage and pipeline benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_corpus_arguments(command):
+        command.add_argument('--switches', type=int, default=8)
+        command.add_argument('--entries', type=int, default=2048, help='Entries per context')
+        command.add_argument('--devices', type=int, default=256, help='Devices (WWNs) per switch')
+        command.add_argument('--seed', type=int, default=42)
+
+    generate = commands.add_parser('generate-nsdevlog', help='Write synthetic nsdevlog outputs and device_port.json')
+    add_corpus_arguments(generate)
+    generate.add_argument('--output-dir', required=True)
+
+    fixture = commands.add_parser('generate-db', help='Fill log_entries with the search/export fixture')
+    fixture.add_argument('--rows', type=int, default=5_000_000)
+    fixture.add_argument('--days', type=int, default=365)
+    fixture.add_argument('--switches', type=int, default=40)
+    fixture.add_argument('--batch-size', type=int, default=500_000)
+
+    commands.add_parser('drop-db', help='Remove the fixture and any leftover bench rows')
+
+    run_command = commands.add_parser('run', help='Run stages and print the JSON report')
+    add_corpus_arguments(run_command)
+    run_command.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    run_command.add_argument('--repeats', type=int, default=5, help='Timed runs per measurement (median kept)')
+    run_command.add_argument('--export-switches', type=int, default=2, help='Fixture switches exported')
+    run_command.add_argument('--pipeline-switches', type=int, default=8)
+    run_command.add_argument('--output', help='Write the report to this file (e.g. a new baseline)')
+    run_command.add_argument('--baseline', help='Compare against this report; exit 1 on regressions')
+    run_command.add_argument('--tolerance', type=float, default=0.15, help='Allowed slowdown (0.15 = 15%%)')
+
+    compare_command = commands.add_parser('compare', help='Flag regressions of a report against a baseline')
+    compare_command.add_argument('baseline')
+    compare_command.add_argument('current')
+    compare_command.add_argument('--tolerance', type=float, default=0.15, help='Allowed slowdown (0.15 = 15%%)')
+
+    args = parser.parse_args()
+    if args.command == 'generate-nsdevlog':
+        generate_nsdevlog(args)
+    elif args.command == 'generate-db':
+        generate_db(args)
+    elif args.command == 'drop-db':
+        drop_db(args)
+    elif args.command == 'run':
+        sys.exit(run(args))
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Switch Ordering Benchmark
+Simulates collection runs over a mixed inventory (a few large directors, some
+core switches, many edge switches) and compares the makespan of submitting
+switches in switches.conf order against longest-first ordering from noisy
+historical durations (collection_timings.order_longest_first).
+
+Usage:
+    python benchmarks/bench_switch_ordering.py --workers 4 --trials 200
+
+No database or switch is needed; durations are drawn per trial.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from collection_timings import order_longest_first  # noqa: E402
+
+# Switch class -> (count, median collection seconds)
+INVENTORY = {
+    'director': (2, 900),
+    'core': (6, 240),
+    'edge': (24, 45),
+}
+
+# Run-to-run variation of a switch's duration (lognormal sigma)
+RUN_VARIATION = 0.15
+
+
+def build_inventory(sites: int) -> dict:
+    """switches.conf entries -> typical seconds, directors listed last as in a real config"""
+    inventory = {}
+    for kind in ('edge', 'core', 'director'):
+        count, seconds = INVENTORY[kind]
+        for i in range(count):
+            inventory[f"site{i % sites}:{kind}{i:02d}:gen7"] = seconds * random.uniform(0.7, 1.3)
+    return inventory
+
+
+def makespan(order: list, durations: dict, workers: int) -> float:
+    """Greedy list scheduling: each switch starts on the first worker that goes idle"""
+    free_at = [0.0] * workers
+    for switch_info in order:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + durations[switch_info])
+    return max(free_at)
+
+
+def run_trial(inventory: dict, workers: int, history_runs: int) -> dict:
+    def draw(typical):
+        return typical * random.lognormvariate(0, RUN_VARIATION)
+
+    # Expected duration = median of the last runs, like get_expected_durations()
+    expected = {
+        switch_info.split(':')[1]: statistics.median(draw(typical) for _ in range(history_runs))
+        for switch_info, typical in inventory.items()
+    }
+    durations = {switch_info: draw(typical) for switch_info, typical in inventory.items()}
+
+    config_order = list(inventory)
+    shuffled = random.sample(config_order, len(config_order))
+    lower_bound = max(max(durations.values()), sum(durations.values()) / workers)
+    return {
+        'config_order': makespan(config_order, durations, workers),
+        'random_order': makespan(shuffled, durations, workers),
+        'longest_first': makespan(order_longest_first(config_order, expected), durations, workers),
+        'lower_bound': lower_bound,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark longest-first switch ordering')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--sites', type=int, default=3)
+    parser.add_argument('--history-runs', type=int, default=5, help='Past runs behind each estimate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    inventory = build_inventory(args.sites)
+    report = {'switches': len(inventory), 'trials': args.trials, 'results': {}}
+
+    for workers in args.workers:
+        trials = [run_trial(inventory, workers, args.history_runs) for _ in range(args.trials)]
+        summary = {
+            strategy: round(statistics.median(t[strategy] for t in trials), 1)
+            for strategy in ('config_order', 'random_order', 'longest_first', 'lower_bound')
+        }
+        summary['improvement_vs_config'] = round(1 - summary['longest_first'] / summary['config_order'], 3)
+        report['results'][workers] = summary
+        print(f"  {workers} workers: {summary}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Trigram Search Benchmark
+Builds a synthetic log_entries-shaped table and measures substring search latency
+per filter type, with and without the pg_trgm GIN indexes.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/bench_trigram_search.py --rows 10000000
+
+The table is created as bench_log_entries and dropped at the end unless --keep is given.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+TABLE = 'bench_log_entries'
+
+# Filter type -> (column, search term) typical of incident triage
+SEARCH_CASES = {
+    'wwn': ('wwn', '10:9b:01:86'),
+    'alias': ('alias', 'HOST_01234'),
+    'node_symbol': ('node_symbol', 'Server-01234'),
+    'event_type': ('event_type', 'Device Del'),
+}
+
+
+def create_table(conn, rows: int, batch_size: int):
+    """Create and fill the synthetic table in batches with generate_series"""
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(text(f"""
+        CREATE TABLE {TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            timestamp TIMESTAMP NOT NULL,
+            switch_name VARCHAR(100) NOT NULL,
+            context INTEGER NOT NULL,
+            event_type VARCHAR(50),
+            wwn VARCHAR(30),
+            port_info VARCHAR(100),
+            raw_line TEXT NOT NULL,
+            alias VARCHAR(200),
+            node_symbol VARCHAR(200),
+            collection_id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """))
+
+    # ~200k distinct devices spread over 40 switches and 6 contexts
+    for start in range(0, rows, batch_size):
+        stop = min(start + batch_size, rows)
+        conn.execute(text(f"""
+            INSERT INTO {TABLE} (timestamp, switch_name, context, event_type, wwn, port_info,
+                                 raw_line, alias, node_symbol, collection_id)
+            SELECT ts, sw, ctx, ev, w, pi,
+                   to_char(ts, 'Dy Mon DD HH24:MI:SS.MS') || '  ' || pi || '  0x' || lpad(to_hex(d % 65536), 6, '0')
+                       || '  ' || w || '  ' || w || '  ' || ev,
+                   'HOST_' || lpad(d::text, 6, '0'),
+                   'Server-' || lpad(d::text, 6, '0') || ' HBA port',
+                   'bench'
+            FROM (
+                SELECT g,
+                       now() - make_interval(secs => g) AS ts,
+                       'santgt' || (g % 40) AS sw,
+                       (ARRAY[1, 2, 3, 4, 5, 128])[1 + g % 6] AS ctx,
+                       (ARRAY['Device Add', 'Device Del', 'Register', 'Deregister',
+                              'Port Del', 'FPORT Entry', 'Switch Offline', 'Dup WWN'])[1 + g % 8] AS ev,
+                       (g::bigint * 7919) % 200000 AS d,
+                       (1 + g % 12) || '/' || (g % 48) AS pi
+                FROM generate_series(:start, :stop - 1) AS g
+            ) s,
+            LATERAL (
+                SELECT '10:00:00:10:9b:' || substr(h, 1, 2) || ':' || substr(h, 3, 2) || ':' || substr(h, 5, 2) AS w
+                FROM (SELECT lpad(to_hex(d), 6, '0') AS h) hx
+            ) wx
+        """), {'start': start, 'stop': stop})
+        print(f"  inserted {stop}/{rows} rows", file=sys.stderr)
+
+    # Same b-tree indexes as LogEntry
+    for column in ('timestamp', 'switch_name', 'context', 'event_type', 'wwn', 'alias', 'node_symbol'):
+        conn.execute(text(f"CREATE INDEX ON {TABLE} ({column})"))
+    conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+def create_trigram_indexes(conn) -> bool:
+    """Create the pg_trgm GIN indexes used by the application"""
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        print(f"pg_trgm unavailable, only the b-tree baseline is measured: {e}", file=sys.stderr)
+        return False
+    for column, _ in SEARCH_CASES.values():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {TABLE}_{column}_trgm ON {TABLE} USING gin ({column} gin_trgm_ops)"))
+    conn.execute(text(f"ANALYZE {TABLE}"))
+    return True
+
+
+def scan_nodes(plan: dict) -> list:
+    """Scan node types of an EXPLAIN (FORMAT JSON) plan tree"""
+    nodes = [plan['Node Type']] if 'Scan' in plan['Node Type'] else []
+    for child in plan.get('Plans', []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+def time_query(conn, sql: str, params: dict, repeats: int) -> float:
+    """Median wall time of a query in milliseconds"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run_cases(conn, repeats: int) -> dict:
+    """Time the search page and count query for each filter type"""
+    results = {}
+    for filter_type, (column, term) in SEARCH_CASES.items():
+        params = {'pattern': f'%{term}%'}
+        page_sql = (f"SELECT * FROM {TABLE} WHERE {column} ILIKE :pattern "
+                    f"ORDER BY timestamp DESC LIMIT 100")
+        count_sql = f"SELECT count(*) FROM {TABLE} WHERE {column} ILIKE :pattern"
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {count_sql}"), params).scalar()
+        results[filter_type] = {
+            'term': term,
+            'page_ms': time_query(conn, page_sql, params, repeats),
+            'count_ms': time_query(conn, count_sql, params, repeats),
+            'scan': scan_nodes(plan[0]['Plan']),
+        }
+        print(f"  {filter_type}: {results[filter_type]}", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark trigram substring search')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--batch-size', type=int, default=500_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--reuse', action='store_true', help='Reuse an existing bench table')
+    parser.add_argument('--keep', action='store_true', help='Keep the bench table afterwards')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL', 'postgresql://localhost/switch_analyzer')
+    engine = create_engine(database_url, isolation_level='AUTOCOMMIT')
+
+    with engine.connect() as conn:
+        if not args.reuse:
+            print(f"Building {TABLE} with {args.rows} rows...", file=sys.stderr)
+            create_table(conn, args.rows, args.batch_size)
+
+        print("Baseline (b-tree indexes only, bitmap scans disabled):", file=sys.stderr)
+        conn.execute(text("SET enable_bitmapscan = off"))
+        baseline = run_cases(conn, args.repeats)
+        conn.execute(text("RESET enable_bitmapscan"))
+
+        trigram = None
+        if create_trigram_indexes(conn):
+            print("With pg_trgm GIN indexes:", file=sys.stderr)
+            trigram = run_cases(conn, args.repeats)
+
+        if not args.keep:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+    report = {'rows': args.rows, 'repeats': args.repeats, 'baseline': baseline, 'trigram': trigram}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
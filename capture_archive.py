@@ -0,0 +1,271 @@
+"""
+Capture Archive for Switch Log Analyzer
+Append-only, compressed archive of the raw output of every collected context,
+so parsing, enrichment and ingest can be replayed later without SSH (after a
+parser fix, a database outage, or for deterministic ingest benchmarks).
+
+Segments are hourly files logs/captures/capture_YYYYMMDD_HH.jsonl.gz. Each
+record is one gzip member holding one compact JSON line, written with a single
+O_APPEND write, so collector threads and processes can share a segment and
+every segment stays readable with zcat.
+
+manifest.json indexes the segments with their size, so listing, reading and
+eviction never scan the directory. The archive is kept within a total size
+(CAPTURE_MAX_MB) and an age (CAPTURE_RETENTION_DAYS): whole segments are
+deleted oldest first when a new segment starts, after every CAPTURE_MAX_MB/20
+appended by a process, and on cleanup_temporary_log_files().
+"""
+
+import contextlib
+import fcntl
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the record layout changes
+RECORD_VERSION = 1
+
+SEGMENT_PATTERN = 'capture_*.jsonl.gz'
+SEGMENT_TIME_FORMAT = '%Y%m%d_%H'
+MANIFEST_NAME = 'manifest.json'
+
+# Appended bytes, as a fraction of the size budget, between two budget checks of a process
+ENFORCE_FRACTION = 20
+
+
+def segment_hour(path: str) -> Optional[datetime]:
+    """Hour a segment covers, from its file name"""
+    try:
+        return datetime.strptime(os.path.basename(path)[8:19], SEGMENT_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+class CaptureArchive:
+    """Hourly gzip segments of context outputs, one record per context"""
+
+    def __init__(self, directory: str, enabled: bool = True, compress_level: int = 6,
+                 max_bytes: int = 0, max_age_days: int = 0):
+        self.directory = directory
+        self.enabled = enabled
+        self.compress_level = compress_level
+        self.max_bytes = max_bytes  # 0 = no size budget
+        self.max_age_days = max_age_days  # 0 = no age budget
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._segment = None  # Last segment this process registered in the manifest
+        self._unchecked_bytes = 0  # Appended since this process last enforced the budgets
+
+    def segment_path(self, moment: datetime) -> str:
+        return os.path.join(self.directory, f"capture_{moment.strftime(SEGMENT_TIME_FORMAT)}.jsonl.gz")
+
+    @contextlib.contextmanager
+    def _manifest_lock(self):
+        """Serializes manifest updates across threads and processes (collector daemon, web workers)"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.manifest_path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Segment name -> {'bytes'}; rebuilt with a one-off scan when missing or unreadable"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)['segments']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"CAPTURE: Rebuilding unreadable manifest {self.manifest_path}: {e}")
+        segments = {}
+        for path in glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)):
+            if segment_hour(path):
+                segments[os.path.basename(path)] = {'bytes': os.path.getsize(path)}
+        if segments:
+            logger.info(f"CAPTURE: Indexed {len(segments)} existing segments in {self.manifest_path}")
+        self._save_manifest(segments)
+        return segments
+
+    def _save_manifest(self, segments: Dict[str, Dict]):
+        tmp_path = f"{self.manifest_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({'v': RECORD_VERSION, 'segments': dict(sorted(segments.items()))}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _register(self, path: str):
+        """Add a new segment to the manifest; the previous one is complete, so the budgets are checked"""
+        with self._manifest_lock():
+            segments = self._load_manifest()
+            segments.setdefault(os.path.basename(path), {'bytes': 0})
+            self._save_manifest(segments)
+        self._segment = path
+        self.enforce_budgets()
+
+    def enforce_budgets(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Delete whole segments, oldest first, until the archive is within its size
+        and age budgets; the newest segment is kept as it may still be written.
+        Only the two newest segments are re-measured, older ones no longer grow.
+        """
+        if not (self.max_bytes or self.max_age_days):
+            return []
+        now = now or datetime.now()
+        evicted = []
+        try:
+            with self._manifest_lock():
+                segments = self._load_manifest()
+                names = sorted(segments)
+                for name in names[-2:]:
+                    try:
+                        segments[name]['bytes'] = os.path.getsize(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        del segments[name]
+                names = sorted(segments)
+                total = sum(segment['bytes'] for segment in segments.values())
+                oldest_kept = now - timedelta(days=self.max_age_days) if self.max_age_days else None
+                for name in names[:-1]:
+                    too_old = oldest_kept and segment_hour(name) + timedelta(hours=1) <= oldest_kept
+                    if not too_old and not (self.max_bytes and total > self.max_bytes):
+                        break
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+                    total -= segments.pop(name)['bytes']
+                    evicted.append(name)
+                self._save_manifest(segments)
+                self._unchecked_bytes = 0
+        except Exception as e:
+            logger.error(f"CAPTURE: Failed to enforce archive budgets: {e}")
+            return evicted
+        if evicted:
+            logger.info(f"CAPTURE: Evicted {len(evicted)} segments ({evicted[0]} .. {evicted[-1]}), "
+                        f"{total / 1048576:.1f} MB kept")
+        if self.max_bytes and total > self.max_bytes:
+            logger.warning(f"CAPTURE: Current segment alone is over the {self.max_bytes / 1048576:.1f} MB budget")
+        return evicted
+
+    def stats(self) -> Dict:
+        """Segment count, size and time span from the manifest"""
+        with self._manifest_lock():
+            segments = self._load_manifest()
+        names = sorted(segments)
+        if names:
+            # The newest segment grows between budget checks
+            with contextlib.suppress(OSError):
+                segments[names[-1]]['bytes'] = os.path.getsize(os.path.join(self.directory, names[-1]))
+        return {
+            'enabled': self.enabled,
+            'segments': len(names),
+            'bytes': sum(segment['bytes'] for segment in segments.values()),
+            'max_bytes': self.max_bytes,
+            'max_age_days': self.max_age_days,
+            'oldest': segment_hour(names[0]).isoformat() if names else None,
+            'newest': segment_hour(names[-1]).isoformat() if names else None,
+        }
+
+    def append(self, session: str, site: str, switch_address: str, generation: str, context: int,
+               raw_output: str) -> Optional[str]:
+        """
+        Store one context's raw output; returns the segment written, None when
+        capture is disabled or failed (a capture problem never fails a collection)
+        """
+        if not self.enabled:
+            return None
+        captured_at = datetime.now()
+        record = {
+            'v': RECORD_VERSION,
+            'captured_at': captured_at.isoformat(),
+            'session': session,
+            'site': site,
+            'switch': switch_address,
+            'generation': generation,
+            'context': context,
+            'raw_output': raw_output,
+        }
+        try:
+            data = gzip.compress((json.dumps(record, separators=(',', ':')) + '\n').encode(),
+                                 compresslevel=self.compress_level)
+            path = self.segment_path(captured_at)
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            logger.debug(f"CAPTURE: {switch_address} context {context}: {len(raw_output)} chars, "
+                         f"{len(data)} bytes to {path}")
+            if path != self._segment:
+                self._register(path)
+            else:
+                self._unchecked_bytes += len(data)
+                if self.max_bytes and self._unchecked_bytes > self.max_bytes // ENFORCE_FRACTION:
+                    self.enforce_budgets()
+            return path
+        except Exception as e:
+            logger.error(f"CAPTURE: Failed to store {switch_address} context {context}: {e}")
+            return None
+
+    def segments(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[str]:
+        """Segment files, oldest first, that may hold records captured between since and until"""
+        with self._manifest_lock():
+            names = sorted(self._load_manifest())
+        paths = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            hour = segment_hour(name)
+            if since and hour < since.replace(minute=0, second=0, microsecond=0):
+                continue
+            if until and hour > until:
+                continue
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def read_segment(path: str) -> Iterator[Dict]:
+        """Records of one segment; a record cut short by a crash (or still being written) ends it"""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning(f"CAPTURE: Skipping unreadable record in {path}")
+        except (EOFError, OSError, zlib.error) as e:
+            logger.warning(f"CAPTURE: {path} ends with an incomplete record: {e}")
+
+    def records(self, paths: Optional[List[str]] = None, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, switches: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Records in capture order, filtered by capture time and switch address"""
+        for path in paths or self.segments(since, until):
+            for record in self.read_segment(path):
+                captured_at = datetime.fromisoformat(record['captured_at'])
+                if since and captured_at < since:
+                    continue
+                if until and captured_at > until:
+                    continue
+                if switches and record['switch'] not in switches:
+                    continue
+                record['captured_at'] = captured_at
+                yield record
+
+
+# Archive written by the collectors (thread and asyncio engines)
+capture_archive = CaptureArchive(Config.CAPTURE_DIR, enabled=Config.CAPTURE_ENABLED,
+                                 compress_level=Config.CAPTURE_COMPRESS_LEVEL,
+                                 max_bytes=Config.CAPTURE_MAX_MB * 1048576,
+                                 max_age_days=Config.CAPTURE_RETENTION_DAYS)
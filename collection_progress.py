@@ -0,0 +1,277 @@
+"""
+Collection Progress for Switch Log Analyzer
+In-memory per-switch/per-context progress of the running collection, fed by the
+collector threads and streamed to the UI as server-sent events
+"""
+
+import json
+import logging
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE keepalive comments (also the idle re-check interval)
+SSE_HEARTBEAT = 15
+
+# Coalesce bursts of updates (every received SSH chunk is one) into one event per interval
+SSE_MIN_INTERVAL = 0.5
+
+# Streams end after this many seconds; EventSource reconnects on its own
+SSE_MAX_DURATION = 3600
+
+# A running switch is a straggler once it has taken this many times the median
+# duration of the switches that already finished (and at least STRAGGLER_MIN_SECONDS)
+STRAGGLER_FACTOR = 1.5
+STRAGGLER_MIN_SECONDS = 30
+
+# Error messages kept per switch
+MAX_ERRORS = 20
+
+# Each open stream holds a worker thread and one thread is always left for other
+# requests, so the sync worker (one thread) streams nothing; refused streams make
+# the UI fall back to polling /api/collection/status
+stream_slots = threading.BoundedSemaphore(
+    max(0, min(Config.PROGRESS_STREAM_MAX_CLIENTS, Config.GUNICORN_THREADS - 1))
+)
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class CollectionProgress:
+    """
+    Thread-safe progress registry of the collection running in this process
+
+    Every update bumps version and wakes the SSE streams waiting in
+    wait_for_change(); snapshot() is the JSON-ready state they send.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.version = 0
+        self._reset(None, 'idle')
+
+    def _reset(self, collection_id: Optional[str], status: str):
+        self.collection_id = collection_id
+        self.status = status
+        self.error = None
+        self.started_at = time.time() if collection_id else None
+        self.finished_at = None
+        self.concurrency = None
+        self.switches = {}
+
+    def _changed(self):
+        self.version += 1
+        self._condition.notify_all()
+
+    def _switch(self, switch_name: str) -> Dict:
+        switch = self.switches.get(switch_name)
+        if switch is None:
+            switch = self.switches[switch_name] = {
+                'status': 'pending', 'context': None, 'contexts': {},
+                'bytes_received': 0, 'entries_parsed': 0, 'inserted': 0, 'errors': [],
+                'started_at': None, 'finished_at': None, 'worker': None,
+            }
+        return switch
+
+    def _context(self, switch_name: str, context) -> Dict:
+        contexts = self._switch(switch_name)['contexts']
+        key = str(context)
+        if key not in contexts:
+            contexts[key] = {'status': 'pending', 'bytes_received': 0, 'entries_parsed': 0}
+        return contexts[key]
+
+    def start(self, collection_id: str):
+        """New collection: replaces the previous one's progress"""
+        with self._condition:
+            self._reset(collection_id, 'running')
+            self._changed()
+
+    def add_switches(self, switch_names: List[str]):
+        """Configured switches, listed as pending until their thread picks them up"""
+        with self._condition:
+            for name in switch_names:
+                self._switch(name)
+            self._changed()
+
+    def set_concurrency(self, limit: int):
+        """Current parallel switch limit of the adaptive controller"""
+        with self._condition:
+            if limit != self.concurrency:
+                self.concurrency = limit
+                self._changed()
+
+    def switch_started(self, switch_name: str):
+        with self._condition:
+            switch = self._switch(switch_name)
+            switch['status'] = 'connecting'
+            switch['started_at'] = time.time()
+            self._changed()
+
+    def context_started(self, switch_name: str, context):
+        with self._condition:
+            self._switch(switch_name).update(status='collecting', context=context)
+            self._context(switch_name, context)['status'] = 'collecting'
+            self._changed()
+
+    def add_bytes(self, switch_name: str, context, count: int):
+        with self._condition:
+            self._switch(switch_name)['bytes_received'] += count
+            self._context(switch_name, context)['bytes_received'] += count
+            self._changed()
+
+    def context_parsed(self, switch_name: str, context, entries: int):
+        with self._condition:
+            self._switch(switch_name)['entries_parsed'] += entries
+            context_state = self._context(switch_name, context)
+            context_state['entries_parsed'] = entries
+            context_state['status'] = 'done'
+            self._changed()
+
+    def inserting(self, switch_name: str):
+        with self._condition:
+            self._switch(switch_name).update(status='inserting', context=None)
+            self._changed()
+
+    def add_inserted(self, switch_name: str, count: int):
+        with self._condition:
+            self._switch(switch_name)['inserted'] += count
+            self._changed()
+
+    def add_error(self, switch_name: str, message: str, context=None):
+        with self._condition:
+            errors = self._switch(switch_name)['errors']
+            errors.append(f"ctx {context}: {message}" if context is not None else message)
+            del errors[:-MAX_ERRORS]
+            if context is not None:
+                self._context(switch_name, context)['status'] = 'failed'
+            self._changed()
+
+    def switch_finished(self, switch_name: str, success: bool, error: Optional[str] = None):
+        with self._condition:
+            switch = self._switch(switch_name)
+            switch.update(status='completed' if success else 'failed', context=None, finished_at=time.time())
+            if error and error not in switch['errors']:
+                switch['errors'].append(error)
+            self._changed()
+
+    def set_remote_status(self, switch_name: str, status: str, worker: Optional[str], error: Optional[str] = None):
+        """State of a switch run by another process, from its work queue task"""
+        with self._condition:
+            switch = self._switch(switch_name)
+            if switch['status'] == status and switch['worker'] == worker:
+                return
+            now = time.time()
+            switch.update(status=status, worker=worker, context=None)
+            switch['started_at'] = switch['started_at'] or now
+            if status in ('completed', 'failed'):
+                switch['finished_at'] = switch['finished_at'] or now
+                if error and error not in switch['errors']:
+                    switch['errors'].append(error)
+            self._changed()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        """Collection ended ('completed' or 'failed'); the final state stays until the next start"""
+        with self._condition:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._changed()
+
+    def snapshot(self) -> Dict:
+        """JSON-ready progress, with elapsed times and straggler flags"""
+        with self._condition:
+            now = time.time()
+            durations = [s['finished_at'] - s['started_at'] for s in self.switches.values()
+                         if s['finished_at'] and s['started_at']]
+            threshold = STRAGGLER_FACTOR * statistics.median(durations) if durations else None
+
+            switches = []
+            for name, switch in self.switches.items():
+                end = switch['finished_at'] or now
+                elapsed = end - switch['started_at'] if switch['started_at'] else 0.0
+                running = switch['status'] not in ('pending', 'completed', 'failed')
+                switches.append({
+                    'switch_name': name,
+                    'status': switch['status'],
+                    'context': switch['context'],
+                    'contexts': {k: dict(v) for k, v in switch['contexts'].items()},
+                    'bytes_received': switch['bytes_received'],
+                    'entries_parsed': switch['entries_parsed'],
+                    'inserted': switch['inserted'],
+                    'errors': list(switch['errors']),
+                    'worker': switch['worker'],
+                    'elapsed_seconds': round(elapsed, 1),
+                    'straggler': bool(running and threshold is not None
+                                      and elapsed > max(threshold, STRAGGLER_MIN_SECONDS)),
+                })
+
+            done = sum(1 for s in switches if s['status'] in ('completed', 'failed'))
+            return {
+                'version': self.version,
+                'collection_id': self.collection_id,
+                'status': self.status,
+                'is_running': self.status == 'running',
+                'error': self.error,
+                'started_at': _iso(self.started_at),
+                'finished_at': _iso(self.finished_at),
+                'elapsed_seconds': round((self.finished_at or now) - self.started_at, 1) if self.started_at else 0.0,
+                'concurrency': self.concurrency,
+                'switches_total': len(switches),
+                'switches_done': done,
+                'bytes_received': sum(s['bytes_received'] for s in switches),
+                'entries_parsed': sum(s['entries_parsed'] for s in switches),
+                'inserted': sum(s['inserted'] for s in switches),
+                'switches': switches,
+            }
+
+    def wait_for_change(self, version: int, timeout: float) -> bool:
+        """Block until version moves past the given one; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.version != version, timeout=timeout)
+
+
+def progress_events(progress: CollectionProgress, external_status=None) -> Iterator[str]:
+    """
+    Server-sent event stream of progress snapshots
+
+    external_status is an optional callable polled on heartbeats while no
+    collection runs in this process, returning a dict (or None) describing a
+    collection started by another worker; it is sent as the 'external' field.
+    """
+    deadline = time.monotonic() + SSE_MAX_DURATION
+    external = external_status() if external_status else None
+    yield f"retry: {SSE_HEARTBEAT * 1000}\n\n"
+
+    while True:
+        snapshot = progress.snapshot()
+        snapshot['external'] = external
+        yield f"event: progress\ndata: {json.dumps(snapshot, separators=(',', ':'))}\n\n"
+
+        # Wait for the next change, sending keepalives (and re-checking other workers) while idle
+        while True:
+            if time.monotonic() > deadline:
+                return
+            version = snapshot['version']
+            if progress.wait_for_change(version, SSE_HEARTBEAT):
+                time.sleep(SSE_MIN_INTERVAL)
+                break
+            if snapshot['is_running']:
+                break  # Refresh elapsed times and stragglers of switches gone quiet
+            if external_status and not snapshot['is_running']:
+                current = external_status()
+                if current != external:
+                    external = current
+                    break
+            yield ": keepalive\n\n"
+
+
+# Progress of the collection running in this process
+collection_progress = CollectionProgress()
@@ -0,0 +1,177 @@
+"""
+Collection Timings for Switch Log Analyzer
+Per-switch, per-stage timings of every collection run (collection_switch_runs)
+and p50/p95 statistics across runs to spot slow switches and regressions
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from metrics import observe_switch_run
+from models import db, CollectionSwitchRun
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('total_seconds', 'connect_seconds', 'ssh_wait_seconds', 'parse_seconds',
+          'lookup_seconds', 'insert_seconds')
+
+# The latest run of a switch is a regression when it took this many times its window p50
+REGRESSION_FACTOR = 1.5
+
+# Runs returned by the per-switch trend
+TREND_LIMIT = 50
+
+# Completed runs considered when estimating a switch's duration for longest-first ordering
+ORDERING_HISTORY_DAYS = 30
+
+
+def record_switch_run(collection_id: str, switch_name: str, started_at: datetime, total_seconds: float,
+                      collector_timings: Optional[Dict] = None, lookup_seconds: float = 0.0,
+                      insert_seconds: float = 0.0, entries_seen: int = 0, entries_inserted: int = 0,
+                      error: Optional[str] = None) -> Dict:
+    """
+    Store one switch's outcome and stage timings (own commit, never raises)
+
+    collector_timings is SimpleLogCollector.timings: connect and parse time
+    plus per-context SSH wait, bytes and parsed entries. Returns the stage
+    summary (fed to the adaptive concurrency controller).
+    """
+    timings = collector_timings or {}
+    contexts = timings.get('contexts', {})
+    status = 'failed' if error else 'completed'
+    ssh_wait_seconds = sum(c['wait_seconds'] for c in contexts.values())
+    bytes_received = sum(c['bytes'] for c in contexts.values())
+    observe_switch_run(switch_name, status, {
+        'total': total_seconds, 'connect': timings.get('connect_seconds'), 'ssh_wait': ssh_wait_seconds,
+        'parse': timings.get('parse_seconds'), 'lookup': lookup_seconds, 'insert': insert_seconds,
+    }, bytes_received, entries_seen, entries_inserted)
+    try:
+        db.session.add(CollectionSwitchRun(
+            collection_id=collection_id,
+            switch_name=switch_name,
+            started_at=started_at,
+            completed_at=datetime.utcnow(),
+            status=status,
+            total_seconds=round(total_seconds, 3),
+            connect_seconds=round(timings.get('connect_seconds', 0.0), 3),
+            ssh_wait_seconds=round(ssh_wait_seconds, 3),
+            parse_seconds=round(timings.get('parse_seconds', 0.0), 3),
+            lookup_seconds=round(lookup_seconds, 3),
+            insert_seconds=round(insert_seconds, 3),
+            context_timings=contexts,
+            bytes_received=bytes_received,
+            entries_seen=entries_seen,
+            entries_inserted=entries_inserted,
+            error=error
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"TIMINGS: Could not record run of {switch_name}: {e}")
+
+    return {
+        'total_seconds': total_seconds,
+        'connect_seconds': timings.get('connect_seconds', 0.0),
+        'ssh_wait_seconds': ssh_wait_seconds,
+        'bytes_received': bytes_received,
+        'insert_seconds': insert_seconds,
+        'entries_inserted': entries_inserted,
+    }
+
+
+def _percentile(fraction: float, column):
+    return func.percentile_cont(fraction).within_group(column)
+
+
+def _round(value) -> Optional[float]:
+    return round(float(value), 3) if value is not None else None
+
+
+def get_switch_timing_stats(days: int = 30, switch_name: Optional[str] = None) -> List[Dict]:
+    """
+    p50/p95 of every stage per switch over the last days, with the latest run
+
+    A switch is flagged as a regression when its latest run took more than
+    REGRESSION_FACTOR times its p50 total. Slowest p95 first.
+    """
+    model = CollectionSwitchRun
+    since = datetime.utcnow() - timedelta(days=days)
+
+    columns = [model.switch_name, func.count(), func.count().filter(model.status == 'failed')]
+    for stage in STAGES:
+        columns += [_percentile(0.5, getattr(model, stage)), _percentile(0.95, getattr(model, stage))]
+    query = db.session.query(*columns).filter(model.started_at >= since)
+    latest_query = db.session.query(model).filter(model.started_at >= since)
+    if switch_name:
+        query = query.filter(model.switch_name == switch_name)
+        latest_query = latest_query.filter(model.switch_name == switch_name)
+    rows = query.group_by(model.switch_name).all()
+
+    latest = {
+        run.switch_name: run for run in
+        latest_query.distinct(model.switch_name).order_by(model.switch_name, model.started_at.desc())
+    }
+
+    stats = []
+    for row in rows:
+        p50 = {stage: _round(row[3 + 2 * i]) for i, stage in enumerate(STAGES)}
+        p95 = {stage: _round(row[4 + 2 * i]) for i, stage in enumerate(STAGES)}
+        last = latest.get(row[0])
+        last_total = last.total_seconds if last else None
+        stats.append({
+            'switch_name': row[0],
+            'runs': row[1],
+            'failures': row[2],
+            'p50': p50,
+            'p95': p95,
+            'last': last.to_dict() if last else None,
+            'regression': bool(row[1] > 1 and last_total and p50['total_seconds']
+                               and last_total > REGRESSION_FACTOR * p50['total_seconds']),
+        })
+    return sorted(stats, key=lambda s: s['p95']['total_seconds'] or 0, reverse=True)
+
+
+def get_switch_timing_trend(switch_name: str, limit: int = TREND_LIMIT) -> List[Dict]:
+    """Latest runs of one switch, oldest first"""
+    runs = (CollectionSwitchRun.query
+            .filter(CollectionSwitchRun.switch_name == switch_name)
+            .order_by(CollectionSwitchRun.started_at.desc())
+            .limit(limit).all())
+    return [run.to_dict() for run in reversed(runs)]
+
+
+def get_collection_switch_runs(collection_id: str) -> List[Dict]:
+    """Per-switch rows of one collection run, slowest first"""
+    runs = (CollectionSwitchRun.query
+            .filter(CollectionSwitchRun.collection_id == collection_id)
+            .order_by(CollectionSwitchRun.total_seconds.desc().nullslast())
+            .all())
+    return [run.to_dict() for run in runs]
+
+
+def get_expected_durations(days: int = ORDERING_HISTORY_DAYS) -> Dict[str, float]:
+    """Median total time of each switch's completed runs over the last days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (db.session.query(CollectionSwitchRun.switch_name, _percentile(0.5, CollectionSwitchRun.total_seconds))
+            .filter(CollectionSwitchRun.started_at >= since, CollectionSwitchRun.status == 'completed')
+            .group_by(CollectionSwitchRun.switch_name)
+            .all())
+    return {name: float(seconds) for name, seconds in rows if seconds is not None}
+
+
+def order_longest_first(switches: List[str], expected: Dict[str, float]) -> List[str]:
+    """
+    switches.conf entries sorted by expected duration, longest first
+
+    Switches without history go first: they may be the largest, and starting
+    them early costs nothing. Ties keep the configuration order.
+    """
+    def expected_seconds(switch_info: str) -> float:
+        parts = switch_info.split(':')
+        name = parts[1] if len(parts) >= 2 else switch_info
+        return expected.get(name, float('inf'))
+
+    return sorted(switches, key=expected_seconds, reverse=True)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Collector Daemon for Switch Log Analyzer
+Runs collections, scheduled jobs and device refreshes outside the web process.
+The web app (COLLECTION_DAEMON=true, DISABLE_INTERNAL_SCHEDULER=true) only queues
+runs in collection_requests and reads their progress from the database.
+
+Usage:
+    python collector_daemon.py run               # Daemon: queued requests, scheduled jobs, device refresh
+    python collector_daemon.py collect           # One collection now (SWITCH_USERNAME/SWITCH_PASSWORD)
+    python collector_daemon.py refresh-devices   # Refresh device_port.json and the lookup index
+    python collector_daemon.py migrate           # Schema upgrades and data backfills, in the foreground
+    python collector_daemon.py replay [--since ISO] [--until ISO] [--switch ADDR] [--file SEGMENT]
+                                                 # Ingest archived context outputs again, without SSH
+"""
+
+import argparse
+import base64
+import logging
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+
+# The daemon owns the schedule; the web app's scheduler must not be created in this process
+os.environ['DISABLE_INTERNAL_SCHEDULER'] = 'true'
+os.makedirs('logs', exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/app.log'),
+        logging.StreamHandler()
+    ]
+)
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from app_factory import get_app
+from config import Config
+from models import db, ScheduledJob
+from metrics import instrument_scheduler
+from device_lookup_optimized import refresh_device_port_data
+from final_working_collector import collection_queue_worker, replay_captures
+from capture_archive import capture_archive
+from db_migrations import run_data_migrations
+from scheduled_jobs import (create_tables, scheduled_backup_job, scheduled_collection_job, scheduled_data_migrations,
+                            scheduled_partition_maintenance)
+from scheduler_config import SchedulerConfig
+from sqlalchemy import text
+from work_queue import POLL_INTERVAL, claim_collection_request, finish_collection_request, worker_id
+
+logger = logging.getLogger(__name__)
+
+# Database app only: no web routes, static precompression or in-process scheduler
+app = get_app()
+
+# Seconds between reloads of the ScheduledJob table (jobs are edited in the web UI)
+JOB_SYNC_INTERVAL = 60
+
+# Jobs registered by the daemon itself rather than stored in ScheduledJob
+SYSTEM_JOB_IDS = ['daemon_job_sync', 'partition_maintenance', 'device_refresh', 'data_migrations']
+
+
+def refresh_devices():
+    """Copy device_port.json from the container and rebuild the lookup index"""
+    try:
+        with app.app_context():
+            if refresh_device_port_data():
+                logger.info("DAEMON: Device lookup index refreshed")
+            else:
+                logger.warning("DAEMON: Device refresh failed, keeping the previous index")
+    except Exception as e:
+        logger.error(f"DAEMON: Device refresh error: {e}")
+
+
+def _decode_password(password: str) -> str:
+    try:
+        return base64.b64decode(password.encode()).decode()
+    except Exception:
+        return password
+
+
+class CollectorDaemon:
+    """Scheduler plus the loop that starts collections queued by the web app"""
+
+    def __init__(self):
+        self.scheduler = BackgroundScheduler(**SchedulerConfig.get_scheduler_config())
+        instrument_scheduler(self.scheduler)
+        self._job_signatures = {}
+        self._stop = threading.Event()
+
+    def sync_jobs(self):
+        """Add, replace and remove jobs so the schedule matches the enabled ScheduledJob rows"""
+        try:
+            with app.app_context():
+                wanted = {job.id: job for job in ScheduledJob.query.filter_by(enabled=True).all()}
+                db.session.close()
+        except Exception as e:
+            logger.error(f"DAEMON: Job sync failed: {e}")
+            return
+
+        for job_id in set(self._job_signatures) - set(wanted):
+            self.scheduler.remove_job(job_id)
+            del self._job_signatures[job_id]
+            logger.info(f"DAEMON: Removed job {job_id}")
+
+        for job_id, job in wanted.items():
+            signature = (job.name, job.cron_expression, job.username, job.password)
+            if self._job_signatures.get(job_id) == signature:
+                continue
+            try:
+                trigger = CronTrigger.from_crontab(job.cron_expression)
+                if 'backup' in job.name.lower():
+                    self.scheduler.add_job(scheduled_backup_job, trigger, id=job_id, name=job.name,
+                                           replace_existing=True, max_instances=1)
+                else:
+                    self.scheduler.add_job(scheduled_collection_job, trigger, id=job_id, name=job.name,
+                                           args=[job.username, _decode_password(job.password)],
+                                           replace_existing=True, max_instances=1)
+                self._job_signatures[job_id] = signature
+                logger.info(f"DAEMON: Scheduled job {job.name} ({job.cron_expression})")
+            except Exception as e:
+                logger.error(f"DAEMON: Failed to schedule job {job.name}: {e}")
+
+    def setup_system_jobs(self):
+        self.scheduler.add_job(self.sync_jobs, 'interval', seconds=JOB_SYNC_INTERVAL, id='daemon_job_sync',
+                               name='Scheduled job sync', replace_existing=True, max_instances=1)
+        self.scheduler.add_job(scheduled_partition_maintenance, CronTrigger(hour=1, minute=30),
+                               id='partition_maintenance', name='Partition maintenance',
+                               replace_existing=True, max_instances=1)
+        # Once at startup: backfills of rows stored before a schema upgrade
+        self.scheduler.add_job(scheduled_data_migrations, 'date', id='data_migrations', name='Data migrations',
+                               replace_existing=True, max_instances=1)
+        if Config.DEVICE_REFRESH_MINUTES > 0:
+            self.scheduler.add_job(refresh_devices, 'interval', minutes=Config.DEVICE_REFRESH_MINUTES,
+                                   id='device_refresh', name='Device refresh',
+                                   replace_existing=True, max_instances=1)
+
+    def run_queued_request(self) -> bool:
+        """Start the oldest collection queued by the web app; False when none is waiting"""
+        with app.app_context():
+            claimed = claim_collection_request(worker_id())
+            if claimed is None:
+                return False
+            logger.info(f"DAEMON: Starting collection request {claimed['id']} ({claimed['source']})")
+
+        # Same path as scheduled runs: advisory lock, collection, cleanup of temporary files
+        result = scheduled_collection_job(claimed['username'], claimed['password'])
+
+        with app.app_context():
+            finish_collection_request(claimed['id'], result)
+        return True
+
+    def stop(self, signum=None, frame=None):
+        logger.info("DAEMON: Stopping after the current collection")
+        self._stop.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.setup_system_jobs()
+        self.sync_jobs()
+        self.scheduler.start()
+        # Also take other hosts' work queue tasks when COLLECTION_QUEUE_WORKER is set
+        collection_queue_worker.start(app)
+        logger.info(f"DAEMON: Collector daemon {worker_id()} running "
+                    f"({len(self._job_signatures)} scheduled jobs)")
+
+        try:
+            while not self._stop.is_set():
+                try:
+                    if self.run_queued_request():
+                        continue
+                except Exception as e:
+                    logger.error(f"DAEMON: Collection request failed: {e}")
+                self._stop.wait(POLL_INTERVAL)
+        finally:
+            self.scheduler.shutdown(wait=False)
+            logger.info("DAEMON: Stopped")
+
+
+def replay(since=None, until=None, switches=None, paths=None):
+    """Replay archived captures under the collection lock, so no collection runs alongside"""
+    with app.app_context():
+        if not db.session.execute(text("SELECT pg_try_advisory_lock(12345) AS acquired")).fetchone().acquired:
+            logger.error("Replay refused - a collection is running")
+            return None
+        try:
+            records = capture_archive.records(paths, since=since, until=until, switches=switches)
+            return replay_captures(records)
+        finally:
+            db.session.execute(text("SELECT pg_advisory_unlock(12345)"))
+            db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Switch Log Analyzer collector daemon')
+    parser.add_argument('command', nargs='?', default='run',
+                        choices=['run', 'collect', 'refresh-devices', 'replay', 'migrate'])
+    parser.add_argument('--since', type=datetime.fromisoformat, help='replay: first capture time (local, ISO)')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='replay: last capture time (local, ISO)')
+    parser.add_argument('--switch', action='append', dest='switches', help='replay: switch address (repeatable)')
+    parser.add_argument('--file', action='append', dest='paths', help='replay: capture segment (repeatable)')
+    args = parser.parse_args()
+
+    create_tables()
+
+    if args.command == 'collect':
+        result = scheduled_collection_job(Config.DEFAULT_USERNAME, Config.DEFAULT_PASSWORD)
+        if result is None:
+            logger.error("Another collection is already running")
+            return 1
+        logger.info(f"Collection result: {result}")
+        return 0 if result.get('success') else 1
+
+    if args.command == 'refresh-devices':
+        refresh_devices()
+        return 0
+
+    if args.command == 'migrate':
+        # create_tables() above applied the schema upgrades
+        with app.app_context():
+            return 0 if run_data_migrations() else 1
+
+    if args.command == 'replay':
+        result = replay(args.since, args.until, args.switches, args.paths)
+        if result is None:
+            return 1
+        logger.info(f"Replay result: {result}")
+        return 0 if result.get('success') else 1
+
+    CollectorDaemon().run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
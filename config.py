@@ -14,10 +14,69 @@ class Config:
     # Default switch credentials (can be overridden in UI)
     DEFAULT_USERNAME = os.getenv('SWITCH_USERNAME', '')
     DEFAULT_PASSWORD = os.getenv('SWITCH_PASSWORD', '')
+    SWITCH_SSH_PORT = int(os.getenv('SWITCH_SSH_PORT', '22'))  # e.g. 2222 for fake_switch_server.py
     
     # Switch configuration file
     SWITCHES_CONFIG_FILE = os.getenv('SWITCHES_CONFIG_FILE', 'switches.conf')
     
+    # log_entries range partitioning (see partitioning.py)
+    LOG_PARTITION_INTERVAL = os.getenv('LOG_PARTITION_INTERVAL', 'month')  # 'day', 'week' or 'month'
+    LOG_PARTITIONS_AHEAD = int(os.getenv('LOG_PARTITIONS_AHEAD', '3'))  # Future partitions kept ready
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '0'))  # 0 = keep all partitions
+    LOG_PARTITION_AUTO_MIGRATE = os.getenv('LOG_PARTITION_AUTO_MIGRATE', 'false').lower() == 'true'  # Else on request
+    LOG_PARTITION_COPY_BATCH = int(os.getenv('LOG_PARTITION_COPY_BATCH', '50000'))
+    
+    # Search totals/facets cache (see search_cache.py)
+    SEARCH_COUNT_CACHE_SIZE = int(os.getenv('SEARCH_COUNT_CACHE_SIZE', '256'))
+    SEARCH_COUNT_CACHE_TTL = int(os.getenv('SEARCH_COUNT_CACHE_TTL', '60'))  # Seconds
+    SEARCH_RESULT_CACHE_SIZE = int(os.getenv('SEARCH_RESULT_CACHE_SIZE', '512'))  # Search pages/stats per worker
+    SEARCH_RESULT_CACHE_TTL = int(os.getenv('SEARCH_RESULT_CACHE_TTL', '600'))  # Safety net, ingest invalidates
+    
+    # Query budgets for user-driven queries (see query_guard.py); costs are PostgreSQL planner units, 0 = no limit
+    SEARCH_STATEMENT_TIMEOUT_MS = int(os.getenv('SEARCH_STATEMENT_TIMEOUT_MS', '15000'))
+    STATS_STATEMENT_TIMEOUT_MS = int(os.getenv('STATS_STATEMENT_TIMEOUT_MS', '10000'))
+    EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv('EXPORT_STATEMENT_TIMEOUT_MS', '120000'))  # Per fetched batch
+    SEARCH_MAX_QUERY_COST = float(os.getenv('SEARCH_MAX_QUERY_COST', '20000000'))
+    SEARCH_EXACT_COUNT_MAX_COST = float(os.getenv('SEARCH_EXACT_COUNT_MAX_COST', '500000'))
+    
+    # Parallel switches per collection (see adaptive_concurrency.py); min = max gives a fixed pool
+    COLLECTION_MIN_WORKERS = int(os.getenv('COLLECTION_MIN_WORKERS', '1'))
+    COLLECTION_INITIAL_WORKERS = int(os.getenv('COLLECTION_INITIAL_WORKERS', '2'))
+    COLLECTION_MAX_WORKERS = int(os.getenv('COLLECTION_MAX_WORKERS', '8'))
+    COLLECTION_MAX_PER_SITE = int(os.getenv('COLLECTION_MAX_PER_SITE', '4'))
+    COLLECTION_BACKOFF_RATIO = float(os.getenv('COLLECTION_BACKOFF_RATIO', '2.0'))  # Latency vs best before backing off
+    COLLECTION_LONGEST_FIRST = os.getenv('COLLECTION_LONGEST_FIRST', 'true').lower() == 'true'  # Order by past run time
+    # Processes parsing/enriching context output (see parse_pool.py); 0 = in the collector threads, -1 = one per core
+    COLLECTION_PARSE_PROCESSES = int(os.getenv('COLLECTION_PARSE_PROCESSES', '0'))
+    
+    # Collection engine: 'threads' (adaptive thread pool) or 'asyncio' (async_collector.py, needs asyncssh)
+    COLLECTION_ENGINE = os.getenv('COLLECTION_ENGINE', 'threads').lower()
+    COLLECTION_ASYNC_MAX_SESSIONS = int(os.getenv('COLLECTION_ASYNC_MAX_SESSIONS', '200'))
+    COLLECTION_ASYNC_MAX_PER_SITE = int(os.getenv('COLLECTION_ASYNC_MAX_PER_SITE', '50'))
+    COLLECTION_ASYNC_DB_THREADS = int(os.getenv('COLLECTION_ASYNC_DB_THREADS', '4'))  # Keep below the DB pool size
+    
+    # Distributed collection work queue (see work_queue.py)
+    COLLECTION_QUEUE_WORKER = os.getenv('COLLECTION_QUEUE_WORKER', 'false').lower() == 'true'  # Take tasks of any run
+    COLLECTION_TASK_LEASE_SECONDS = int(os.getenv('COLLECTION_TASK_LEASE_SECONDS', '120'))
+    COLLECTION_TASK_MAX_ATTEMPTS = int(os.getenv('COLLECTION_TASK_MAX_ATTEMPTS', '3'))
+    
+    # Collections run by collector_daemon.py: the web app only queues them (also set DISABLE_INTERNAL_SCHEDULER)
+    COLLECTION_DAEMON = os.getenv('COLLECTION_DAEMON', 'false').lower() == 'true'
+    DEVICE_REFRESH_MINUTES = int(os.getenv('DEVICE_REFRESH_MINUTES', '60'))  # Daemon device index refresh, 0 = off
+    COLLECTION_REQUEST_TTL_MINUTES = int(os.getenv('COLLECTION_REQUEST_TTL_MINUTES', '30'))  # Unclaimed requests expire
+    
+    # Raw context output archive for replay without SSH (see capture_archive.py)
+    CAPTURE_ENABLED = os.getenv('CAPTURE_ENABLED', 'true').lower() == 'true'
+    CAPTURE_DIR = os.getenv('CAPTURE_DIR', 'logs/captures')
+    CAPTURE_COMPRESS_LEVEL = int(os.getenv('CAPTURE_COMPRESS_LEVEL', '6'))  # gzip level, 1 = fastest
+    CAPTURE_MAX_MB = int(os.getenv('CAPTURE_MAX_MB', '2048'))  # Total archive size, 0 = no limit
+    CAPTURE_RETENTION_DAYS = int(os.getenv('CAPTURE_RETENTION_DAYS', '14'))  # 0 = no age limit
+    
+    # Threads per gunicorn worker (simple_gunicorn_config.py): 1 = sync worker, more = gthread worker
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '1'))
+    # Live collection progress streams (see collection_progress.py); capped at GUNICORN_THREADS - 1
+    PROGRESS_STREAM_MAX_CLIENTS = int(os.getenv('PROGRESS_STREAM_MAX_CLIENTS', '4'))
+    
     @staticmethod
     def load_switches():
         """Load switch list from configuration file"""
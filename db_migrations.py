@@ -0,0 +1,296 @@
+"""
+Database Migrations for Switch Log Analyzer
+Idempotent catalog-only schema upgrades applied at startup on top of
+db.create_all(), and data migrations (backfills of existing rows and index
+builds) run by a background job or `collector_daemon.py migrate`, never at startup
+"""
+
+import contextlib
+import logging
+from sqlalchemy import text
+from models import db, AppConfig
+from partitioning import ensure_log_partitions
+from rollups import ensure_rollups
+
+logger = logging.getLogger(__name__)
+
+# Columns served by pg_trgm GIN indexes for substring (ILIKE '%term%') search
+TRIGRAM_INDEXED_COLUMNS = ['wwn', 'alias', 'node_symbol', 'event_type']
+
+# pg_advisory lock key: one process (gunicorn master, worker, collector daemon) builds indexes at a time
+INDEX_LOCK_KEY = 73027
+# pg_advisory lock key: one process runs the data migrations at a time
+DATA_MIGRATION_LOCK_KEY = 73028
+
+# Rows updated per transaction when backfilling existing data
+BACKFILL_BATCH_SIZE = 50000
+
+# SQL equivalent of wwn_utils.normalize_wwn(): hex digits, biased BIGINT and canonical text
+WWN_HEX_SQL = "regexp_replace(lower(wwn), '[:.[:space:]-]', '', 'g')"
+WWN_INT_SQL = f"(('x' || {WWN_HEX_SQL})::bit(64)::bigint # (-9223372036854775808)::bigint)"
+WWN_CANONICAL_SQL = f"regexp_replace({WWN_HEX_SQL}, '(..)(?!$)', '\\1:', 'g')"
+
+
+def get_autocommit_connection():
+    """Connection outside a transaction block, required by CREATE INDEX CONCURRENTLY"""
+    return db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+def concurrently(conn, table: str = 'log_entries') -> str:
+    """CONCURRENTLY for plain tables; partitioned tables only support regular index DDL"""
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {'t': table}).scalar()
+    return '' if relkind == 'p' else 'CONCURRENTLY '
+
+
+@contextlib.contextmanager
+def advisory_lock(conn, key: int):
+    """Session advisory lock held while the block runs; yields False when another process holds it"""
+    acquired = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {'k': key}).scalar()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {'k': key})
+
+
+def index_build_lock(conn):
+    """
+    Advisory lock around index DDL. An index another process is still building
+    CONCURRENTLY is INVALID until it finishes, so it must not be dropped as a
+    failed build.
+    """
+    return advisory_lock(conn, INDEX_LOCK_KEY)
+
+
+def drop_invalid_index(conn, index_name: str):
+    """
+    A failed concurrent build leaves an INVALID index behind; drop it so it can
+    be rebuilt (only under index_build_lock, see there)
+    """
+    invalid = conn.execute(text("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND NOT i.indisvalid
+    """), {'name': index_name}).first()
+    if invalid:
+        logger.warning(f"MIGRATION: Rebuilding invalid index {index_name}")
+        conn.execute(text(f"DROP INDEX {concurrently(conn)}IF EXISTS {index_name}"))
+
+
+def ensure_pg_trgm() -> bool:
+    """Create the pg_trgm extension if possible (needs postgresql-contrib)"""
+    try:
+        with get_autocommit_connection() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            return True
+    except Exception as e:
+        logger.warning(f"MIGRATION: pg_trgm extension unavailable, substring search will not use trigram indexes: {e}")
+        return False
+
+
+def ensure_trigram_indexes(conn) -> list:
+    """
+    Create GIN trigram indexes on the searchable log_entries columns
+
+    Built CONCURRENTLY so an existing installation keeps accepting inserts while
+    the indexes are created. Returns the list of indexes that are present.
+    """
+    if not ensure_pg_trgm():
+        return []
+
+    created = []
+    for column in TRIGRAM_INDEXED_COLUMNS:
+        index_name = f"idx_log_entries_{column}_trgm"
+        try:
+            drop_invalid_index(conn, index_name)
+            conn.execute(text(
+                f"CREATE INDEX {concurrently(conn)}IF NOT EXISTS {index_name} "
+                f"ON log_entries USING gin ({column} gin_trgm_ops)"
+            ))
+            created.append(index_name)
+        except Exception as e:
+            logger.error(f"MIGRATION: Failed to create trigram index {index_name}: {e}")
+
+    if created:
+        logger.info(f"MIGRATION: Trigram indexes ready: {', '.join(created)}")
+    return created
+
+
+def ensure_wwn_int_column():
+    """
+    Add the numeric WWN column to an existing log_entries table; a nullable
+    column without default is a catalog-only change. Existing rows are filled
+    by backfill_wwn_int, its index is built by ensure_indexes afterwards.
+    """
+    with get_autocommit_connection() as conn:
+        conn.execute(text("ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS wwn_int BIGINT"))
+
+
+def ensure_wwn_int_index(conn):
+    drop_invalid_index(conn, 'idx_wwn_int_timestamp')
+    conn.execute(text(
+        f"CREATE INDEX {concurrently(conn)}IF NOT EXISTS idx_wwn_int_timestamp ON log_entries (wwn_int, timestamp)"
+    ))
+    # Superseded by idx_wwn_int_timestamp (exact/prefix) and the trigram index (substring)
+    conn.execute(text(f"DROP INDEX {concurrently(conn)}IF EXISTS idx_wwn_timestamp"))
+
+
+def backfill(name: str, update_sql: str, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Run update_sql over all existing log_entries rows in id-range batches
+
+    Each batch (:low <= id < :high) commits on its own so collections keep
+    inserting meanwhile. Progress is stored in app_config under
+    migration_<name>_backfill (last id done, then 'done'), so an interrupted
+    backfill resumes where it stopped. Rows inserted later are filled at ingest.
+    """
+    key = f"migration_{name}_backfill"
+    progress = AppConfig.get_value(key)
+    if progress == 'done':
+        return 0
+
+    updated = 0
+    with get_autocommit_connection() as conn:
+        min_id, max_id = conn.execute(text("SELECT min(id), max(id) FROM log_entries")).first()
+        if min_id is not None:
+            start = max(min_id, int(progress) + 1) if progress else min_id
+            logger.info(f"MIGRATION: Backfilling {name} for ids {start}..{max_id}")
+            for low in range(start, max_id + 1, batch_size):
+                high = min(low + batch_size, max_id + 1)
+                updated += conn.execute(text(update_sql), {'low': low, 'high': high}).rowcount
+                AppConfig.set_value(key, high - 1)
+
+    AppConfig.set_value(key, 'done')
+    logger.info(f"MIGRATION: {name} backfill complete ({updated} rows updated)")
+    return updated
+
+
+def backfill_wwn_int(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Normalize WWNs of rows stored before wwn_int existed"""
+    return backfill('wwn_int', f"""
+        UPDATE log_entries
+        SET wwn_int = {WWN_INT_SQL}, wwn = {WWN_CANONICAL_SQL}
+        WHERE id >= :low AND id < :high
+          AND wwn_int IS NULL
+          AND {WWN_HEX_SQL} ~ '^[0-9a-f]{{16}}$'
+    """, batch_size)
+
+
+RAW_TSV_SQL = "to_tsvector('simple', raw_line)"
+RAW_TSV_FUNCTION = 'log_entries_raw_tsv'
+
+
+def raw_tsv_trigger_sql(table: str = 'log_entries') -> str:
+    """Row trigger filling raw_tsv where it is a plain column (also used by the partition migration)"""
+    return (f"CREATE TRIGGER {RAW_TSV_FUNCTION} BEFORE INSERT OR UPDATE OF raw_line ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {RAW_TSV_FUNCTION}()")
+
+
+def ensure_raw_line_fulltext():
+    """
+    Add the raw_tsv full-text column to an existing log_entries table
+
+    New tables get a STORED generated column from create_all(). Adding one to
+    an existing table would rewrite it under an exclusive lock, so there the
+    column is a plain nullable tsvector (a catalog-only change) kept current
+    by a trigger; rows stored before are filled by backfill_raw_tsv and match
+    full-text searches once done. The index is built by ensure_indexes.
+    """
+    with get_autocommit_connection() as conn:
+        generated = conn.execute(text("""
+            SELECT is_generated FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'log_entries' AND column_name = 'raw_tsv'
+        """)).scalar()
+        if generated == 'ALWAYS':
+            return
+        if generated is None:
+            logger.info("MIGRATION: Adding raw_tsv full-text column to log_entries (filled by a trigger and backfill)")
+        conn.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {RAW_TSV_FUNCTION}() RETURNS trigger AS $$
+            BEGIN
+                NEW.raw_tsv := to_tsvector('simple', NEW.raw_line);
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(text("ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS raw_tsv tsvector"))
+        if not conn.execute(text(
+            "SELECT 1 FROM pg_trigger WHERE tgrelid = 'log_entries'::regclass AND tgname = :name"
+        ), {'name': RAW_TSV_FUNCTION}).first():
+            conn.execute(text(raw_tsv_trigger_sql()))
+
+
+def backfill_raw_tsv(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Fill raw_tsv of rows stored before the trigger-maintained column was added"""
+    with get_autocommit_connection() as conn:
+        generated = conn.execute(text("""
+            SELECT is_generated FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'log_entries' AND column_name = 'raw_tsv'
+        """)).scalar()
+    if generated != 'NEVER':
+        return 0
+    return backfill('raw_tsv', f"""
+        UPDATE log_entries SET raw_tsv = {RAW_TSV_SQL}
+        WHERE id >= :low AND id < :high AND raw_tsv IS NULL
+    """, batch_size)
+
+
+def ensure_raw_tsv_index(conn):
+    drop_invalid_index(conn, 'idx_log_entries_raw_tsv')
+    conn.execute(text(
+        f"CREATE INDEX {concurrently(conn)}IF NOT EXISTS idx_log_entries_raw_tsv ON log_entries USING gin (raw_tsv)"
+    ))
+
+
+def ensure_indexes() -> bool:
+    """
+    Build the indexes create_all() cannot express, in one process at a time
+
+    Part of the data migrations: while one process builds, the others skip
+    instead of dropping its still-invalid indexes and starting over.
+    Returns False when skipped.
+    """
+    with get_autocommit_connection() as conn:
+        with index_build_lock(conn) as acquired:
+            if not acquired:
+                logger.info("MIGRATION: Indexes are being built by another process, skipping")
+                return False
+            ensure_wwn_int_index(conn)
+            ensure_raw_tsv_index(conn)
+            ensure_trigram_indexes(conn)
+    return True
+
+
+def run_data_migrations() -> bool:
+    """
+    Backfill existing rows, build the rollups, then the indexes (call inside an app context);
+    runs in one process at a time and returns False when another one is already at it
+    """
+    with get_autocommit_connection() as conn:
+        with advisory_lock(conn, DATA_MIGRATION_LOCK_KEY) as acquired:
+            if not acquired:
+                logger.info("MIGRATION: Data migrations are running in another process, skipping")
+                return False
+            backfill_wwn_int()
+            backfill_raw_tsv()
+            # Count rows stored before the rollup tables existed (statistics read log_entries until then)
+            ensure_rollups()
+            # After the backfills, which would otherwise also update these indexes row by row
+            ensure_indexes()
+    return True
+
+
+def apply_schema_upgrades():
+    """
+    Apply all idempotent schema upgrades (call inside an app context)
+
+    Catalog-only DDL, cheap enough for the gunicorn master at startup: index
+    builds and the first rollup rebuild are left to run_data_migrations().
+    """
+    # Tables added since the installation was created (no-op for existing ones)
+    db.create_all()
+
+    ensure_wwn_int_column()
+    ensure_raw_line_fulltext()
+
+    # A freshly created partitioned log_entries accepts rows only once partitions exist
+    ensure_log_partitions()
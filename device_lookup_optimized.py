@@ -13,9 +13,13 @@ from typing import Optional, Dict, Tuple
 from functools import lru_cache
 import threading
 from datetime import datetime
+from metrics import LOOKUPS
 
 logger = logging.getLogger(__name__)
 
+# Set by the cached lookup body, which only runs on lru_cache misses (per thread)
+_lookup_state = threading.local()
+
 class DeviceLookupOptimized:
     """Optimized device lookup with SQLite indexing and LRU cache"""
     
@@ -251,6 +255,13 @@ class DeviceLookupOptimized:
             logger.debug(f"Error getting DB last update: {e}")
         return None
     
+    def get_index_version(self) -> str:
+        """Version of the indexed device data (SQLite file mtime, changes on every refresh_index)"""
+        try:
+            return str(os.path.getmtime(self.db_path))
+        except OSError:
+            return ''
+    
     def _needs_reindex(self) -> bool:
         """Check if reindexing is needed"""
         json_time = self._get_json_modification_time()
@@ -384,6 +395,7 @@ class DeviceLookupOptimized:
         Returns:
             Tuple of (alias, node_symbol) or (None, None) if not found
         """
+        _lookup_state.sqlite_result = 'miss'
         try:
             # Format WWN to match device_port.json format (uppercase with colons)
             formatted_wwn = wwn.upper().replace('-', ':') if wwn else ""
@@ -431,12 +443,14 @@ class DeviceLookupOptimized:
                     if alias or node_symbol:
                         logger.debug(f"Found lookup: {switch_name}:{slot_number}:{port_number}:{wwn} -> alias='{alias}', nodeSymbol='{node_symbol}'")
                     
+                    _lookup_state.sqlite_result = 'hit'
                     return alias, node_symbol
                 
                 return None, None
                 
         except Exception as e:
             logger.error(f"Error during lookup: {e}")
+            _lookup_state.sqlite_result = 'error'
             return None, None
     
     def get_statistics(self) -> Dict:
@@ -563,8 +577,15 @@ def extract_slot_port_from_entry(entry: Dict) -> Tuple[Optional[int], Optional[i
         return None, None
 
 def lookup_alias_and_node_symbol(switch_name: str, slot_number: int, port_number: int, wwn: str) -> Tuple[Optional[str], Optional[str]]:
-    """Wrapper function for compatibility"""
-    return device_lookup.lookup_alias_and_node_symbol(switch_name, slot_number, port_number, wwn)
+    """Wrapper function for compatibility; counts memory (lru_cache) and SQLite tier results"""
+    _lookup_state.sqlite_result = None
+    result = device_lookup.lookup_alias_and_node_symbol(switch_name, slot_number, port_number, wwn)
+    if _lookup_state.sqlite_result is None:
+        LOOKUPS.labels('memory', 'hit').inc()
+    else:
+        LOOKUPS.labels('memory', 'miss').inc()
+        LOOKUPS.labels('sqlite', _lookup_state.sqlite_result).inc()
+    return result
 
 def refresh_device_port_data() -> bool:
     """Refresh device port data from Docker container"""
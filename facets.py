@@ -0,0 +1,80 @@
+"""
+Search Facets for Switch Log Analyzer
+Per-switch, per-context and per-event counts of the filtered search set, computed
+with a single GROUPING SETS query (from the rollups when the filters allow it)
+"""
+
+import logging
+from typing import Dict, List
+
+from sqlalchemy import func, tuple_
+
+from models import db, LogEntry, LogRollupDaily
+from rollups import apply_rollup_search_filters, rollups_cover
+from search_filters import apply_search_filters
+
+logger = logging.getLogger(__name__)
+
+FACET_COLUMNS = ('switch_name', 'context', 'event_type')
+
+# Values returned per facet, largest counts first
+FACET_LIMIT = 50
+
+
+def parse_facets(value: str) -> List[str]:
+    """Facet column list from the facets=switch_name,context,event_type parameter"""
+    columns = [c.strip() for c in (value or '').split(',') if c.strip()]
+    invalid = [c for c in columns if c not in FACET_COLUMNS]
+    if invalid:
+        raise ValueError(f"Unsupported facets: {', '.join(invalid)}")
+    # Fixed order keeps cache keys and GROUPING() bitmasks stable
+    return [c for c in FACET_COLUMNS if c in columns]
+
+
+def get_facets(filters: Dict, columns: List[str]) -> Dict:
+    """
+    Total and per-column counts of the entries matching the search filters
+
+    One GROUPING SETS ((col1), (col2), ..., ()) query: the empty set is the
+    total, so the search count comes from the same scan as the facets.
+    """
+    if rollups_cover(filters):
+        source = 'rollup'
+        model = LogRollupDaily
+        count = func.sum(model.count)
+    else:
+        source = 'log_entries'
+        model = LogEntry
+        count = func.count()
+
+    group_columns = [getattr(model, c) for c in columns]
+    grouping = func.grouping(*group_columns)
+    query = db.session.query(*group_columns, grouping, count)
+    if source == 'rollup':
+        query = apply_rollup_search_filters(query, model, filters)
+    else:
+        query = apply_search_filters(query, filters)
+    grouping_sets = [tuple_(column) for column in group_columns] + [tuple_()]
+    rows = query.group_by(func.grouping_sets(*grouping_sets)).all()
+
+    # GROUPING() sets bit (n-1-i) when column i is not part of the row's grouping set
+    all_bits = (1 << len(columns)) - 1
+    masks = {all_bits ^ (1 << (len(columns) - 1 - i)): column for i, column in enumerate(columns)}
+
+    total = 0
+    facets = {column: [] for column in columns}
+    for row in rows:
+        mask, value_count = row[-2], int(row[-1] or 0)
+        if mask == all_bits:
+            total = value_count
+            continue
+        column = masks[mask]
+        value = row[columns.index(column)]
+        if column == 'event_type' and value == '':
+            value = None  # Rollups store a missing event type as ''
+        facets[column].append({'value': value, 'count': value_count})
+
+    for column in columns:
+        facets[column] = sorted(facets[column], key=lambda f: f['count'], reverse=True)[:FACET_LIMIT]
+
+    return {'total': total, 'facets': facets, 'source': source}
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Fake Brocade Switch SSH Server for Switch Log Analyzer
+Local stand-in for FOS switches: shows the NAME:FID128:user> prompt and answers
+fosexec --fid N -cmd "nsdevlog --show" with generated nsdevlog output, so
+SimpleLogCollector, the asyncio engine and the ingest pipeline can be run and
+load-tested without real switches.
+
+Usage:
+    python fake_switch_server.py --port 2222 --entries 2000
+    python fake_switch_server.py --port 2222 --switches 200 --sites 4
+    python fake_switch_server.py --switches 200 --sites 4 --print-config > switches.conf
+    python fake_switch_server.py --port 2222 --chunk-delay 0.05 --fault stall:0.05 --fault disconnect:0.02
+
+Every loopback address (127.x.y.z) connected to is a different switch: its
+name, devices and entries are derived from that address, so one server with
+--switches N stands in for N switches (listed by --print-config), and
+--instances N serves N more on consecutive ports. Output is deterministic for a given --seed and
+server start: a second collection finds no new entries.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import re
+import signal
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import asyncssh
+except ImportError:  # Optional: only needed to run the fake server
+    asyncssh = None
+
+logger = logging.getLogger(__name__)
+
+CONTEXTS = [1, 2, 3, 4, 5, 128]
+
+EVENTS = ['Device Add', 'Device Remove', 'Port Online', 'Port Offline', 'FLOGI', 'FDISC', 'PLOGI',
+          'Device Login', 'Device Logout', 'Zone Change']
+
+HEADER = ('Date/Time                Slot/Port  PID       Port WWN                 Node WWN                 Event\n'
+          + '=' * 110 + '\n')
+
+# FOS keeps at most this many nsdevlog entries per logical switch
+MAX_ENTRIES = 2048
+
+FOSEXEC = re.compile(r'fosexec\s+--fid\s+(\d+)\s+-cmd\s+"?nsdevlog\s+--show"?')
+
+# Fault name -> what happens to the command (or connection) it hits
+FAULTS = {
+    'auth-fail': 'password rejected for the connection',
+    'disconnect': 'connection dropped halfway through the output',
+    'stall': 'output stops halfway, no summary and no prompt (collector idle timeout)',
+    'no-summary': 'the "Total number of Entries" line is left out',
+    'truncate': 'fewer entries than the declared total (verification mismatch)',
+    'garbage': 'malformed lines mixed into the output',
+    'slow': 'chunk delay multiplied by 10',
+    'empty-context': 'the context reports no entries',
+}
+
+
+def _wwn(rng: random.Random) -> str:
+    return ':'.join(f"{rng.randrange(256):02x}" for _ in range(8))
+
+
+class FakeSwitchServer:
+    """One listening port; each address connected to is its own fake switch"""
+
+    def __init__(self, port: int = 2222, listen: Union[str, List[str]] = '127.0.0.1', entries: int = 1000,
+                 context_entries: Optional[Dict[int, int]] = None, span_days: int = 400,
+                 devices: int = 64, chunk_bytes: int = 8192, chunk_delay: float = 0.0,
+                 command_delay: float = 0.0, faults: Optional[Dict[str, float]] = None, seed: int = 0,
+                 username: Optional[str] = None, password: Optional[str] = None):
+        self.port = port
+        self.listen = listen
+        self.entries = entries
+        self.context_entries = context_entries or {}
+        self.span_days = span_days
+        self.devices = devices
+        self.chunk_bytes = chunk_bytes
+        self.chunk_delay = chunk_delay
+        self.command_delay = command_delay
+        self.faults = faults or {}
+        self.seed = seed
+        self.username = username
+        self.password = password
+        # Entries end at server start, so repeated collections see the same log
+        self.now = datetime.now().replace(second=0, microsecond=0)
+        self.fault_rng = random.Random(seed)
+        self.stats = {'connections': 0, 'commands': 0, 'bytes': 0, 'faults': {}}
+        self._outputs = {}
+        self._acceptor = None
+        self._loop = None
+        self._thread = None
+
+    # --- Generated output -------------------------------------------------
+
+    def switch_name(self, address: str) -> str:
+        return 'fake_' + address.replace('.', '_').replace(':', '_')
+
+    def _entry_count(self, context: int) -> int:
+        return min(self.context_entries.get(context, self.entries), MAX_ENTRIES)
+
+    def switch_devices(self, switch_name: str) -> List[Tuple[str, str, str, str]]:
+        """(slot/port, PID, port WWN, node WWN) of the devices logging in on a switch"""
+        switch_rng = random.Random(f"{self.seed}:{switch_name}")
+        return [(f"{switch_rng.randrange(12)}/{switch_rng.randrange(48)}",
+                 f"0x{switch_rng.randrange(1 << 24):06x}", _wwn(switch_rng), _wwn(switch_rng))
+                for _ in range(self.devices)]
+
+    def nsdevlog_lines(self, switch_name: str, context: int) -> List[str]:
+        """Entry lines of one context, oldest first, spread over span_days up to server start"""
+        key = (switch_name, context)
+        if key not in self._outputs:
+            devices = self.switch_devices(switch_name)
+            rng = random.Random(f"{self.seed}:{switch_name}:{context}")
+            count = self._entry_count(context)
+            span = self.span_days * 86400
+            offsets = sorted((rng.uniform(0, span) for _ in range(count)), reverse=True)
+            lines = []
+            for offset in offsets:
+                when = self.now - timedelta(seconds=offset)
+                slot_port, pid, port_wwn, node_wwn = rng.choice(devices)
+                lines.append(f"{when.strftime('%a %b %d %H:%M:%S')}.{when.microsecond // 1000:03d}  "
+                             f"{slot_port:<9}  {pid}  {port_wwn}  {node_wwn}  {rng.choice(EVENTS)}\n")
+            self._outputs[key] = lines
+        return self._outputs[key]
+
+    def _fault(self, name: str) -> bool:
+        hit = self.fault_rng.random() < self.faults.get(name, 0.0)
+        if hit:
+            self.stats['faults'][name] = self.stats['faults'].get(name, 0) + 1
+        return hit
+
+    def render(self, switch_name: str, context: int) -> Tuple[str, Optional[str]]:
+        """(output text, fault cutting it short) of one nsdevlog --show"""
+        lines = [] if self._fault('empty-context') else list(self.nsdevlog_lines(switch_name, context))
+        declared = len(lines)
+        if lines and self._fault('truncate'):
+            lines = lines[:len(lines) * 9 // 10]
+        if lines and self._fault('garbage'):
+            rng = random.Random(f"{switch_name}:{context}:garbage")
+            for _ in range(max(1, len(lines) // 50)):
+                lines.insert(rng.randrange(len(lines)), f"??? {_wwn(rng)} corrupted line\n")
+        text = HEADER + ''.join(lines)
+        if not self._fault('no-summary'):
+            text += f"\nTotal number of Entries displayed = {declared}\nMax number of Entries = {MAX_ENTRIES}\n"
+        for cut in ('disconnect', 'stall'):
+            if self._fault(cut):
+                return text[:len(text) // 2], cut
+        return text, None
+
+    # --- SSH ----------------------------------------------------------------
+
+    def _server_class(self):
+        server = self
+
+        class FakeSwitch(asyncssh.SSHServer):
+            def connection_made(self, conn):
+                server.stats['connections'] += 1
+                self._reject = server._fault('auth-fail')
+
+            def begin_auth(self, username):
+                return True
+
+            def password_auth_supported(self):
+                return True
+
+            def validate_password(self, username, password):
+                if self._reject:
+                    return False
+                return ((server.username is None or username == server.username)
+                        and (server.password is None or password == server.password))
+
+        return FakeSwitch
+
+    async def _shell(self, process):
+        switch_name = self.switch_name(process.get_extra_info('sockname')[0])
+        prompt = f"{switch_name}:FID128:{process.get_extra_info('username')}> "
+        process.stdout.write(prompt)
+        try:
+            async for line in process.stdin:
+                command = line.strip()
+                match = FOSEXEC.search(command)
+                if match:
+                    self.stats['commands'] += 1
+                    context = int(match.group(1))
+                    if context not in CONTEXTS:
+                        process.stdout.write(f"Invalid FID {context}\n")
+                    elif not await self._send_output(process, switch_name, context):
+                        return
+                elif command in ('exit', 'logout'):
+                    break
+                elif command:
+                    process.stdout.write(f"rbash: {command.split()[0]}: command not found\n")
+                process.stdout.write(prompt)
+        except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged, ConnectionError):
+            pass
+        process.exit(0)
+
+    async def _send_output(self, process, switch_name: str, context: int) -> bool:
+        """Paced nsdevlog output; False when a fault ended the session"""
+        text, cut = self.render(switch_name, context)
+        delay = self.chunk_delay * (10 if self._fault('slow') else 1)
+        if self.command_delay:
+            await asyncio.sleep(self.command_delay)
+        for start in range(0, len(text), self.chunk_bytes):
+            chunk = text[start:start + self.chunk_bytes]
+            process.stdout.write(chunk)
+            self.stats['bytes'] += len(chunk)
+            if delay:
+                await asyncio.sleep(delay)
+        if cut == 'disconnect':
+            process.channel.get_connection().abort()
+            return False
+        if cut == 'stall':
+            await process.stdin.read()  # Until the client gives up and closes
+            return False
+        return True
+
+    async def start(self) -> int:
+        """Start listening; returns the bound port (useful with port=0)"""
+        if asyncssh is None:
+            raise RuntimeError("The fake switch server requires the asyncssh package")
+        if not self.port and not isinstance(self.listen, str):
+            raise ValueError("A free port (port=0) can only be picked for a single listen address")
+        key = asyncssh.generate_private_key('ssh-ed25519')
+        self._acceptor = await asyncssh.create_server(self._server_class(), self.listen, self.port,
+                                                      server_host_keys=[key], process_factory=self._shell,
+                                                      backlog=1024)
+        self.port = self._acceptor.get_port()
+        hosts = self.listen if isinstance(self.listen, str) else f"{len(self.listen)} addresses"
+        logger.info(f"FAKE: Switch server listening on {hosts}, port {self.port}")
+        return self.port
+
+    async def stop(self):
+        if self._acceptor:
+            self._acceptor.close()
+            await self._acceptor.wait_closed()
+            self._acceptor = None
+
+    def start_in_thread(self) -> 'FakeSwitchServer':
+        """Run the server on its own event loop thread (for tests and benchmarks in one process)"""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fake-switch-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+
+def loopback_switches(count: int, sites: int = 1, generation: str = 'gen7') -> List[str]:
+    """switches.conf entries for count fake switches on distinct loopback addresses"""
+    return [f"site{i % sites}:127.0.{i // 250 + 1}.{i % 250 + 1}:{generation}" for i in range(count)]
+
+
+def parse_faults(values: List[str]) -> Dict[str, float]:
+    faults = {}
+    for value in values or []:
+        name, _, probability = value.partition(':')
+        if name not in FAULTS:
+            raise argparse.ArgumentTypeError(f"Unknown fault {name} (choose from {', '.join(FAULTS)})")
+        faults[name] = float(probability or 1.0)
+    return faults
+
+
+def parse_context_entries(value: Optional[str]) -> Dict[int, int]:
+    """'1:2000,128:50' -> {1: 2000, 128: 50}"""
+    if not value:
+        return {}
+    return {int(ctx): int(count) for ctx, count in (item.split(':') for item in value.split(','))}
+
+
+async def serve(servers: List[FakeSwitchServer]):
+    for server in servers:
+        await server.start()
+    print(f"ready {' '.join(str(s.port) for s in servers)}", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    for server in servers:
+        await server.stop()
+        logger.info(f"FAKE: Port {server.port} stats: {server.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Brocade switch SSH server',
+                                     epilog='Faults: ' + '; '.join(f"{k} = {v}" for k, v in FAULTS.items()))
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--listen', default='127.0.0.1', help='Address to listen on (without --switches)')
+    parser.add_argument('--instances', type=int, default=1, help='Servers on consecutive ports')
+    parser.add_argument('--entries', type=int, default=1000, help=f'Entries per context (max {MAX_ENTRIES})')
+    parser.add_argument('--context-entries', help='Per-context entry counts, e.g. 1:2000,128:50')
+    parser.add_argument('--span-days', type=int, default=400, help='Age of the oldest entry (> 365 crosses years)')
+    parser.add_argument('--devices', type=int, default=64, help='Devices (WWNs) per switch')
+    parser.add_argument('--chunk-bytes', type=int, default=8192)
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='Seconds between output chunks')
+    parser.add_argument('--command-delay', type=float, default=0.0, help='Seconds before output starts')
+    parser.add_argument('--fault', action='append', metavar='NAME[:PROBABILITY]',
+                        help='Inject a fault (repeatable)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--username', help='Required username (any when omitted)')
+    parser.add_argument('--password', help='Required password (any when omitted)')
+    parser.add_argument('--switches', type=int, help='Listen on this many loopback switch addresses')
+    parser.add_argument('--sites', type=int, default=1)
+    parser.add_argument('--print-config', action='store_true', help='Print switches.conf lines and exit')
+    args = parser.parse_args()
+
+    if args.print_config:
+        for switch_info in loopback_switches(args.switches or 1, args.sites):
+            print(switch_info)
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    faults = parse_faults(args.fault)
+    listen = args.listen
+    if args.switches:
+        listen = [switch_info.split(':')[1] for switch_info in loopback_switches(args.switches, args.sites)]
+    servers = [FakeSwitchServer(port=args.port + i if args.port else 0, listen=listen,
+                                entries=args.entries, context_entries=parse_context_entries(args.context_entries),
+                                span_days=args.span_days, devices=args.devices, chunk_bytes=args.chunk_bytes,
+                                chunk_delay=args.chunk_delay, command_delay=args.command_delay, faults=faults,
+                                seed=args.seed + i, username=args.username, password=args.password)
+               for i in range(args.instances)]
+    asyncio.run(serve(servers))
+
+
+if __name__ == '__main__':
+    main()
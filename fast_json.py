@@ -0,0 +1,65 @@
+"""
+Fast JSON Responses for Switch Log Analyzer
+Field projection for log entry rows and orjson-based serialization for large API payloads
+"""
+
+import json
+from datetime import date, datetime
+from typing import Dict, List, Sequence
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library encoder
+    orjson = None
+
+# Fields of LogEntry.to_dict(), in response order; the default projection
+ENTRY_FIELDS = (
+    'id', 'timestamp', 'switch_name', 'context', 'event_type', 'wwn', 'port_info',
+    'raw_line', 'alias', 'node_symbol', 'collection_id', 'created_at',
+)
+
+RESPONSE_SHAPES = ('objects', 'columns')
+
+
+def parse_fields(value: str) -> List[str]:
+    """Projection from fields=timestamp,switch_name,... (all ENTRY_FIELDS when empty)"""
+    fields = [f.strip() for f in (value or '').split(',') if f.strip()]
+    if not fields:
+        return list(ENTRY_FIELDS)
+    invalid = [f for f in fields if f not in ENTRY_FIELDS]
+    if invalid:
+        raise ValueError(f"Unsupported fields: {', '.join(invalid)}")
+    # Duplicates dropped, requested order kept
+    return list(dict.fromkeys(fields))
+
+
+def shape_rows(fields: Sequence[str], rows, shape: str = 'objects') -> Dict:
+    """
+    Response body part for projected rows
+
+    'objects' gives entries=[{field: value}] like LogEntry.to_dict();
+    'columns' gives columns=[...] once and rows=[[...]] as plain arrays.
+    """
+    if shape == 'columns':
+        return {'columns': list(fields), 'rows': [list(row) for row in rows]}
+    return {'entries': [dict(zip(fields, row)) for row in rows]}
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """Serialize to compact JSON; datetimes as ISO 8601 like to_dict()"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def fast_jsonify(payload, status: int = 200):
+    """jsonify() replacement for large payloads (no pretty printing, no key sorting)"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
@@ -1,22 +1,37 @@
 """
-Final Working Collection System - Parallel processing with 4 concurrent switches
+Final Working Collection System - Parallel processing with adaptive switch concurrency
 """
 
-import os
 import logging
+import os
+import time
 import uuid
 import threading
 import concurrent.futures
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from flask import current_app
-from models import db, LogEntry, CollectionRun, SwitchStatus
+from sqlalchemy import or_
+from models import db, LogEntry, CollectionRun, CollectionTask, SwitchStatus
 from simple_switch_collector import SimpleLogCollector
 from config import Config
-from device_lookup_optimized import lookup_alias_and_node_symbol, extract_slot_port_from_entry, refresh_device_port_data
+from device_lookup_optimized import refresh_device_port_data
+from rollups import RollupBatch
+from search_cache import notify_log_entries_changed
+from collection_progress import CollectionProgress, collection_progress
+from collection_timings import record_switch_run, get_expected_durations, order_longest_first
+from adaptive_concurrency import AdaptiveConcurrency
+from metrics import TimedQueuePool
+from parse_pool import ParsedOutput, parse_pool, parse_entries, parse_context_output, collect_switch_rows
+from work_queue import (POLL_INTERVAL, enqueue_tasks, claim_task, complete_task, requeue_expired,
+                        unfinished_task_count, finalize_collection, cancel_pending_tasks, lease_keeper, worker_id,
+                        LeaseLost, check_lease)
 
 logger = logging.getLogger(__name__)
 
+# Rows per insert commit (a batch grows past it rather than split one timestamp)
+INSERT_BATCH_SIZE = 100
+
 # Thread-local storage for database sessions
 thread_local = threading.local()
 
@@ -27,8 +42,181 @@ def get_thread_db_session():
         thread_local.session = current_app.extensions['sqlalchemy'].db.session
     return thread_local.session
 
-def process_single_switch(switch_info: str, username: str, password: str, collection_id: str, app) -> Dict:
-    """Process a single switch in parallel"""
+def last_entry_timestamp(switch_name: str) -> Optional[datetime]:
+    """Timestamp of the newest stored entry of THIS SPECIFIC SWITCH (only newer entries are inserted)"""
+    last_entry = db.session.query(LogEntry.timestamp).filter_by(
+        switch_name=switch_name
+    ).order_by(LogEntry.timestamp.desc()).first()
+    db.session.commit()  # Don't hold a transaction open during the SSH read
+    
+    last_timestamp = last_entry[0] if last_entry else None
+    if last_timestamp:
+        logger.info(f"{switch_name}: Last entry timestamp: {last_timestamp}")
+    else:
+        logger.info(f"{switch_name}: First collection (no previous entries)")
+    return last_timestamp
+
+def switch_failed(switch_name: str, collection_id: str, error: str, progress: CollectionProgress,
+                  started_at: datetime, switch_start: float, collector_timings: Optional[Dict] = None,
+                  lookup_seconds: float = 0.0, insert_seconds: float = 0.0, total_entries: int = 0,
+                  inserted_count: int = 0) -> Dict:
+    """Record a failed switch (status, timings, progress) and build its result"""
+    logger.error(f"Error processing switch {switch_name}: {error}")
+    progress.switch_finished(switch_name, False, error)
+    
+    # Update switch status with error
+    try:
+        db.session.rollback()
+        switch_status = SwitchStatus.query.filter_by(switch_name=switch_name).first()
+        if switch_status:
+            switch_status.last_error = error
+            switch_status.status = 'error'
+            db.session.commit()
+    except Exception as status_error:
+        logger.error(f"Failed to update switch status: {status_error}")
+    
+    timings = record_switch_run(collection_id, switch_name, started_at, time.perf_counter() - switch_start,
+                                collector_timings, lookup_seconds, insert_seconds, total_entries,
+                                inserted_count, error=error)
+    return {
+        'switch_name': switch_name,
+        'success': False,
+        'inserted_count': 0,
+        'total_entries': 0,
+        'error': error,
+        'timings': timings
+    }
+
+def store_switch_rows(switch_name: str, collection_id: str, parsed: ParsedOutput, collector_timings: Dict,
+                      progress: CollectionProgress, started_at: datetime, switch_start: float,
+                      task_id: Optional[int] = None) -> Dict:
+    """
+    Insert a switch's parsed rows, update its SwitchStatus and record its timings
+
+    Shared by the thread and asyncio engines; returns the per-switch result
+    stored on its work queue task. With task_id every batch is committed only
+    while this process still holds the task's lease.
+    """
+    collector_timings['parse_seconds'] += parsed.parse_seconds
+    total_entries = parsed.entries
+    insert_start = None
+    inserted_count = 0
+    
+    if not total_entries:
+        logger.warning(f"{switch_name}: No entries collected")
+        progress.switch_finished(switch_name, False, 'No entries collected')
+        timings = record_switch_run(collection_id, switch_name, started_at,
+                                    time.perf_counter() - switch_start, collector_timings,
+                                    error='No entries collected')
+        return {
+            'switch_name': switch_name,
+            'success': False,
+            'inserted_count': 0,
+            'total_entries': 0,
+            'error': 'No entries collected',
+            'timings': timings
+        }
+    
+    try:
+        logger.info(f"{switch_name}: Collected {total_entries} entries, {len(parsed.rows)} new")
+        for error in parsed.errors:
+            logger.error(f"{switch_name}: Error processing entry: {error}")
+            progress.add_error(switch_name, f"Entry skipped: {error}")
+        
+        # Insert the new rows
+        progress.inserting(switch_name)
+        insert_start = time.perf_counter()
+        rollup_batch = RollupBatch()
+        # Oldest first, never splitting one timestamp across batches: whatever is committed
+        # when an insert stops part way is a clean high-water mark for last_entry_timestamp()
+        rows = sorted(parsed.rows, key=lambda row: row.timestamp)
+        pending = 0
+        for index, row in enumerate(rows):
+            db.session.add(LogEntry(switch_name=switch_name, collection_id=collection_id, **row._asdict()))
+            rollup_batch.add(row.timestamp, switch_name, row.context, row.event_type)
+            inserted_count += 1
+            pending += 1
+            
+            last_row = index + 1 == len(rows)
+            if pending >= INSERT_BATCH_SIZE and (last_row or rows[index + 1].timestamp > row.timestamp):
+                if task_id is not None:
+                    check_lease(task_id, worker_id())
+                rollup_batch.flush(db.session)
+                notify_log_entries_changed(db.session, switch_name)
+                db.session.commit()
+                progress.add_inserted(switch_name, pending)
+                pending = 0
+                logger.info(f"{switch_name}: Inserted {inserted_count} entries so far")
+        
+        # Final commit for this switch
+        if pending:
+            if task_id is not None:
+                check_lease(task_id, worker_id())
+            rollup_batch.flush(db.session)
+            notify_log_entries_changed(db.session, switch_name)
+            db.session.commit()
+            progress.add_inserted(switch_name, pending)
+        insert_seconds = time.perf_counter() - insert_start
+        
+        logger.info(f"{switch_name}: Successfully inserted {inserted_count} new entries")
+        
+        # Update switch status
+        switch_status = SwitchStatus.query.filter_by(switch_name=switch_name).first()
+        if not switch_status:
+            switch_status = SwitchStatus(
+                switch_name=switch_name,
+                last_collection_date=datetime.utcnow(),
+                last_collection_id=collection_id,
+                last_entry_count=inserted_count,
+                status='active'
+            )
+            db.session.add(switch_status)
+        else:
+            switch_status.last_collection_date = datetime.utcnow()
+            switch_status.last_collection_id = collection_id
+            switch_status.last_entry_count = inserted_count
+            switch_status.status = 'active'
+            switch_status.last_error = None
+        
+        db.session.commit()
+        progress.switch_finished(switch_name, True)
+        timings = record_switch_run(collection_id, switch_name, started_at,
+                                    time.perf_counter() - switch_start, collector_timings,
+                                    parsed.lookup_seconds, insert_seconds, total_entries, inserted_count)
+        
+        return {
+            'switch_name': switch_name,
+            'success': True,
+            'inserted_count': inserted_count,
+            'total_entries': total_entries,
+            'error': None,
+            'timings': timings
+        }
+        
+    except LeaseLost as e:
+        # The task went back to the queue: the batches committed so far hold the oldest rows,
+        # so the next owner's last_entry_timestamp() picks up exactly where they stop
+        db.session.rollback()
+        logger.warning(f"{switch_name}: {e}")
+        progress.switch_finished(switch_name, False, str(e))
+        return {
+            'switch_name': switch_name,
+            'success': False,
+            'inserted_count': 0,
+            'total_entries': total_entries,
+            'error': str(e)
+        }
+        
+    except Exception as e:
+        insert_seconds = time.perf_counter() - insert_start if insert_start else 0.0
+        return switch_failed(switch_name, collection_id, str(e), progress, started_at, switch_start,
+                             collector_timings, parsed.lookup_seconds, insert_seconds, total_entries,
+                             inserted_count)
+
+def process_single_switch(switch_info: str, username: str, password: str, collection_id: str, app,
+                          progress: Optional[CollectionProgress] = None, task_id: Optional[int] = None) -> Dict:
+    """Process a single switch in parallel (progress defaults to this process's live registry)"""
+    progress = progress or collection_progress
     # Extract actual switch name
     parts = switch_info.split(':')
     if len(parts) >= 2:
@@ -37,138 +225,148 @@ def process_single_switch(switch_info: str, username: str, password: str, collec
         actual_switch_name = switch_info
     
     logger.info(f"Processing switch: {actual_switch_name}")
+    progress.switch_started(actual_switch_name)
+    started_at = datetime.utcnow()
+    switch_start = time.perf_counter()
+    collector = None
     
     # Create application context for this thread
     with app.app_context():
         try:
-            collector = SimpleLogCollector(username, password)
-            switch_entries = collector.collect_from_switch_simple(switch_info)
+            last_timestamp = last_entry_timestamp(actual_switch_name)
             
-            if not switch_entries:
-                logger.warning(f"{actual_switch_name}: No entries collected")
-                return {
-                    'switch_name': actual_switch_name,
-                    'success': False,
-                    'inserted_count': 0,
-                    'total_entries': 0,
-                    'error': 'No entries collected'
-                }
+            # Parsing and enrichment run in the parse pool's processes when enabled,
+            # overlapping with the SSH read of the next context
+            collector = SimpleLogCollector(username, password, progress=progress, port=Config.SWITCH_SSH_PORT)
+            if parse_pool.enabled:
+                parsed = collect_switch_rows(collector, switch_info, parse_pool, since=last_timestamp)
+            else:
+                parsed = parse_entries(collector.collect_from_switch_simple(switch_info),
+                                       actual_switch_name, since=last_timestamp)
+        except Exception as e:
+            return switch_failed(actual_switch_name, collection_id, str(e), progress, started_at, switch_start,
+                                 collector.timings if collector else None)
+        
+        return store_switch_rows(actual_switch_name, collection_id, parsed, collector.timings, progress,
+                                 started_at, switch_start, task_id)
+
+def _failed_result(switch_info: str, error: str) -> Dict:
+    parts = switch_info.split(':')
+    return {
+        'switch_name': parts[1] if len(parts) >= 2 else switch_info,
+        'success': False,
+        'inserted_count': 0,
+        'total_entries': 0,
+        'error': error
+    }
+
+def sync_remote_progress(collection_id: str, owner: str, progress: CollectionProgress):
+    """Show switches of the run that other processes claimed from the work queue"""
+    tasks = (db.session.query(CollectionTask.switch_name, CollectionTask.status,
+                              CollectionTask.lease_owner, CollectionTask.error)
+             .filter(CollectionTask.collection_id == collection_id,
+                     CollectionTask.status.notin_(('pending', 'canceled')),
+                     or_(CollectionTask.lease_owner.is_(None), CollectionTask.lease_owner != owner))
+             .all())
+    db.session.commit()
+    for task in tasks:
+        progress.set_remote_status(task.switch_name, task.status, task.lease_owner, task.error)
+
+def drain_collection_tasks(username: str, password: str, app, controller: AdaptiveConcurrency,
+                           collection_id: Optional[str] = None,
+                           progress: Optional[CollectionProgress] = None) -> Dict:
+    """
+    Claim and run work queue tasks until there is nothing left to claim
+
+    With collection_id only that run's tasks are taken, and the call returns
+    once none of them is pending or running in any process (tasks of crashed
+    processes are requeued meanwhile). Without it, tasks of any run are taken
+    and the call returns as soon as the queue is empty.
+    """
+    owner = worker_id()
+    lease_keeper.start(db.engine)
+    progress = progress or collection_progress
+    summary = {'completed': 0, 'failed': 0, 'inserted': 0}
+    running = {}
+    last_poll = 0.0
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=controller.max_workers) as executor:
+        while True:
+            # Claim as many tasks as the current limit and per-site caps allow
+            while controller.has_slot():
+                task = claim_task(owner, collection_id, controller.full_sites())
+                if task is None:
+                    break
+                controller.started(task['switch_info'])
+                lease_keeper.hold(task['id'])
+                future = executor.submit(process_single_switch, task['switch_info'], username, password,
+                                         task['collection_id'], app, progress, task['id'])
+                running[future] = task
             
-            logger.info(f"{actual_switch_name}: Collected {len(switch_entries)} entries")
+            if not running and (collection_id is None or not unfinished_task_count(collection_id)):
+                break
             
-            # Get last entry timestamp for THIS SPECIFIC SWITCH
-            last_entry = db.session.query(LogEntry.timestamp).filter_by(
-                switch_name=actual_switch_name
-            ).order_by(LogEntry.timestamp.desc()).first()
+            if collection_id and time.monotonic() - last_poll >= POLL_INTERVAL:
+                last_poll = time.monotonic()
+                requeue_expired()
+                sync_remote_progress(collection_id, owner, progress)
             
-            last_timestamp = last_entry[0] if last_entry else None
-            if last_timestamp:
-                logger.info(f"{actual_switch_name}: Last entry timestamp: {last_timestamp}")
-            else:
-                logger.info(f"{actual_switch_name}: First collection (no previous entries)")
+            if not running:
+                # The remaining tasks are held by other processes
+                time.sleep(POLL_INTERVAL)
+                continue
             
-            # Insert entries
-            inserted_count = 0
-            for entry in switch_entries:
+            done, _ = concurrent.futures.wait(running, timeout=POLL_INTERVAL,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
                 try:
-                    entry_time = datetime.strptime(entry['timestamp'], '%a %b %d %Y %H:%M:%S.%f')
-                    
-                    # Only insert if newer than last entry or if first collection
-                    if not last_timestamp or entry_time > last_timestamp:
-                        # Extract WWN and port info for lookup
-                        wwn = entry.get('port_wwn') or entry.get('node_wwn')
-                        port_info = entry.get('slot_port', '') or entry.get('port_info', '')
-                        
-                        # Extract slot and port numbers for device_port.json lookup
-                        slot_number, port_number = extract_slot_port_from_entry(entry)
-                        alias, node_symbol = None, None
-                        
-                        if wwn and slot_number is not None and port_number is not None:
-                            alias, node_symbol = lookup_alias_and_node_symbol(
-                                actual_switch_name, slot_number, port_number, wwn
-                            )
-                        
-                        log_entry = LogEntry(
-                            timestamp=entry_time,
-                            switch_name=actual_switch_name,
-                            context=entry.get('context'),
-                            event_type=entry.get('event'),  # Fix: use 'event' from parser
-                            wwn=wwn,
-                            port_info=port_info,
-                            raw_line=entry.get('raw_line', ''),
-                            alias=alias,
-                            node_symbol=node_symbol,
-                            collection_id=collection_id
-                        )
-                        
-                        db.session.add(log_entry)
-                        inserted_count += 1
-                        
-                        if inserted_count % 100 == 0:
-                            db.session.commit()
-                            logger.info(f"{actual_switch_name}: Inserted {inserted_count} entries so far")
-                            
+                    result = future.result()
                 except Exception as e:
-                    logger.error(f"{actual_switch_name}: Error processing entry: {str(e)}")
-            
-            # Final commit for this switch
-            if inserted_count > 0:
-                db.session.commit()
-            
-            logger.info(f"{actual_switch_name}: Successfully inserted {inserted_count} new entries")
-            
-            # Update switch status
-            switch_status = SwitchStatus.query.filter_by(switch_name=actual_switch_name).first()
-            if not switch_status:
-                switch_status = SwitchStatus(
-                    switch_name=actual_switch_name,
-                    last_collection_date=datetime.utcnow(),
-                    last_collection_id=collection_id,
-                    last_entry_count=inserted_count,
-                    status='active'
-                )
-                db.session.add(switch_status)
-            else:
-                switch_status.last_collection_date = datetime.utcnow()
-                switch_status.last_collection_id = collection_id
-                switch_status.last_entry_count = inserted_count
-                switch_status.status = 'active'
-                switch_status.last_error = None
-            
-            db.session.commit()
-            
-            return {
-                'switch_name': actual_switch_name,
-                'success': True,
-                'inserted_count': inserted_count,
-                'total_entries': len(switch_entries),
-                'error': None
-            }
-            
-        except Exception as e:
-            error_msg = f"Error processing switch {actual_switch_name}: {str(e)}"
-            logger.error(error_msg)
-            
-            # Update switch status with error
-            try:
-                switch_status = SwitchStatus.query.filter_by(switch_name=actual_switch_name).first()
-                if switch_status:
-                    switch_status.last_error = str(e)
-                    switch_status.status = 'error'
-                    db.session.commit()
-            except Exception as status_error:
-                logger.error(f"Failed to update switch status: {status_error}")
-            
-            return {
-                'switch_name': actual_switch_name,
-                'success': False,
-                'inserted_count': 0,
-                'total_entries': 0,
-                'error': str(e)
-            }
+                    result = _failed_result(task['switch_info'], f"Thread execution failed: {e}")
+                
+                if result['success']:
+                    summary['completed'] += 1
+                    summary['inserted'] += result['inserted_count']
+                    logger.info(f"✓ {result['switch_name']}: {result['inserted_count']} new entries")
+                else:
+                    summary['failed'] += 1
+                    logger.error(f"✗ {result['switch_name']}: {result['error']}")
+                
+                lease_keeper.release(task['id'])
+                if complete_task(task['id'], owner, result):
+                    finalize_collection(task['collection_id'])
+                controller.finished(task['switch_info'], result.get('timings'), TimedQueuePool.recent_wait)
+                progress.set_concurrency(controller.limit)
+    
+    return summary
+
+def drain_with_engine(username: str, password: str, app, collection_id: Optional[str] = None,
+                      progress: Optional[CollectionProgress] = None, max_switches: Optional[int] = None) -> Dict:
+    """Drain work queue tasks with the configured engine (COLLECTION_ENGINE)"""
+    if Config.COLLECTION_ENGINE == 'asyncio':
+        from async_collector import drain_collection_tasks_async
+        return drain_collection_tasks_async(username, password, app, collection_id=collection_id,
+                                            progress=progress)
+    
+    # Parallelism adapts to switch, network and database behaviour (see adaptive_concurrency.py)
+    controller = AdaptiveConcurrency.from_config(max_switches or Config.COLLECTION_MAX_WORKERS)
+    (progress or collection_progress).set_concurrency(controller.limit)
+    logger.info(f"Processing switches with {controller.limit} parallel workers "
+                f"(adaptive, up to {controller.max_workers}, {controller.max_per_site} per site)")
+    summary = drain_collection_tasks(username, password, app, controller, collection_id=collection_id,
+                                     progress=progress)
+    logger.info(f"CONCURRENCY: Worker limit history {controller.history}")
+    return summary
 
 def run_simple_collection(username: str, password: str) -> Dict:
-    """Final working collection with 4-switch parallel processing"""
+    """
+    Start a collection run and drain its work queue tasks
+
+    Other processes with a queue worker (COLLECTION_QUEUE_WORKER) take tasks
+    of the same run; whichever process finishes the last task completes the
+    CollectionRun.
+    """
     collection_id = str(uuid.uuid4())
     
     collection_run = CollectionRun(
@@ -179,6 +377,7 @@ def run_simple_collection(username: str, password: str) -> Dict:
     db.session.commit()
     
     logger.info(f"Starting parallel collection run {collection_id}")
+    collection_progress.start(collection_id)
     
     # Refresh device_port.json at start of collection
     logger.info("Refreshing device_port.json from Docker container")
@@ -186,82 +385,223 @@ def run_simple_collection(username: str, password: str) -> Dict:
     
     try:
         switches = Config.load_switches()
+        if Config.COLLECTION_LONGEST_FIRST:
+            # Start the slowest switches first so no big director is left running alone at the end
+            try:
+                expected = get_expected_durations()
+                switches = order_longest_first(switches, expected)
+                logger.info(f"Switch order (longest first, {len(expected)} with history): {', '.join(switches)}")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Longest-first ordering unavailable, using switches.conf order: {e}")
+        collection_progress.add_switches([s.split(':')[1] if ':' in s else s for s in switches])
+        enqueue_tasks(collection_id, switches)
         
-        total_inserted = 0
-        switches_processed = []
+        summary = drain_with_engine(username, password, current_app._get_current_object(),
+                                    collection_id=collection_id, max_switches=len(switches))
+        logger.info(f"QUEUE: This process collected {summary['completed'] + summary['failed']} of "
+                    f"{len(switches)} switches")
         
-        # Determine optimal worker count based on available Gunicorn workers
-        # If running in multi-worker mode, use available workers minus scheduler worker
-        gunicorn_workers = int(os.getenv('GUNICORN_WORKERS', '1'))
-        if gunicorn_workers > 1:
-            # Reserve worker 0 for scheduler, use others for collections
-            available_workers = gunicorn_workers - 1
-            max_workers = min(available_workers, len(switches), 8)  # Cap at 8 for safety
-            logger.info(f"Multi-worker mode: Using {max_workers} of {available_workers} available collection workers")
-        else:
-            # Single-worker mode: use ThreadPool as before
-            max_workers = min(4, len(switches))
-            logger.info(f"Single-worker mode: Using {max_workers} thread workers")
-        
-        logger.info(f"Processing {len(switches)} switches with {max_workers} parallel workers")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all switch processing tasks with app context
-            future_to_switch = {
-                executor.submit(process_single_switch, switch_info, username, password, collection_id, current_app._get_current_object()): switch_info
-                for switch_info in switches
-            }
-            
-            # Collect results as they complete
-            for future in concurrent.futures.as_completed(future_to_switch):
-                switch_info = future_to_switch[future]
-                try:
-                    result = future.result()
-                    
-                    if result['success']:
-                        total_inserted += result['inserted_count']
-                        switches_processed.append(result['switch_name'])
-                        logger.info(f"✓ {result['switch_name']}: {result['inserted_count']} new entries")
-                    else:
-                        logger.error(f"✗ {result['switch_name']}: {result['error']}")
-                        switches_processed.append(f"{result['switch_name']} (failed)")
-                        
-                except Exception as e:
-                    parts = switch_info.split(':')
-                    switch_name = parts[1] if len(parts) >= 2 else switch_info
-                    logger.error(f"✗ {switch_name}: Thread execution failed: {str(e)}")
-                    switches_processed.append(f"{switch_name} (failed)")
-        
-        # Update collection record
-        collection_run.status = 'completed'
-        collection_run.completed_at = datetime.utcnow()
-        collection_run.total_entries = total_inserted
-        collection_run.new_entries = total_inserted
-        collection_run.switches_processed = switches_processed
-        db.session.commit()
+        # Normally already done by whichever process finished the last task
+        finalize_collection(collection_id)
+        db.session.refresh(collection_run)
+        if collection_run.status != 'completed':
+            raise RuntimeError(f"Collection ended with status {collection_run.status}")
+        sync_remote_progress(collection_id, worker_id(), collection_progress)
+        collection_progress.finish('completed')
         
         # Verify actual database count
         actual_count = LogEntry.query.count()
-        logger.info(f"Collection completed: {total_inserted} entries inserted, {actual_count} total in database")
+        switches_processed = collection_run.switches_processed or []
+        logger.info(f"Collection completed: {collection_run.new_entries} entries inserted, {actual_count} total in database")
         
         return {
             'success': True,
             'collection_id': collection_id,
             'switches_processed': len(switches_processed),
-            'new_entries': total_inserted,
+            'new_entries': collection_run.new_entries,
             'database_count': actual_count,
             'switch_names': switches_processed
         }
         
     except Exception as e:
         logger.error(f"Collection failed: {e}")
+        db.session.rollback()
         collection_run.status = 'failed'
         collection_run.error_message = str(e)
         collection_run.completed_at = datetime.utcnow()
         db.session.commit()
+        cancel_pending_tasks(collection_id, f"Collection failed: {e}")
+        collection_progress.finish('failed', str(e))
         
         return {
             'success': False,
             'error': str(e),
             'collection_id': collection_id
         }
+
+def _merge_parsed(switch_name: str, parses: List[Tuple[int, tuple, concurrent.futures.Future]],
+                  timings: Dict, progress: CollectionProgress) -> ParsedOutput:
+    """One ParsedOutput from a switch's per-context parses (pool futures or done futures)"""
+    rows = []
+    entries = 0
+    parse_seconds = 0.0
+    lookup_seconds = 0.0
+    errors = []
+    for context, args, future in parses:
+        try:
+            parsed = parse_pool.result(future, args)
+        except Exception as e:
+            logger.error(f"REPLAY: {switch_name} context {context} failed: {e}")
+            progress.add_error(switch_name, f"Parse failed: {e}", context)
+            continue
+        progress.context_parsed(switch_name, context, parsed.entries)
+        rows.extend(parsed.rows)
+        entries += parsed.entries
+        parse_seconds += parsed.parse_seconds
+        lookup_seconds += parsed.lookup_seconds
+        errors.extend(parsed.errors)
+        timings['contexts'][str(context)]['entries'] = parsed.entries
+    rows.sort(key=lambda row: row.timestamp, reverse=True)
+    return ParsedOutput(rows, entries, parse_seconds, lookup_seconds, errors)
+
+def replay_captures(records: Iterable[Dict], progress: Optional[CollectionProgress] = None) -> Dict:
+    """
+    Ingest archived context outputs again without SSH (see capture_archive.py)
+
+    Every captured switch session goes through the live path (parse, year
+    deduction relative to its capture time, device lookup, store_switch_rows)
+    within one new CollectionRun. As in a collection, only entries newer than
+    the switch's last stored entry are inserted, so replaying captures that
+    were already ingested adds nothing; delete the affected rows first to
+    reprocess them after a parser fix.
+    """
+    collection_id = str(uuid.uuid4())
+    collection_run = CollectionRun(id=collection_id, status='running')
+    db.session.add(collection_run)
+    db.session.commit()
+    progress = progress or CollectionProgress()
+    progress.start(collection_id)
+    contexts_per_session = len(SimpleLogCollector('', '').contexts)
+    logger.info(f"REPLAY: Starting replay run {collection_id}")
+    
+    sessions = {}  # session -> state of the switch collection being rebuilt
+    open_sessions = {}  # switch -> its session still receiving contexts
+    results = []
+    
+    def store(session: str):
+        state = sessions.pop(session)
+        open_sessions.pop(state['switch'], None)
+        parsed = _merge_parsed(state['switch'], state['parses'], state['timings'], progress)
+        result = store_switch_rows(state['switch'], collection_id, parsed, state['timings'], progress,
+                                   state['started_at'], state['start'])
+        logger.info(f"REPLAY: {state['switch']} ({state['captured_at']:%Y-%m-%d %H:%M}): "
+                    f"{result['inserted_count']} of {parsed.entries} entries inserted")
+        results.append(result)
+    
+    try:
+        for record in records:
+            session, switch_name, context = record['session'], record['switch'], record['context']
+            if session not in sessions:
+                # A newer run of the same switch only starts after the previous one is stored
+                if switch_name in open_sessions:
+                    store(open_sessions[switch_name])
+                progress.switch_started(switch_name)
+                sessions[session] = {
+                    'switch': switch_name, 'captured_at': record['captured_at'],
+                    'since': last_entry_timestamp(switch_name), 'parses': [],
+                    'timings': SimpleLogCollector._empty_timings(),
+                    'started_at': datetime.utcnow(), 'start': time.perf_counter(),
+                }
+                open_sessions[switch_name] = session
+            state = sessions[session]
+            state['timings']['contexts'][str(context)] = {'wait_seconds': 0.0, 'bytes': len(record['raw_output'])}
+            args = (record['raw_output'], record['site'], switch_name, context, record['generation'],
+                    state['since'], record['captured_at'])
+            if parse_pool.enabled:
+                future = parse_pool.submit(*args)
+            else:
+                future = concurrent.futures.Future()
+                future.set_result(parse_context_output(*args))
+            state['parses'].append((context, args, future))
+            if len(state['parses']) >= contexts_per_session:
+                store(session)
+        
+        # Sessions cut short by a failed collection
+        for session in list(sessions):
+            store(session)
+        
+        inserted = sum(result['inserted_count'] for result in results)
+        collection_run.status = 'completed'
+        collection_run.completed_at = datetime.utcnow()
+        collection_run.total_entries = inserted
+        collection_run.new_entries = inserted
+        collection_run.switches_processed = [
+            r['switch_name'] if r['success'] else f"{r['switch_name']} (failed)" for r in results
+        ]
+        notify_log_entries_changed(db.session, 'replay completed')
+        db.session.commit()
+        progress.finish('completed')
+        logger.info(f"REPLAY: Run {collection_id} completed: {inserted} entries from {len(results)} sessions")
+        return {
+            'success': True,
+            'collection_id': collection_id,
+            'sessions': len(results),
+            'failed': sum(1 for r in results if not r['success']),
+            'new_entries': inserted,
+        }
+    
+    except Exception as e:
+        logger.error(f"REPLAY: Run {collection_id} failed: {e}")
+        db.session.rollback()
+        collection_run.status = 'failed'
+        collection_run.error_message = str(e)
+        collection_run.completed_at = datetime.utcnow()
+        db.session.commit()
+        progress.finish('failed', str(e))
+        return {'success': False, 'error': str(e), 'collection_id': collection_id}
+
+class QueueWorker:
+    """
+    Background thread draining the work queue with this host's configured credentials
+
+    Enabled with COLLECTION_QUEUE_WORKER; every process running one adds
+    collection capacity to runs started by any host. Its switches are reported
+    to a private progress registry (the coordinating process shows them).
+    """
+    
+    def __init__(self):
+        self.progress = CollectionProgress()
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def start(self, app):
+        """Start the worker once per process (workers forked after preload start their own)"""
+        if not Config.COLLECTION_QUEUE_WORKER or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if not Config.DEFAULT_USERNAME or not Config.DEFAULT_PASSWORD:
+                logger.warning("QUEUE: Worker not started, SWITCH_USERNAME/SWITCH_PASSWORD not configured")
+                return
+            threading.Thread(target=self._run, args=(app,), name='collection-queue', daemon=True).start()
+            logger.info(f"QUEUE: Worker {worker_id()} started")
+    
+    def _run(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    requeue_expired()
+                    summary = drain_with_engine(Config.DEFAULT_USERNAME, Config.DEFAULT_PASSWORD, app,
+                                                progress=self.progress)
+                    if summary['completed'] or summary['failed']:
+                        logger.info(f"QUEUE: Worker {worker_id()} ran {summary['completed']} switches "
+                                    f"({summary['failed']} failed), {summary['inserted']} entries")
+            except Exception as e:
+                logger.error(f"QUEUE: Worker error: {e}")
+            time.sleep(POLL_INTERVAL)
+
+# Work queue consumer of this process (started only when COLLECTION_QUEUE_WORKER is set)
+collection_queue_worker = QueueWorker()
@@ -0,0 +1,249 @@
+"""
+HTTP Caching for Switch Log Analyzer
+Conditional GET (ETag/Last-Modified) for data endpoints, gzip/brotli response
+compression and precompressed, long-cached static assets
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import current_app, g, make_response, request, send_from_directory, url_for
+from sqlalchemy import text
+from werkzeug.security import safe_join
+
+from device_lookup_optimized import device_lookup
+from models import db
+from search_cache import DATA_REWRITTEN_KEY
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'text/html', 'text/css', 'text/javascript', 'text/plain', 'text/csv', 'image/svg+xml',
+}
+
+# Bodies smaller than this are sent as is
+COMPRESS_MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # Dynamic responses: fast; static files are precompressed at maximum quality
+
+# Static files precompressed at startup (the ones templates reference)
+PRECOMPRESS_SUFFIXES = ('.min.css', '.min.js')
+
+# Versioned static URLs (?v=<content hash>) never change content
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# One round trip: latest collection run, log_entries id watermark, last delete/rewrite marker and alias mappings
+DATA_VERSION_SQL = """
+    SELECT
+        (SELECT id || ':' || status || ':' || coalesce(completed_at::text, '')
+         FROM collection_runs ORDER BY started_at DESC LIMIT 1) AS latest_run,
+        (SELECT coalesce(completed_at, started_at)
+         FROM collection_runs ORDER BY started_at DESC LIMIT 1) AS run_time,
+        (SELECT status = 'running' FROM collection_runs ORDER BY started_at DESC LIMIT 1) AS running,
+        pg_sequence_last_value(pg_get_serial_sequence('log_entries', 'id')::regclass) AS watermark,
+        (SELECT config_value FROM app_config WHERE config_key = :rewritten_key) AS rewritten_at,
+        (SELECT count(*) || ':' || coalesce(max(updated_at)::text, '') FROM alias_mappings) AS aliases
+"""
+
+
+def get_data_version() -> Tuple[str, Optional[datetime]]:
+    """
+    Version string of the stored log data and its Last-Modified time
+
+    The id sequence watermark changes with every insert (including rows
+    committed while a collection is still running), the alias mappings and
+    device lookup index versions with the lookup data; Last-Modified is only
+    given once the latest collection has finished.
+    """
+    row = db.session.execute(text(DATA_VERSION_SQL), {'rewritten_key': DATA_REWRITTEN_KEY}).first()
+    version = f"{row.latest_run}|{row.watermark}|{row.rewritten_at}|{row.aliases}|{device_lookup.get_index_version()}"
+    last_modified = None if row.running or row.run_time is None else row.run_time
+    return version, last_modified
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional_on_data(extra=None):
+    """
+    Decorator: ETag/Last-Modified from the data version, 304 without running the view
+
+    extra is an optional callable whose value also goes into the ETag, for
+    responses that depend on more than the stored data (e.g. elapsed time).
+    The view finds the version in g.data_version, e.g. for its cache key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version, last_modified = get_data_version()
+            except Exception as e:
+                logger.warning(f"HTTP CACHE: Data version unavailable, serving full response: {e}")
+                db.session.rollback()
+                g.data_version = None
+                return view(*args, **kwargs)
+
+            g.data_version = version
+            parts = [version, request.full_path]
+            if extra is not None:
+                parts.append(str(extra()))
+            etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:24]
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if last_modified:
+                    response.last_modified = last_modified
+
+            response.set_etag(etag, weak=True)
+            # Cacheable by the browser, but always revalidated
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def choose_encoding(available=('br', 'gzip')) -> Optional[str]:
+    """Best content coding accepted by the client among the available ones"""
+    accepted = request.accept_encodings
+    if 'br' in available and brotli is not None and accepted['br']:
+        return 'br'
+    if 'gzip' in available and accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli for buffered text responses"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress_static(static_folder: str) -> int:
+    """Write .gz (and .br when brotli is installed) next to each static asset that changed"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            mtime = os.path.getmtime(path)
+            targets = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                targets.append(('.br', lambda d: brotli.compress(d, quality=11)))
+            data = None
+            for suffix, compress in targets:
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                try:
+                    _write_atomic(target, compress(data))
+                    written += 1
+                except OSError as e:
+                    logger.warning(f"HTTP CACHE: Cannot precompress {path}: {e}")
+    if written:
+        logger.info(f"HTTP CACHE: Precompressed {written} static files")
+    return written
+
+
+_static_hashes = {}
+
+
+def static_url(filename: str) -> str:
+    """URL of a static file with a content hash, so it can be cached for a year"""
+    path = safe_join(current_app.static_folder, filename)
+    mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+    cached = _static_hashes.get(filename)
+    if cached is None or cached[0] != mtime:
+        digest = ''
+        if mtime is not None:
+            with open(path, 'rb') as f:
+                digest = hashlib.md5(f.read()).hexdigest()[:12]
+        cached = _static_hashes[filename] = (mtime, digest)
+    return url_for('static', filename=filename, v=cached[1])
+
+
+def serve_static(filename):
+    """Static files: precompressed variant when accepted, immutable caching for versioned URLs"""
+    static_folder = current_app.static_folder
+    path = safe_join(static_folder, filename)
+    if not path or not os.path.isfile(path):
+        return send_from_directory(static_folder, filename)  # 404
+
+    available = [enc for enc, suffix in (('br', '.br'), ('gzip', '.gz'))
+                 if os.path.isfile(path + suffix) and os.path.getmtime(path + suffix) >= os.path.getmtime(path)]
+    encoding = choose_encoding(available)
+    if encoding:
+        suffix = '.br' if encoding == 'br' else '.gz'
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(static_folder, filename)
+    response.vary.add('Accept-Encoding')
+
+    if request.args.get('v'):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_http_caching(app):
+    """Register compression, the static file view and the static_url() template helper"""
+    app.after_request(compress_response)
+    app.view_functions['static'] = serve_static
+    app.add_template_global(static_url, 'static_url')
+    try:
+        precompress_static(app.static_folder)
+    except Exception as e:
+        logger.warning(f"HTTP CACHE: Static precompression skipped: {e}")
@@ -12,23 +12,43 @@ import uuid
 import glob
 import time
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import g, render_template, request, jsonify, send_file, stream_with_context
 from simple_switch_collector import SimpleLogCollector
 from config import Config
 import tempfile
 import csv
+import io
+import zlib
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import atexit
+from contextlib import nullcontext
 import signal
 import sys
-from models import db, LogEntry, CollectionRun, AliasMapping, SwitchStatus, AppConfig, ScheduledJob
-from final_working_collector import run_simple_collection as run_clean_collection
+from app_factory import get_app
+from models import db, LogEntry, CollectionRun, CollectionRequest, AliasMapping, SwitchStatus, AppConfig, ScheduledJob
+from final_working_collector import run_simple_collection as run_clean_collection, collection_queue_worker
+from capture_archive import capture_archive
 from device_lookup_optimized import device_lookup
-
-# Load environment variables from .env file
-from dotenv import load_dotenv
-load_dotenv()
+from search_filters import get_search_filters, apply_search_filters, apply_search_sort, contains_pattern, wwn_filter
+from db_migrations import apply_schema_upgrades
+from partitioning import partition_manager
+from histogram import BUCKETS as HISTOGRAM_BUCKETS, get_histogram
+from facets import parse_facets, get_facets
+from fast_json import RESPONSE_SHAPES, parse_fields, shape_rows, fast_jsonify
+from http_caching import conditional_on_data, init_http_caching
+from metrics import (METRICS_ENABLED, CONTENT_TYPE as METRICS_CONTENT_TYPE, generate_metrics, init_request_metrics,
+                     instrument_scheduler)
+from collection_timings import get_switch_timing_stats, get_switch_timing_trend, get_collection_switch_runs
+from collection_progress import collection_progress, progress_events, stream_slots
+from work_queue import (get_collection_tasks, get_task_progress, cancel_pending_tasks, submit_collection_request,
+                        get_queued_collection_request)
+from search_cache import cache_key, count_cache, result_cache, cache_listener
+from query_guard import QueryGuard, QueryBudgetExceeded, is_query_canceled, is_connection_error
+from scheduled_jobs import (cleanup_temporary_log_files, create_native_backup, create_tables, scheduled_backup_job,
+                            scheduled_collection_job, scheduled_data_migrations, scheduled_partition_maintenance)
+from rollups import (DIMENSIONS as ROLLUP_DIMENSIONS, rollups_cover, get_totals as get_rollup_totals,
+                     get_top as get_rollup_top, get_trend as get_rollup_trend, rebuild_rollups)
 
 # Configure logging
 logging.basicConfig(
@@ -41,23 +61,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
+# Create Flask app (configuration and database, see app_factory.py)
+app = get_app()
+
+# Request latency per endpoint for /metrics
+init_request_metrics(app)
 
-# Database configuration with optimized connection pooling
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://localhost/switch_analyzer')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 10,
-    'pool_recycle': 300,
-    'pool_pre_ping': True,
-    'pool_timeout': 30,
-    'max_overflow': 20
-}
+# Conditional GET, compression and precompressed static assets
+init_http_caching(app)
 
-# Initialize database
-db.init_app(app)
+@app.before_request
+def start_cache_invalidation_listener():
+    """Start this worker's LISTEN thread for search cache invalidation (after gunicorn forks)"""
+    cache_listener.start(db.engine)
+
+@app.before_request
+def start_collection_queue_worker():
+    """Start this worker's work queue consumer when COLLECTION_QUEUE_WORKER is set (after gunicorn forks)"""
+    collection_queue_worker.start(app)
 
 # Import scheduler configuration
 from scheduler_config import SchedulerConfig, PREDEFINED_SCHEDULES, JOB_PRIORITIES
@@ -150,236 +171,6 @@ def signal_handler(signum, frame):
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
-def cleanup_temporary_log_files():
-    """Clean up temporary log files in logs directory"""
-    try:
-        logs_dir = 'logs'
-        if not os.path.exists(logs_dir):
-            return
-        
-        # Define patterns for temporary files to clean up (only safe patterns)
-        temp_patterns = [
-            'aliases_test_*.txt',        # Test alias files
-            'simple_collection_test*.json',  # Test collection files
-            'scheduler_config*.json',    # Temporary scheduler configs
-            '*_temp.log',               # Explicitly temporary logs
-            '*_debug.log',              # Debug logs
-            'collection_*.tmp',         # Collection temporary files
-            'context_set_*.json',       # Context collection output files
-            'aliases_*.txt',            # Alias files from collections
-            'simple_collection_*.json'  # Collection result files
-        ]
-        
-        # Protected files that should NEVER be deleted
-        protected_files = [
-            'app.log',
-            'main.log', 
-            'error.log',
-            'access.log',
-            'production.log'
-        ]
-        
-        cleaned_files = []
-        for pattern in temp_patterns:
-            temp_files = glob.glob(os.path.join(logs_dir, pattern))
-            for temp_file in temp_files:
-                try:
-                    # Check if file is in protected list
-                    filename = os.path.basename(temp_file)
-                    if filename not in protected_files and not any(filename.endswith(pf) for pf in protected_files):
-                        # Additional safety check: only delete files older than 1 hour
-                        file_age = time.time() - os.path.getmtime(temp_file)
-                        if file_age > 3600:  # 1 hour = 3600 seconds
-                            os.remove(temp_file)
-                            cleaned_files.append(filename)
-                        else:
-                            logger.debug(f"Skipping recent file {filename} (age: {file_age/60:.1f} minutes)")
-                except OSError as e:
-                    logger.warning(f"Failed to remove temporary file {temp_file}: {e}")
-        
-        if cleaned_files:
-            logger.info(f"Cleaned up {len(cleaned_files)} temporary log files: {', '.join(cleaned_files)}")
-        else:
-            logger.debug("No temporary log files to clean up")
-            
-    except Exception as e:
-        logger.error(f"Error during log cleanup: {e}")
-
-def create_native_backup():
-    """Create backup using native Python without external tools"""
-    try:
-        backup_dir = 'backups'
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'switch_analyzer_backup_{timestamp}.json'
-        backup_path = os.path.join(backup_dir, backup_filename)
-        
-        # Export data using SQLAlchemy
-        backup_data = {
-            'timestamp': timestamp,
-            'log_entries': [],
-            'collection_runs': [],
-            'scheduled_jobs': [],
-            'switch_status': [],
-            'alias_mappings': []
-        }
-        
-        # Export log entries (limit to recent entries to avoid huge files)
-        recent_entries = LogEntry.query.order_by(LogEntry.timestamp.desc()).limit(50000).all()
-        backup_data['log_entries'] = [entry.to_dict() for entry in recent_entries]
-        
-        # Export collection runs
-        collections = CollectionRun.query.all()
-        backup_data['collection_runs'] = [collection.to_dict() for collection in collections]
-        
-        # Export scheduled jobs
-        jobs = ScheduledJob.query.all()
-        backup_data['scheduled_jobs'] = [job.to_dict() for job in jobs]
-        
-        # Export switch status
-        switches = SwitchStatus.query.all()
-        backup_data['switch_status'] = [switch.to_dict() for switch in switches]
-        
-        # Export alias mappings
-        aliases = AliasMapping.query.all()
-        backup_data['alias_mappings'] = [alias.to_dict() for alias in aliases]
-        
-        # Write to file with compression
-        import gzip
-        import json
-        
-        with gzip.open(backup_path + '.gz', 'wt', encoding='utf-8') as f:
-            json.dump(backup_data, f, indent=2, default=str)
-        
-        # Get file size
-        stat = os.stat(backup_path + '.gz')
-        logger.info(f"Native backup completed: {backup_filename}.gz ({stat.st_size} bytes)")
-        logger.info(f"Backed up {len(backup_data['log_entries'])} log entries")
-        
-        return backup_path + '.gz'
-        
-    except Exception as e:
-        logger.error(f"Native backup failed: {str(e)}")
-        return None
-
-def scheduled_backup_job():
-    """Execute a scheduled backup using native method with lock protection"""
-    backup_lock_file = 'logs/backup.lock'
-    
-    try:
-        with app.app_context():
-            # Check for existing lock file to prevent multiple simultaneous backups
-            if os.path.exists(backup_lock_file):
-                # Check if lock is stale (older than 10 minutes)
-                lock_age = time.time() - os.path.getmtime(backup_lock_file)
-                if lock_age < 600:  # 10 minutes
-                    logger.warning(f"Scheduled backup skipped - already running (lock age: {lock_age/60:.1f} minutes)")
-                    return
-                else:
-                    logger.info("Removing stale backup lock file")
-                    os.remove(backup_lock_file)
-            
-            # Create lock file
-            os.makedirs('logs', exist_ok=True)
-            with open(backup_lock_file, 'w') as f:
-                f.write(f"{os.getpid()}\n{time.time()}\n")
-            
-            logger.info("Scheduled backup lock acquired")
-            
-            try:
-                logger.info("Starting scheduled backup...")
-                
-                # Try native backup first
-                backup_path = create_native_backup()
-                
-                if backup_path:
-                    logger.info("Scheduled backup completed successfully")
-                    # Clean up temporary log files after successful backup
-                    cleanup_temporary_log_files()
-                else:
-                    logger.error("Scheduled backup failed")
-                    
-            finally:
-                # Always remove lock file
-                try:
-                    if os.path.exists(backup_lock_file):
-                        os.remove(backup_lock_file)
-                        logger.info("Scheduled backup lock released")
-                except Exception as e:
-                    logger.warning(f"Failed to remove backup lock: {e}")
-                
-    except Exception as e:
-        logger.error(f"Scheduled backup job failed: {str(e)}")
-        # Ensure lock is cleaned up on error
-        try:
-            if os.path.exists(backup_lock_file):
-                os.remove(backup_lock_file)
-        except:
-            pass
-
-def scheduled_collection_job(username=None, password=None):
-    """Execute a scheduled collection using clean system with database lock protection"""
-    try:
-        with app.app_context():
-            # Use database lock to prevent multiple simultaneous collections across all workers
-            from sqlalchemy import text
-            
-            # Check if a collection is already running using database lock
-            try:
-                result = db.session.execute(text(
-                    "SELECT pg_try_advisory_lock(12345) as acquired"
-                )).fetchone()
-                
-                if not result.acquired:
-                    logger.warning(f"Scheduled collection skipped - already running in another process (PID: {os.getpid()})")
-                    return
-                
-                logger.info(f"🔒 DATABASE LOCK ACQUIRED: Scheduled collection starting (PID: {os.getpid()})")
-                
-                try:
-                    # Use provided credentials if available, otherwise fall back to environment
-                    if not username or not password:
-                        username = os.getenv('SWITCH_USERNAME', '')
-                        password = os.getenv('SWITCH_PASSWORD', '')
-
-                    if not username or not password:
-                        logger.error("Scheduled collection failed: No credentials configured")
-                        return
-
-                    logger.info(f"Starting scheduled collection with PID {os.getpid()}")
-                    result = run_clean_collection(username, password)
-
-                    if result['success']:
-                        logger.info(f"Scheduled collection completed: {result['new_entries']} new entries")
-                        # Clean up temporary log files after successful scheduled collection
-                        cleanup_temporary_log_files()
-                    else:
-                        logger.error(f"Scheduled collection failed: {result.get('error', 'Unknown error')}")
-                        
-                finally:
-                    # Always release database lock
-                    try:
-                        db.session.execute(text("SELECT pg_advisory_unlock(12345)"))
-                        db.session.commit()
-                        logger.info(f"Database lock released (PID: {os.getpid()})")
-                    except Exception as e:
-                        logger.warning(f"Failed to release database lock: {e}")
-                        
-            except Exception as e:
-                logger.error(f"Database lock operation failed: {e}")
-                return
-
-    except Exception as e:
-        logger.error(f"Scheduled collection error: {str(e)}")
-        # Try to release lock on error
-        try:
-            with app.app_context():
-                db.session.execute(text("SELECT pg_advisory_unlock(12345)"))
-                db.session.commit()
-        except:
-            pass
-
 def monitor_and_sync_jobs():
     """Simple job sync - only on scheduler worker"""
     try:
@@ -431,6 +222,29 @@ def monitor_and_sync_jobs():
     except Exception as e:
         logger.error(f"Job sync error: {e}")
 
+# Jobs registered by the application itself rather than stored in ScheduledJob
+SYSTEM_JOB_IDS = ['job_sync_monitor', 'partition_maintenance', 'data_migrations']
+
+def setup_system_jobs():
+    """Register built-in maintenance jobs"""
+    scheduler.add_job(
+        id='partition_maintenance',
+        name='Partition maintenance',
+        func=scheduled_partition_maintenance,
+        trigger=CronTrigger(hour=1, minute=30),
+        replace_existing=True,
+        max_instances=1
+    )
+    # Once, right after startup (no-op when every backfill is done)
+    scheduler.add_job(
+        id='data_migrations',
+        name='Data migrations',
+        func=scheduled_data_migrations,
+        trigger='date',
+        replace_existing=True,
+        max_instances=1
+    )
+
 def setup_scheduled_jobs():
     """Simple job setup - only on scheduler worker"""
     try:
@@ -438,6 +252,8 @@ def setup_scheduled_jobs():
             # Only proceed on scheduler worker
             if not scheduler or not scheduler.is_scheduler_worker:
                 return
+            
+            setup_system_jobs()
                 
             # Load enabled jobs from database
             scheduled_jobs = ScheduledJob.query.filter_by(enabled=True).all()
@@ -494,7 +310,7 @@ def verify_scheduler_health():
             setup_scheduled_jobs()
             return False
             
-        jobs = scheduler.get_jobs()
+        jobs = [job for job in scheduler.get_jobs() if job.id not in SYSTEM_JOB_IDS]
         db_jobs = ScheduledJob.query.filter_by(enabled=True).count()
         
         if len(jobs) != db_jobs:
@@ -509,22 +325,6 @@ def verify_scheduler_health():
         logger.error(f"Scheduler health check failed: {e}")
         return False
 
-def create_tables():
-    """Create database tables on startup"""
-    try:
-        with app.app_context():
-            db.create_all()
-            logger.info("DATABASE: Tables initialized successfully")
-
-            # Initialize device lookup optimization
-            logger.info("Initializing device lookup optimization...")
-            device_lookup.refresh_index()
-            logger.info("Device lookup optimization ready")
-
-            # Jobs will be loaded after scheduler initialization
-    except Exception as e:
-        logger.error(f"DATABASE: Failed to initialize - {str(e)}")
-
 @app.route('/')
 def index():
     """Main page - Database search interface"""
@@ -1067,6 +867,22 @@ def resume_scheduled_job(job_id):
 
 
 
+def submit_to_collector_daemon(username, password, source):
+    """Queue the collection for collector_daemon.py instead of running it in this web worker"""
+    queued = get_queued_collection_request()
+    if queued:
+        return jsonify({
+            'success': False,
+            'error': f'A collection is already queued (request {queued.id}). Please wait for the collector daemon.'
+        }), 409
+    request_id = submit_collection_request(username, password, source)
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'request_id': request_id,
+        'message': 'Collection queued for the collector daemon'
+    })
+
 # SINGLE CLEAN COLLECTION ENDPOINT
 @app.route('/api/db/collect', methods=['POST'])
 def collect_data():
@@ -1109,6 +925,9 @@ def collect_data():
                 }
             }), 409
 
+        if Config.COLLECTION_DAEMON:
+            return submit_to_collector_daemon(username, password, 'manual')
+
         def run_collection():
             try:
                 with app.app_context():
@@ -1167,135 +986,164 @@ def collect_data():
 
 # Database and search endpoints
 @app.route('/api/db/search')
+@conditional_on_data()
 def search_database():
     """Enhanced search with date filtering, multi-switch selection, pagination, and sorting"""
-    max_retries = 3
+    # Only a lost connection is retried; a timed out or rejected query would just fail again
+    max_retries = 2
     retry_count = 0
+
+    try:
+        facet_columns = parse_facets(request.args.get('facets', ''))
+        # Projection: only the requested columns are selected, as plain tuples
+        fields = parse_fields(request.args.get('fields', ''))
+        # Pagination parameters
+        try:
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 100))
+        except ValueError:
+            raise ValueError('page and page_size must be integers')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    shape = request.args.get('shape', 'objects')
+    if shape not in RESPONSE_SHAPES:
+        return jsonify({'error': f'Unsupported shape: {shape}'}), 400
+
+    filters = get_search_filters(request.args)
+
+    # page_size=0 is the export mode below; anything else is at least one row on page 1 or later
+    page = max(page, 1)
+    if page_size < 0:
+        page_size = 1
+
+    # Handle export mode (page_size=0 means export all)
+    export_mode = (page_size == 0)
+    if not export_mode:
+        page_size = min(page_size, 1000)  # Cap at 1000 for normal pagination
+
+    # Sorting parameters
+    # Free-text searches are ranked by relevance unless a column sort is requested
+    sort_column = request.args.get('sort_column', 'relevance' if filters['q'] else 'timestamp')
+    sort_direction = request.args.get('sort_direction', 'desc')
+
+    # Pages are cached until the next ingest (export mode results are too large to keep)
+    result_key = cache_key('search', filters, page, page_size, sort_column, sort_direction, facet_columns,
+                           ','.join(fields), shape)
+    if not export_mode:
+        cached = result_cache.get(result_key)
+        if cached is not None:
+            response = fast_jsonify(cached)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+    result_generation = result_cache.generation
     
     while retry_count < max_retries:
+        guard = None
         try:
             with app.app_context():
                 # Reconnect database if needed
                 if retry_count > 0:
                     db.session.remove()
-                    db.engine.dispose()
-                
-                wwn = request.args.get('wwn', '').strip()
-                alias = request.args.get('alias', '').strip()
-                node_symbol = request.args.get('node_symbol', '').strip()
-                switches = request.args.get('switches', '').strip()
-                event = request.args.get('event', '').strip()
-                context = request.args.get('context', '').strip()
-                date_from = request.args.get('date_from', '').strip()
-                date_to = request.args.get('date_to', '').strip()
-                
-                # Pagination parameters
-                page = int(request.args.get('page', 1))
-                page_size = int(request.args.get('page_size', 100))
-                
-                # Handle export mode (page_size=0 means export all)
-                export_mode = (page_size == 0)
-                if not export_mode:
-                    page_size = min(page_size, 1000)  # Cap at 1000 for normal pagination
-                
-                # Sorting parameters
-                sort_column = request.args.get('sort_column', 'timestamp')
-                sort_direction = request.args.get('sort_direction', 'desc')
                 
-                query = LogEntry.query
-                
-                # Apply filters
-                if wwn:
-                    query = query.filter(LogEntry.wwn.ilike(f'%{wwn}%'))
-                
-                if alias:
-                    query = query.filter(LogEntry.alias.ilike(f'%{alias}%'))
-                
-                if node_symbol:
-                    query = query.filter(LogEntry.node_symbol.ilike(f'%{node_symbol}%'))
-                
-                if switches:
-                    switch_list = [s.strip() for s in switches.split(',') if s.strip()]
-                    if switch_list:
-                        query = query.filter(LogEntry.switch_name.in_(switch_list))
-                
-                if event:
-                    query = query.filter(LogEntry.event_type.ilike(f'%{event}%'))
-                
-                if context:
-                    query = query.filter(LogEntry.context == int(context))
-                    
-                # Date filtering
-                if date_from:
-                    from datetime import datetime
-                    date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-                    query = query.filter(LogEntry.timestamp >= date_from_obj)
-                    
-                if date_to:
-                    from datetime import datetime
-                    date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-                    # Add 1 day to include the entire day
-                    date_to_obj = date_to_obj.replace(hour=23, minute=59, second=59)
-                    query = query.filter(LogEntry.timestamp <= date_to_obj)
-                
-                # Apply sorting
-                sort_attr = getattr(LogEntry, sort_column, LogEntry.timestamp)
-                if sort_direction and sort_direction.lower() == 'desc':
-                    query = query.order_by(sort_attr.desc())
-                else:
-                    query = query.order_by(sort_attr.asc())
-                
-                # Get total count with simplified query for performance
-                try:
-                    total = query.count()
-                except Exception:
-                    # Fallback: use a simpler count query
-                    total = db.session.query(db.func.count(LogEntry.id)).scalar() or 0
+                query = db.session.query(*[getattr(LogEntry, field) for field in fields])
+                query = apply_search_filters(query, filters)
+                query = apply_search_sort(query, sort_column, sort_direction, q=filters['q'])
+                page_query = query if export_mode else query.offset((page - 1) * page_size).limit(page_size)
+
+                with QueryGuard(db.session, Config.SEARCH_STATEMENT_TIMEOUT_MS,
+                                max_cost=Config.SEARCH_MAX_QUERY_COST,
+                                exact_count_max_cost=Config.SEARCH_EXACT_COUNT_MAX_COST,
+                                environ=request.environ) as guard:
+                    guard.check_cost(page_query)
+
+                    # Total (and facets) are shared by every page of the same search
+                    count_key = cache_key(filters, facet_columns)
+                    count_generation = count_cache.generation
+                    counts = count_cache.get(count_key)
+                    if counts is None:
+                        if facet_columns and (rollups_cover(filters) or guard.within_count_budget(query)):
+                            # Facets and total from one GROUPING SETS query
+                            counts = get_facets(filters, facet_columns)
+                        else:
+                            # Facets are skipped when even counting the matches is over budget
+                            counts = guard.count(query, filters)
+                        count_cache.set(count_key, counts, generation=count_generation)
+                    total = counts['total']
+                    facets = counts.get('facets')
+
+                    rows = page_query.all()
                 
                 # Apply pagination only if not in export mode
                 if export_mode:
                     # Export mode: return all results without pagination
-                    entries = query.all()
-                    return jsonify({
-                        'entries': [entry.to_dict() for entry in entries],
+                    result = {
+                        **shape_rows(fields, rows, shape),
                         'total': total,
                         'page': 1,
-                        'page_size': len(entries),
+                        'page_size': len(rows),
                         'total_pages': 1
-                    })
+                    }
                 else:
                     # Normal pagination mode
-                    offset = (page - 1) * page_size
-                    entries = query.offset(offset).limit(page_size).all()
-                    
-                    return jsonify({
-                        'entries': [entry.to_dict() for entry in entries],
+                    result = {
+                        **shape_rows(fields, rows, shape),
                         'total': total,
                         'page': page,
                         'page_size': page_size,
                         'total_pages': (total + page_size - 1) // page_size if total > 0 else 0
-                    })
+                    }
+
+                if counts.get('total_estimated'):
+                    result['total_estimated'] = True
+                if facets is not None:
+                    result['facets'] = facets
+                if not export_mode:
+                    result_cache.set(result_key, result, generation=result_generation)
+                response = fast_jsonify(result)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+        except QueryBudgetExceeded as e:
+            return jsonify({'error': str(e), 'estimated_cost': e.cost}), 422
 
         except Exception as e:
+            if guard is not None and guard.cancelled:
+                logger.info("Database search cancelled: client disconnected")
+                return jsonify({'error': 'Client disconnected'}), 499
+            if is_query_canceled(e):
+                logger.warning(f"Database search exceeded {Config.SEARCH_STATEMENT_TIMEOUT_MS} ms: {request.query_string.decode()}")
+                return jsonify({'error': f'Search exceeded the {Config.SEARCH_STATEMENT_TIMEOUT_MS / 1000:g}s time budget: '
+                                         f'narrow the filters (date range, switch)'}), 504
+
             retry_count += 1
             logger.warning(f"Database search attempt {retry_count} failed: {str(e)}")
             
-            if retry_count >= max_retries:
-                logger.error(f"Database search failed after {max_retries} retries: {str(e)}")
-                return jsonify({'error': f'Database connection failed: {str(e)}'}), 500
+            if not is_connection_error(e) or retry_count >= max_retries:
+                logger.error(f"Database search failed: {str(e)}")
+                return jsonify({'error': f'Database search failed: {str(e)}'}), 500
             
             # Wait before retry
-            import time
             time.sleep(0.5)
     
     return jsonify({'error': 'Database search failed after retries'}), 500
 
 @app.route('/api/db/stats')
+@conditional_on_data()
 def database_stats():
-    """Get database statistics"""
+    """Get database statistics (entry counts come from the rollup tables once they are built)"""
+    # Alias mappings and the device lookup index change without a log_entries notification
+    stats_key = cache_key('stats', g.data_version)
+    cached = result_cache.get(stats_key)
+    if cached is not None:
+        response = jsonify(cached)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+    result_generation = result_cache.generation
+
     try:
-        with app.app_context():
-            total_entries = LogEntry.query.count()
+        with app.app_context(), QueryGuard(db.session, Config.STATS_STATEMENT_TIMEOUT_MS):
+            rollup_totals = get_rollup_totals()
             total_collections = CollectionRun.query.count()
             total_aliases = AliasMapping.query.count()
 
@@ -1307,51 +1155,130 @@ def database_stats():
             db_size_result = db.session.execute(text("SELECT pg_size_pretty(pg_database_size(current_database()));"))
             db_size = db_size_result.scalar() or "Unknown"
 
-            # Get table sizes
+            # Get table sizes, partitioned tables reported once with all their partitions
             table_size_result = db.session.execute(text("""
                 SELECT
-                    schemaname,
-                    tablename,
-                    pg_size_pretty(pg_total_relation_size(schemaname||'.'||tablename)) as size_pretty,
-                    pg_total_relation_size(schemaname||'.'||tablename) as size_bytes
-                FROM pg_tables
-                WHERE schemaname = 'public'
-                ORDER BY pg_total_relation_size(schemaname||'.'||tablename) DESC;
+                    n.nspname AS schemaname,
+                    c.relname AS tablename,
+                    pg_size_pretty(s.size_bytes) AS size_pretty,
+                    s.size_bytes
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                CROSS JOIN LATERAL (
+                    SELECT coalesce(sum(pg_total_relation_size(relid)), pg_total_relation_size(c.oid))::bigint AS size_bytes
+                    FROM pg_partition_tree(c.oid)
+                ) s
+                WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+                ORDER BY s.size_bytes DESC;
             """))
             table_sizes = [dict(row._mapping) for row in table_size_result]
 
-            switch_counts = db.session.query(
-                LogEntry.switch_name,
-                db.func.count(LogEntry.id).label('count')
-            ).group_by(LogEntry.switch_name).all()
-
-            context_counts = db.session.query(
-                LogEntry.context,
-                db.func.count(LogEntry.id).label('count')
-            ).group_by(LogEntry.context).all()
-
-            event_counts = db.session.query(
-                LogEntry.event_type,
-                db.func.count(LogEntry.id).label('count')
-            ).group_by(LogEntry.event_type).order_by(db.func.count(LogEntry.id).desc()).limit(10).all()
-
-            return jsonify({
-                'total_entries': total_entries,
+            stats = {
+                'total_entries': rollup_totals['total_entries'],
                 'total_collections': total_collections,
                 'total_aliases': total_aliases,
                 'active_switches': active_switches,
                 'database_size': db_size,
                 'table_sizes': table_sizes,
-                'switches': [{'name': s[0], 'count': s[1]} for s in switch_counts],
-                'contexts': [{'context': c[0], 'count': c[1]} for c in context_counts],
-                'top_events': [{'event': e[0], 'count': e[1]} for e in event_counts]
-            })
+                'switches': rollup_totals['switches'],
+                'contexts': rollup_totals['contexts'],
+                'top_events': rollup_totals['top_events']
+            }
+            result_cache.set(stats_key, stats, generation=result_generation)
+            response = jsonify(stats)
+            response.headers['X-Cache'] = 'MISS'
+            return response
 
     except Exception as e:
         logger.error(f"Failed to get database stats: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def get_rollup_filters(args) -> dict:
+    """Switch, context and event filters for rollup endpoints (same names as /api/db/search)"""
+    filters = get_search_filters(args)
+    return {
+        'switches': filters['switches'],
+        'context': int(filters['context']) if filters['context'] else None,
+        'event_type': filters['event'] or None,
+    }
+
+@app.route('/api/db/stats/top')
+@conditional_on_data()
+def database_stats_top():
+    """Top-N switches, contexts or event types over the last `hours` (all time if omitted)"""
+    try:
+        dimension = request.args.get('dimension', 'event')
+        if dimension not in ROLLUP_DIMENSIONS:
+            return jsonify({'error': f'Unsupported dimension: {dimension}'}), 400
+        hours = request.args.get('hours', type=int)
+        limit = min(request.args.get('limit', 10, type=int), 100)
+
+        with app.app_context(), QueryGuard(db.session, Config.STATS_STATEMENT_TIMEOUT_MS):
+            items = get_rollup_top(dimension, hours=hours, limit=limit, **get_rollup_filters(request.args))
+        return jsonify({'dimension': dimension, 'hours': hours, 'items': items})
+
+    except Exception as e:
+        logger.error(f"Failed to get top stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/stats/trends')
+@conditional_on_data()
+def database_stats_trends():
+    """Entry counts per hour or day over the last `hours`, optionally split by switch/context/event"""
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in ('hour', 'day'):
+            return jsonify({'error': f'Unsupported granularity: {granularity}'}), 400
+        group_by = request.args.get('group_by') or None
+        if group_by and group_by not in ROLLUP_DIMENSIONS:
+            return jsonify({'error': f'Unsupported group_by: {group_by}'}), 400
+        hours = request.args.get('hours', 24 if granularity == 'hour' else 24 * 30, type=int)
+
+        with app.app_context(), QueryGuard(db.session, Config.STATS_STATEMENT_TIMEOUT_MS):
+            points = get_rollup_trend(granularity, hours, group_by=group_by, **get_rollup_filters(request.args))
+        return jsonify({'granularity': granularity, 'hours': hours, 'group_by': group_by, 'points': points})
+
+    except Exception as e:
+        logger.error(f"Failed to get trend stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/histogram')
+@conditional_on_data()
+def database_histogram():
+    """Entry counts per time bucket for the /api/db/search filters (bucket=auto|minute|hour|day|week)"""
+    try:
+        bucket = request.args.get('bucket', 'auto')
+        if bucket != 'auto' and bucket not in HISTOGRAM_BUCKETS:
+            return jsonify({'error': f'Unsupported bucket: {bucket}'}), 400
+
+        with app.app_context(), QueryGuard(db.session, Config.SEARCH_STATEMENT_TIMEOUT_MS, environ=request.environ):
+            histogram = get_histogram(get_search_filters(request.args), bucket)
+        return jsonify(histogram)
+
+    except Exception as e:
+        if is_query_canceled(e):
+            return jsonify({'error': 'Histogram exceeded the time budget: narrow the filters'}), 504
+        logger.error(f"Histogram failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/rollups/rebuild', methods=['POST'])
+def rebuild_log_rollups():
+    """Recompute the hourly/daily rollups from log_entries (repair after manual data changes)"""
+    try:
+        with app.app_context():
+            rebuild_rollups()
+        return jsonify({'success': True, 'message': 'Rollups rebuilt'})
+    except Exception as e:
+        logger.error(f"Rollup rebuild failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def collection_status_extra():
+    """Collection status also depends on the lock file, a queued daemon request and elapsed minutes"""
+    queued = get_queued_collection_request() if Config.COLLECTION_DAEMON else None
+    return os.path.exists('logs/collection.lock'), queued.id if queued else None, int(time.time() // 60)
+
 @app.route('/api/collection/status')
+@conditional_on_data(extra=collection_status_extra)
 def get_collection_status():
     """Check if a collection is currently in progress"""
     try:
@@ -1368,12 +1295,16 @@ def get_collection_status():
             # Check file lock as backup
             file_lock_active = os.path.exists(lock_file)
 
-            is_running = active_collection is not None or file_lock_active
+            # Submitted to the collector daemon but not started yet
+            queued_request = get_queued_collection_request() if Config.COLLECTION_DAEMON else None
+
+            is_running = active_collection is not None or file_lock_active or queued_request is not None
 
             status_info = {
                 'is_running': is_running,
                 'database_lock': active_collection is not None,
-                'file_lock': file_lock_active
+                'file_lock': file_lock_active,
+                'queued': queued_request is not None
             }
 
             if active_collection:
@@ -1388,6 +1319,52 @@ def get_collection_status():
         logger.error(f"Failed to get collection status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def get_external_collection():
+    """Collection running in another worker or process (not this process's progress registry), if any"""
+    try:
+        thirty_minutes_ago = datetime.utcnow() - timedelta(minutes=30)
+        run = CollectionRun.query.filter(
+            CollectionRun.status == 'running',
+            CollectionRun.started_at > thirty_minutes_ago,
+            CollectionRun.id != (collection_progress.collection_id or '')
+        ).order_by(CollectionRun.started_at.desc()).first()
+        if run is None:
+            queued = get_queued_collection_request() if Config.COLLECTION_DAEMON else None
+            if queued is None:
+                return None
+            return {'collection_id': None, 'queued': True, 'request_id': queued.id,
+                    'requested_at': queued.requested_at.isoformat()}
+        # Per-switch state is read from the run's work queue tasks
+        return {'collection_id': run.id, 'started_at': run.started_at.isoformat(), **get_task_progress(run.id)}
+    except Exception as e:
+        logger.warning(f"Collection status check failed: {e}")
+        db.session.rollback()
+        return None
+    finally:
+        db.session.close()  # Do not hold a pooled connection for the stream's lifetime
+
+@app.route('/api/collection/progress')
+def get_collection_progress():
+    """Per-switch progress of the collection running in this worker"""
+    return jsonify(collection_progress.snapshot())
+
+@app.route('/api/collection/progress/stream')
+def stream_collection_progress():
+    """Server-sent events with live per-switch/per-context collection progress"""
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'No progress stream slot free (sync worker or all in use), poll /api/collection/status instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    response = app.response_class(
+        stream_with_context(progress_events(collection_progress, get_external_collection)),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(stream_slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Proxies must not buffer events
+    return response
+
 @app.route('/api/db/collections')
 def list_collections():
     """List recent collection runs"""
@@ -1405,6 +1382,56 @@ def list_collections():
         logger.error(f"Failed to list collections: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/db/collections/<collection_id>/switches')
+def list_collection_switch_runs(collection_id):
+    """Per-switch stage timings and counts of one collection run"""
+    try:
+        return jsonify({'collection_id': collection_id, 'switches': get_collection_switch_runs(collection_id)})
+    except Exception as e:
+        logger.error(f"Failed to list switch runs: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/collection/requests')
+def list_collection_requests():
+    """Collections submitted to the collector daemon, newest first"""
+    try:
+        collection_requests = CollectionRequest.query.order_by(CollectionRequest.id.desc()).limit(20).all()
+        return jsonify({'requests': [r.to_dict() for r in collection_requests]})
+    except Exception as e:
+        logger.error(f"Failed to list collection requests: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/collections/<collection_id>/tasks')
+def list_collection_tasks(collection_id):
+    """Work queue tasks of one collection run: status, lease owner and attempts per switch"""
+    try:
+        return jsonify({'collection_id': collection_id, 'tasks': get_collection_tasks(collection_id)})
+    except Exception as e:
+        logger.error(f"Failed to list collection tasks: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/collection/timings')
+def collection_timings():
+    """p50/p95 stage timings per switch over the last `days`, slowest first, with regressions flagged"""
+    try:
+        days = request.args.get('days', 30, type=int)
+        with QueryGuard(db.session, Config.STATS_STATEMENT_TIMEOUT_MS):
+            switches = get_switch_timing_stats(days, request.args.get('switch') or None)
+        return jsonify({'days': days, 'switches': switches})
+    except Exception as e:
+        logger.error(f"Failed to get collection timings: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/collection/timings/<switch_name>')
+def collection_timings_trend(switch_name):
+    """Stage timings of the latest runs of one switch, oldest first"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        return jsonify({'switch_name': switch_name, 'runs': get_switch_timing_trend(switch_name, limit)})
+    except Exception as e:
+        logger.error(f"Failed to get timing trend: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/db/health')
 def database_health():
     """Get database health information"""
@@ -1428,7 +1455,12 @@ def database_health():
                 'total_entries': total_entries,
                 'total_collections': total_collections,
                 'last_activity': last_activity,
-                'database_connected': True
+                'database_connected': True,
+                'search_cache': {
+                    **cache_listener.info(),
+                    'results': result_cache.info(),
+                    'counts': count_cache.info()
+                }
             })
 
     except Exception as e:
@@ -1547,6 +1579,8 @@ def cleanup_stuck_collections():
             logger.info("Removed stale lock file")
 
         db.session.commit()
+        for collection in stuck_collections:
+            cancel_pending_tasks(collection.id, 'Collection cleanup')
 
         return jsonify({
             'success': True,
@@ -1592,6 +1626,9 @@ def collect_with_credentials():
                 }
             }), 409
 
+        if Config.COLLECTION_DAEMON:
+            return submit_to_collector_daemon(username, password, 'credentials')
+
         def run_collection():
             try:
                 with app.app_context():
@@ -1672,6 +1709,9 @@ def collect_data_maintenance():
                 'message': 'Credentials required for collection'
             })
 
+        if Config.COLLECTION_DAEMON:
+            return submit_to_collector_daemon(username, password, 'maintenance')
+
         def run_collection():
             try:
                 logger.info("Starting maintenance collection")
@@ -1705,6 +1745,17 @@ def collect_data_maintenance():
 
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus exposition of all workers' metrics"""
+    if not METRICS_ENABLED:
+        return 'prometheus_client is not installed\n', 503, {'Content-Type': 'text/plain'}
+    try:
+        return generate_metrics(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+    except Exception as e:
+        logger.error(f"Failed to generate metrics: {str(e)}")
+        return f'{e}\n', 500, {'Content-Type': 'text/plain'}
+
 @app.route('/api/device-lookup/stats')
 def device_lookup_stats():
     """Get device lookup optimization statistics"""
@@ -1759,10 +1810,119 @@ def device_lookup_cache_debug():
         logger.error(f"Error in cache debug endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Column layout shared by the CSV and NDJSON exports
+EXPORT_COLUMNS = [
+    ('timestamp', 'Timestamp'),
+    ('switch_name', 'Switch'),
+    ('context', 'Context'),
+    ('event_type', 'Event Type'),
+    ('wwn', 'WWN'),
+    ('port_info', 'Port Info'),
+    ('alias', 'Alias'),
+    ('node_symbol', 'Node Symbol'),
+    ('raw_line', 'Raw Line')
+]
+
+# Rows fetched per server-side cursor round-trip and flushed per response chunk
+EXPORT_BATCH_SIZE = 2000
+
+def build_export_query():
+    """Column-only LogEntry query for exports (no ORM object materialization)"""
+    return db.session.query(*[getattr(LogEntry, column) for column, _ in EXPORT_COLUMNS])
+
+def generate_export_stream(query, export_format='csv', compress=False, guard=None):
+    """
+    Stream export rows from a server-side cursor as CSV or NDJSON
+
+    Rows are fetched with yield_per so only one batch is held in memory at a time;
+    output is flushed per batch and optionally gzip-compressed on the fly.
+    An optional QueryGuard bounds each batch fetch and cancels it if the client leaves.
+    """
+    with guard or nullcontext():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == 'csv' else None
+        column_keys = [column for column, _ in EXPORT_COLUMNS]
+
+        def flush_buffer():
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            return compressor.compress(data) if compressor else data
+
+        if writer:
+            writer.writerow([label for _, label in EXPORT_COLUMNS])
+
+        rows_in_buffer = 0
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            values = list(row)
+            values[0] = values[0].isoformat() if values[0] else None
+
+            if writer:
+                writer.writerow(['' if value is None else value for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(column_keys, values)), separators=(',', ':')))
+                buffer.write('\n')
+
+            rows_in_buffer += 1
+            if rows_in_buffer >= EXPORT_BATCH_SIZE:
+                rows_in_buffer = 0
+                chunk = flush_buffer()
+                if chunk:
+                    yield chunk
+
+        chunk = flush_buffer()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+
+def build_export_response(query, export_format='csv', compress=False, guard=None):
+    """Wrap an export query in a streaming download response"""
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"switch_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if compress:
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return app.response_class(
+        stream_with_context(generate_export_stream(query, export_format, compress, guard)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/db/export')
+def export_database():
+    """Stream all entries matching the /api/db/search filters as CSV or NDJSON"""
+    try:
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+
+        compress = request.args.get('compress', '').lower() in ('gzip', 'true', '1')
+
+        filters = get_search_filters(request.args)
+        query = apply_search_filters(build_export_query(), filters)
+        query = apply_search_sort(query,
+                                  request.args.get('sort_column', 'timestamp'),
+                                  request.args.get('sort_direction', 'desc'),
+                                  q=filters['q'])
+
+        guard = QueryGuard(db.session, Config.EXPORT_STATEMENT_TIMEOUT_MS, environ=request.environ)
+        return build_export_response(query, export_format, compress, guard)
+
+    except Exception as e:
+        logger.error(f"Export failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Missing routes that are called by templates
 @app.route('/api/export-csv')
 def export_csv():
-    """Export search results to CSV"""
+    """Export search results to CSV (legacy parameter names)"""
     try:
         # Get search parameters
         search_params = {
@@ -1776,18 +1936,18 @@ def export_csv():
         }
         
         # Build query using same logic as search endpoint
-        query = LogEntry.query
+        query = build_export_query()
         
         if search_params['wwn']:
-            query = query.filter(LogEntry.wwn.ilike(f"%{search_params['wwn']}%"))
+            query = query.filter(wwn_filter(search_params['wwn']))
         if search_params['alias']:
-            query = query.filter(LogEntry.alias.ilike(f"%{search_params['alias']}%"))
+            query = query.filter(LogEntry.alias.ilike(contains_pattern(search_params['alias']), escape='\\'))
         if search_params['node_symbol']:
-            query = query.filter(LogEntry.node_symbol.ilike(f"%{search_params['node_symbol']}%"))
+            query = query.filter(LogEntry.node_symbol.ilike(contains_pattern(search_params['node_symbol']), escape='\\'))
         if search_params['switch_name']:
-            query = query.filter(LogEntry.switch_name.ilike(f"%{search_params['switch_name']}%"))
+            query = query.filter(LogEntry.switch_name.ilike(contains_pattern(search_params['switch_name']), escape='\\'))
         if search_params['event_type']:
-            query = query.filter(LogEntry.event_type.ilike(f"%{search_params['event_type']}%"))
+            query = query.filter(LogEntry.event_type.ilike(contains_pattern(search_params['event_type']), escape='\\'))
         if search_params['start_date']:
             start_dt = datetime.fromisoformat(search_params['start_date'].replace('Z', '+00:00'))
             query = query.filter(LogEntry.timestamp >= start_dt)
@@ -1795,40 +1955,9 @@ def export_csv():
             end_dt = datetime.fromisoformat(search_params['end_date'].replace('Z', '+00:00'))
             query = query.filter(LogEntry.timestamp <= end_dt)
             
-        entries = query.order_by(LogEntry.timestamp.desc()).all()
-        
-        # Create CSV content
-        import io
-        output = io.StringIO()
-        writer = csv.writer(output)
+        query = query.order_by(LogEntry.timestamp.desc())
         
-        # Write header
-        writer.writerow([
-            'Timestamp', 'Switch', 'Context', 'Event Type', 'WWN', 
-            'Port Info', 'Alias', 'Node Symbol', 'Raw Line'
-        ])
-        
-        # Write data
-        for entry in entries:
-            writer.writerow([
-                entry.timestamp.isoformat(),
-                entry.switch_name,
-                entry.context,
-                entry.event_type or '',
-                entry.wwn or '',
-                entry.port_info or '',
-                entry.alias or '',
-                entry.node_symbol or '',
-                entry.raw_line
-            ])
-        
-        # Create response
-        response = app.response_class(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=switch_logs_export.csv'}
-        )
-        return response
+        return build_export_response(query, 'csv')
         
     except Exception as e:
         logger.error(f"Export failed: {str(e)}")
@@ -1846,6 +1975,8 @@ def force_cleanup_collections():
             collection.error_message = 'Force cleaned up - was stuck in running status'
         
         db.session.commit()
+        for collection in stuck_collections:
+            cancel_pending_tasks(collection.id, 'Force cleanup')
         
         return jsonify({
             'success': True,
@@ -1870,12 +2001,52 @@ def manual_log_cleanup():
         cleanup_temporary_log_files()
         return jsonify({
             'success': True,
-            'message': 'Temporary log files cleanup completed'
+            'message': 'Temporary log files cleanup completed',
+            'captures': capture_archive.stats()
         })
     except Exception as e:
         logger.error(f"Manual log cleanup failed: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/db/migrate', methods=['POST'])
+def run_schema_upgrades():
+    """Re-apply idempotent schema upgrades and start the data migrations (backfills, index builds)"""
+    try:
+        with app.app_context():
+            apply_schema_upgrades()
+        threading.Thread(target=scheduled_data_migrations, daemon=True).start()
+        return jsonify({
+            'success': True,
+            'message': 'Schema upgrades applied, data migrations started in the background'
+        })
+    except Exception as e:
+        logger.error(f"Schema upgrade failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/partitions')
+def partition_status():
+    """log_entries partitioning state: partitions, bounds, sizes and migration progress"""
+    try:
+        with app.app_context():
+            return jsonify(partition_manager.status())
+    except Exception as e:
+        logger.error(f"Partition status failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/partitions/maintenance', methods=['POST'])
+def run_partition_maintenance():
+    """Run partition maintenance now (upcoming partitions, retention; ?migrate=true also migrates) in the background"""
+    try:
+        migrate = request.args.get('migrate', 'false').lower() == 'true'
+        threading.Thread(target=scheduled_partition_maintenance, args=(migrate,), daemon=True).start()
+        return jsonify({
+            'success': True,
+            'message': 'Partition maintenance started - check /api/db/partitions for progress'
+        }), 202
+    except Exception as e:
+        logger.error(f"Partition maintenance start failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/maintenance/force-remove-job/<job_id>', methods=['DELETE'])
 def force_remove_job(job_id):
     """Force remove a job from database even if not in scheduler"""
@@ -1931,10 +2102,10 @@ def cleanup_scheduler_jobs():
             if not active_scheduler:
                 return jsonify({'error': 'No scheduler available'}), 500
             
-            # Remove all existing jobs except sync monitor
+            # Remove all existing jobs except built-in ones
             current_jobs = active_scheduler.get_jobs()
             for job in current_jobs:
-                if job.id != 'job_sync_monitor':
+                if job.id not in SYSTEM_JOB_IDS:
                     active_scheduler.remove_job(job.id)
                     logger.info(f"Removed job: {job.id}")
             
@@ -2005,6 +2176,7 @@ def force_sync_jobs():
             if not scheduler or not scheduler.running:
                 from apscheduler.schedulers.background import BackgroundScheduler
                 working_scheduler = BackgroundScheduler()
+                instrument_scheduler(working_scheduler)
                 working_scheduler.start()
                 active_scheduler = working_scheduler
                 logger.info(f"Working scheduler started on worker {os.getpid()}")
@@ -2073,6 +2245,7 @@ if __name__ == '__main__':
     # Initialize background scheduler that works
     from apscheduler.schedulers.background import BackgroundScheduler
     scheduler = BackgroundScheduler()
+    instrument_scheduler(scheduler)
     scheduler.start()
     logger.info("BACKGROUND SCHEDULER: Started successfully")
     
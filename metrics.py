@@ -0,0 +1,225 @@
+"""
+Metrics for Switch Log Analyzer
+Prometheus metrics for collections, SSH throughput, device lookup and search
+caches, the SQLAlchemy pool, HTTP latency and scheduler lag, aggregated across
+gunicorn workers through PROMETHEUS_MULTIPROC_DIR
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+try:
+    # PROMETHEUS_MULTIPROC_DIR must be set before this import (gunicorn config does it)
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # Optional: metrics become no-ops and /metrics answers 503
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+METRICS_ENABLED = prometheus_client is not None
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if prometheus_client else 'text/plain'
+
+# Collections take seconds to tens of minutes; HTTP and pool waits milliseconds to seconds
+COLLECTION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900)
+
+SWITCH_STAGES = ('total', 'connect', 'ssh_wait', 'parse', 'lookup', 'insert')
+
+
+class _NoopMetric:
+    """Stand-in when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(metric_class, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return metric_class(f"switch_analyzer_{name}", documentation, labelnames, **kwargs)
+
+
+# Collections (one observation per switch per run, see collection_timings.record_switch_run)
+COLLECTION_RUNS = _metric(Counter, 'collection_switch_runs', 'Switch collections by outcome',
+                          ['switch', 'status'])
+COLLECTION_STAGE_SECONDS = _metric(Histogram, 'collection_switch_stage_seconds',
+                                   'Time spent per switch in each collection stage',
+                                   ['switch', 'stage'], buckets=COLLECTION_BUCKETS)
+COLLECTION_ENTRIES = _metric(Counter, 'collection_switch_entries', 'Log entries seen and inserted per switch',
+                             ['switch', 'kind'])
+SSH_BYTES = _metric(Counter, 'ssh_received_bytes', 'Bytes read from switch SSH sessions', ['switch'])
+SSH_WAIT_SECONDS = _metric(Counter, 'ssh_wait_seconds', 'Time spent waiting on switch SSH output', ['switch'])
+SSH_THROUGHPUT = _metric(Gauge, 'ssh_throughput_bytes_per_second', 'SSH throughput of the latest run per switch',
+                         ['switch'], multiprocess_mode='mostrecent')
+
+# Device lookup: tier 'memory' is the lru_cache, 'sqlite' the device_lookup.db index behind it
+LOOKUPS = _metric(Counter, 'device_lookups', 'Device alias lookups by tier and result', ['tier', 'result'])
+
+# In-process search caches (search_cache.py)
+SEARCH_CACHE_REQUESTS = _metric(Counter, 'search_cache_requests', 'Search cache lookups', ['cache', 'result'])
+
+# SQLAlchemy pool
+POOL_CHECKOUTS = _metric(Counter, 'db_pool_checkouts', 'Connections checked out of the pool')
+POOL_CHECKED_OUT = _metric(Gauge, 'db_pool_checked_out', 'Connections currently checked out',
+                           multiprocess_mode='livesum')
+POOL_WAIT_SECONDS = _metric(Histogram, 'db_pool_wait_seconds',
+                            'Time to obtain a pooled connection (waiting for a free one or opening it)',
+                            buckets=LATENCY_BUCKETS)
+POOL_TIMEOUTS = _metric(Counter, 'db_pool_timeouts', 'Checkouts that gave up after pool_timeout')
+
+# HTTP
+REQUEST_SECONDS = _metric(Histogram, 'http_request_duration_seconds',
+                          'Time to produce the response (headers, for streamed responses)',
+                          ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS)
+
+# Scheduler
+SCHEDULER_LAG_SECONDS = _metric(Histogram, 'scheduler_job_lag_seconds',
+                                'Delay between a job\'s scheduled time and its start', ['job'],
+                                buckets=LAG_BUCKETS)
+SCHEDULER_RUNS = _metric(Counter, 'scheduler_job_runs', 'Scheduler job executions by result', ['job', 'result'])
+SCHEDULER_DURATION_SECONDS = _metric(Histogram, 'scheduler_job_duration_seconds', 'Scheduler job run time',
+                                     ['job'], buckets=COLLECTION_BUCKETS)
+
+
+def observe_switch_run(switch_name: str, status: str, stage_seconds: dict, bytes_received: int,
+                       entries_seen: int, entries_inserted: int):
+    """Record one switch's collection; stage_seconds maps SWITCH_STAGES to seconds"""
+    COLLECTION_RUNS.labels(switch_name, status).inc()
+    for stage in SWITCH_STAGES:
+        if stage_seconds.get(stage) is not None:
+            COLLECTION_STAGE_SECONDS.labels(switch_name, stage).observe(stage_seconds[stage])
+    COLLECTION_ENTRIES.labels(switch_name, 'seen').inc(entries_seen)
+    COLLECTION_ENTRIES.labels(switch_name, 'inserted').inc(entries_inserted)
+
+    ssh_wait = stage_seconds.get('ssh_wait') or 0.0
+    SSH_BYTES.labels(switch_name).inc(bytes_received)
+    SSH_WAIT_SECONDS.labels(switch_name).inc(ssh_wait)
+    if ssh_wait > 0:
+        SSH_THROUGHPUT.labels(switch_name).set(bytes_received / ssh_wait)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+
+    # Moving average of this process's checkout waits (read by adaptive_concurrency)
+    recent_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_WAIT_SECONDS.observe(elapsed)
+            TimedQueuePool.recent_wait = 0.9 * TimedQueuePool.recent_wait + 0.1 * elapsed
+
+
+def instrument_engine(engine):
+    """Checkout counters and the checked-out gauge (listeners survive engine.dispose())"""
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+        POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        POOL_CHECKED_OUT.dec()
+
+
+def init_request_metrics(app):
+    """Latency histogram per Flask endpoint"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            REQUEST_SECONDS.labels(request.endpoint or 'unmatched', request.method,
+                                   str(response.status_code)).observe(time.perf_counter() - start)
+        return response
+
+
+def instrument_scheduler(scheduler):
+    """Job lag, duration and outcome from APScheduler events"""
+    if prometheus_client is None or scheduler is None:
+        return
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+
+    started = {}
+    lock = threading.Lock()
+
+    def listener(job_event):
+        job = job_event.job_id
+        if job_event.code == EVENT_JOB_SUBMITTED:
+            now = datetime.now(timezone.utc)
+            # Coalesced runs: lag of the oldest missed run time
+            lag = max((now - t).total_seconds() for t in job_event.scheduled_run_times)
+            SCHEDULER_LAG_SECONDS.labels(job).observe(max(lag, 0.0))
+            with lock:
+                started[job] = time.perf_counter()
+        elif job_event.code == EVENT_JOB_MISSED:
+            SCHEDULER_RUNS.labels(job, 'missed').inc()
+        else:
+            SCHEDULER_RUNS.labels(job, 'error' if job_event.code == EVENT_JOB_ERROR else 'success').inc()
+            with lock:
+                start = started.pop(job, None)
+            if start is not None:
+                SCHEDULER_DURATION_SECONDS.labels(job).observe(time.perf_counter() - start)
+
+    scheduler.add_listener(listener, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+
+def generate_metrics() -> bytes:
+    """Exposition text; merges every worker's samples in multiprocess mode"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+
+def clear_multiproc_dir():
+    """Remove the previous server's sample files (gunicorn on_starting)"""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith('.db'):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+def mark_worker_dead(pid: int):
+    """Drop a dead worker's live gauges (gunicorn child_exit)"""
+    if MULTIPROC_DIR and prometheus_client is not None:
+        multiprocess.mark_process_dead(pid)
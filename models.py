@@ -7,7 +7,9 @@ import os
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
-from sqlalchemy import Index
+from sqlalchemy import Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 
 
 class Base(DeclarativeBase):
@@ -21,20 +23,24 @@ class LogEntry(db.Model):
     """Main log entries table with optimized indexes"""
     __tablename__ = 'log_entries'
     
-    id = db.Column(db.Integer, primary_key=True)
+    # Range partitioned on timestamp, which therefore belongs to the primary key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     
     # Core log data
-    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, primary_key=True, nullable=False, index=True)
     switch_name = db.Column(db.String(100), nullable=False, index=True)
     context = db.Column(db.Integer, nullable=False, index=True)
     event_type = db.Column(db.String(50), nullable=True, index=True)
     
     # WWN and device information
-    wwn = db.Column(db.String(30), nullable=True, index=True)
+    wwn = db.Column(db.String(30), nullable=True, index=True)  # Canonical text form when parseable
+    wwn_int = db.Column(db.BigInteger, nullable=True)  # Order-preserving 64-bit form (see wwn_utils.py)
     port_info = db.Column(db.String(100), nullable=True)
     
     # Raw log line for reference
     raw_line = db.Column(db.Text, nullable=False)
+    # Full-text index over raw_line, maintained by PostgreSQL; not loaded with the row
+    raw_tsv = deferred(db.Column(TSVECTOR, Computed("to_tsvector('simple', raw_line)", persisted=True)))
     
     # Processed information
     alias = db.Column(db.String(200), nullable=True, index=True)
@@ -50,10 +56,12 @@ class LogEntry(db.Model):
     # Composite indexes for efficient queries
     __table_args__ = (
         Index('idx_timestamp_switch', 'timestamp', 'switch_name'),
-        Index('idx_wwn_timestamp', 'wwn', 'timestamp'),
+        Index('idx_wwn_int_timestamp', 'wwn_int', 'timestamp'),
         Index('idx_collection_switch', 'collection_id', 'switch_name'),
         Index('idx_alias_search', 'alias'),
         Index('idx_node_symbol_search', 'node_symbol'),
+        Index('idx_log_entries_raw_tsv', 'raw_tsv', postgresql_using='gin'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
     
     def to_dict(self):
@@ -74,6 +82,32 @@ class LogEntry(db.Model):
         }
 
 
+class LogRollupHourly(db.Model):
+    """Log entry counts per (hour, switch, context, event type), maintained at ingest"""
+    __tablename__ = 'log_rollup_hourly'
+    
+    bucket = db.Column(db.DateTime, primary_key=True)  # Start of the hour
+    switch_name = db.Column(db.String(100), primary_key=True)
+    context = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), primary_key=True)  # '' when the entry has no event type
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('idx_rollup_hourly_switch_bucket', 'switch_name', 'bucket'),
+    )
+
+
+class LogRollupDaily(db.Model):
+    """Log entry counts per (day, switch, context, event type), maintained at ingest"""
+    __tablename__ = 'log_rollup_daily'
+    
+    bucket = db.Column(db.DateTime, primary_key=True)  # Start of the day
+    switch_name = db.Column(db.String(100), primary_key=True)
+    context = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), primary_key=True)  # '' when the entry has no event type
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
 class CollectionRun(db.Model):
     """Track collection runs and their metadata"""
     __tablename__ = 'collection_runs'
@@ -114,6 +148,142 @@ class CollectionRun(db.Model):
         }
 
 
+class CollectionSwitchRun(db.Model):
+    """Per-switch outcome and stage timings of a collection run"""
+    __tablename__ = 'collection_switch_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    collection_id = db.Column(db.String(36), nullable=False, index=True)
+    switch_name = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(20), nullable=False)  # completed, failed
+    
+    # Stage timings in seconds
+    total_seconds = db.Column(db.Float, nullable=True)
+    connect_seconds = db.Column(db.Float, nullable=True)
+    ssh_wait_seconds = db.Column(db.Float, nullable=True)  # Sum over contexts
+    parse_seconds = db.Column(db.Float, nullable=True)
+    lookup_seconds = db.Column(db.Float, nullable=True)
+    insert_seconds = db.Column(db.Float, nullable=True)
+    context_timings = db.Column(db.JSON, nullable=True)  # {context: {wait_seconds, bytes, entries}}
+    
+    bytes_received = db.Column(db.BigInteger, default=0)
+    entries_seen = db.Column(db.Integer, default=0)
+    entries_inserted = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_switch_runs_switch_started', 'switch_name', 'started_at'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary for API responses"""
+        return {
+            'collection_id': self.collection_id,
+            'switch_name': self.switch_name,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'status': self.status,
+            'total_seconds': self.total_seconds,
+            'connect_seconds': self.connect_seconds,
+            'ssh_wait_seconds': self.ssh_wait_seconds,
+            'parse_seconds': self.parse_seconds,
+            'lookup_seconds': self.lookup_seconds,
+            'insert_seconds': self.insert_seconds,
+            'context_timings': self.context_timings,
+            'bytes_received': self.bytes_received,
+            'entries_seen': self.entries_seen,
+            'entries_inserted': self.entries_inserted,
+            'error': self.error
+        }
+
+
+class CollectionTask(db.Model):
+    """One switch of a collection run, claimed by any collector process (see work_queue.py)"""
+    __tablename__ = 'collection_tasks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    collection_id = db.Column(db.String(36), nullable=False)
+    switch_info = db.Column(db.String(200), nullable=False)  # switches.conf entry (SITE:SWITCH:GEN)
+    switch_name = db.Column(db.String(100), nullable=False)
+    site = db.Column(db.String(100), nullable=False, default='')
+    position = db.Column(db.Integer, nullable=False, default=0)  # Claim order within the run (longest first)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed, canceled
+
+    # Lease of the process running the task, extended by its heartbeats
+    lease_owner = db.Column(db.String(200), nullable=True)  # host:pid
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    # Outcome, aggregated into the CollectionRun when the last task finishes
+    inserted_count = db.Column(db.Integer, default=0)
+    total_entries = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        Index('idx_collection_tasks_claim', 'status', 'position', 'id'),
+        Index('idx_collection_tasks_collection', 'collection_id', 'status'),
+    )
+
+    def to_dict(self):
+        """Convert to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'collection_id': self.collection_id,
+            'switch_name': self.switch_name,
+            'site': self.site,
+            'position': self.position,
+            'status': self.status,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'attempts': self.attempts,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'inserted_count': self.inserted_count,
+            'total_entries': self.total_entries,
+            'error': self.error
+        }
+
+
+class CollectionRequest(db.Model):
+    """Collection submitted by the web app and started by collector_daemon.py"""
+    __tablename__ = 'collection_requests'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, started, completed, failed, skipped, expired
+    source = db.Column(db.String(50), nullable=False, default='manual')
+    username = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.Text, nullable=True)  # Encrypted with SECRET_KEY; cleared on claim or expiry
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    claimed_by = db.Column(db.String(200), nullable=True)  # host:pid of the daemon
+    collection_id = db.Column(db.String(36), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        """Convert to dictionary for API responses (never the password)"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'source': self.source,
+            'username': self.username,
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'claimed_by': self.claimed_by,
+            'collection_id': self.collection_id,
+            'error': self.error
+        }
+
+
 class AliasMapping(db.Model):
     """Alias mappings from CSV file"""
     __tablename__ = 'alias_mappings'
@@ -0,0 +1,246 @@
+"""
+Parse Pool for Switch Log Analyzer
+Optional process pool for the CPU-bound half of a collection: parsing raw
+context output, year deduction, timestamp conversion, WWN normalization and
+device lookups. Collector threads then only read SSH output and insert the
+compact rows the pool returns, so parsing scales with the cores instead of
+sharing one GIL.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import Config
+from device_lookup_optimized import device_lookup, lookup_alias_and_node_symbol, extract_slot_port_from_entry
+from simple_switch_collector import SimpleLogCollector
+from wwn_utils import normalize_wwn
+
+logger = logging.getLogger(__name__)
+
+# Entry timestamps after year deduction ("Wed Jun 28 2024 02:07:20.885")
+TIMESTAMP_FORMAT = '%a %b %d %Y %H:%M:%S.%f'
+
+
+class LogRow(NamedTuple):
+    """One log_entries row, without the switch_name and collection_id shared by the batch"""
+    timestamp: datetime
+    context: Optional[int]
+    event_type: Optional[str]
+    wwn: Optional[str]
+    wwn_int: Optional[int]
+    port_info: str
+    raw_line: str
+    alias: Optional[str]
+    node_symbol: Optional[str]
+
+
+class ParsedOutput(NamedTuple):
+    """Rows of one context (or a whole switch) plus what it took to build them"""
+    rows: List[LogRow]
+    entries: int  # Parsed entries, including those not newer than since
+    parse_seconds: float
+    lookup_seconds: float
+    errors: List[str]
+
+
+def build_rows(entries: List[Dict], switch_name: str,
+               since: Optional[datetime] = None) -> Tuple[List[LogRow], float, List[str]]:
+    """Rows for the entries newer than since: (rows, lookup seconds, per-entry errors)"""
+    rows = []
+    lookup_seconds = 0.0
+    errors = []
+    for entry in entries:
+        try:
+            entry_time = datetime.strptime(entry['timestamp'], TIMESTAMP_FORMAT)
+            if since and entry_time <= since:
+                continue
+
+            # WWN normalized once here; slot/port for the device_port.json lookup
+            wwn_int, wwn = normalize_wwn(entry.get('port_wwn') or entry.get('node_wwn'))
+            port_info = entry.get('slot_port', '') or entry.get('port_info', '')
+            slot_number, port_number = extract_slot_port_from_entry(entry)
+            alias, node_symbol = None, None
+
+            if wwn and slot_number is not None and port_number is not None:
+                lookup_start = time.perf_counter()
+                alias, node_symbol = lookup_alias_and_node_symbol(switch_name, slot_number, port_number, wwn)
+                lookup_seconds += time.perf_counter() - lookup_start
+
+            rows.append(LogRow(entry_time, entry.get('context'), entry.get('event'), wwn, wwn_int,
+                               port_info, entry.get('raw_line', ''), alias, node_symbol))
+        except Exception as e:
+            errors.append(str(e))
+    return rows, lookup_seconds, errors
+
+
+def parse_entries(entries: List[Dict], switch_name: str, since: Optional[datetime] = None) -> ParsedOutput:
+    """Rows for entries already parsed by the collector thread"""
+    build_start = time.perf_counter()
+    rows, lookup_seconds, errors = build_rows(entries, switch_name, since)
+    return ParsedOutput(rows, len(entries), time.perf_counter() - build_start - lookup_seconds,
+                        lookup_seconds, errors)
+
+
+# Per-process parser and the device index version its lookup cache was filled from
+_parser = None
+_index_mtime = None
+
+
+def _init_worker(log_level: int):
+    """
+    Pool process setup. spawn re-imports the entry script (guarded by
+    __name__ == '__main__'), which may install its own shutdown handlers:
+    Ctrl-C is left to the parent and SIGTERM just ends the process.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _check_lookup_index():
+    """Drop this process's lookup cache once another process has rebuilt the device index"""
+    global _index_mtime
+    try:
+        mtime = os.path.getmtime(device_lookup.db_path)
+    except OSError:
+        return
+    if _index_mtime is not None and mtime != _index_mtime:
+        device_lookup.lookup_alias_and_node_symbol.cache_clear()
+    _index_mtime = mtime
+
+
+def parse_context_output(raw_output: str, site: str, switch_name: str, context: int, generation: str,
+                         since: Optional[datetime] = None, captured_at: Optional[datetime] = None) -> ParsedOutput:
+    """Parse and enrich one context's output; runs in a pool process (or inline as a fallback)"""
+    global _parser
+    parse_start = time.perf_counter()
+    if _parser is None:
+        _parser = SimpleLogCollector('', '')
+    entries = _parser.process_context_output(raw_output, site, switch_name, context, generation, captured_at)
+    _check_lookup_index()
+    rows, lookup_seconds, errors = build_rows(entries, switch_name, since)
+    return ParsedOutput(rows, len(entries), time.perf_counter() - parse_start - lookup_seconds,
+                        lookup_seconds, errors)
+
+
+class ParsePool:
+    """Process pool shared by the collector threads, started on first use"""
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the parent has live collector, scheduler and lease threads
+                # whose held locks a forked child would inherit
+                self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker,
+                                                     initargs=(logging.getLogger().getEffectiveLevel(),))
+                logger.info(f"PARSE: Started {self.processes} parse processes")
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor, error: Exception):
+        """Forget a broken pool; the next submit starts a new one"""
+        logger.error(f"PARSE: Parse pool broken ({error}), restarting it")
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, *args) -> Future:
+        """Queue parse_context_output(*args); parses inline if the pool cannot take it"""
+        executor = self._get_executor()
+        try:
+            return executor.submit(parse_context_output, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._discard(executor, e)
+            future = Future()
+            future.set_result(parse_context_output(*args))
+            return future
+
+    def result(self, future: Future, args: tuple) -> ParsedOutput:
+        """Result of a submitted parse, redone inline when its process died"""
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            with self._lock:
+                executor = self._executor
+            if executor is not None:
+                self._discard(executor, e)
+            return parse_context_output(*args)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def collect_switch_rows(collector: SimpleLogCollector, switch_info: str, pool: 'ParsePool',
+                        since: Optional[datetime] = None) -> ParsedOutput:
+    """
+    Read every context of a switch with collector, parsing each one in the pool
+    while the next is being read; rows newer than since, newest first
+    """
+    pending = []
+
+    def handle_output(site, switch_address, generation, context, raw_output):
+        args = (raw_output, site, switch_address, context, generation, since)
+        future = pool.submit(*args)
+        if collector.progress:
+            def parsed(done, context=context, switch_address=switch_address):
+                if done.exception() is None:
+                    collector.progress.context_parsed(switch_address, context, done.result().entries)
+            future.add_done_callback(parsed)
+        pending.append((switch_address, context, args, future))
+
+    collector.collect_contexts(switch_info, handle_output)
+
+    rows = []
+    entries = 0
+    parse_seconds = 0.0
+    lookup_seconds = 0.0
+    errors = []
+    for switch_address, context, args, future in pending:
+        try:
+            parsed = pool.result(future, args)
+        except Exception as e:
+            logger.error(f"PARSE: {switch_address} context {context} failed: {e}")
+            if collector.progress:
+                collector.progress.add_error(switch_address, f"Parse failed: {e}", context)
+            continue
+        rows.extend(parsed.rows)
+        entries += parsed.entries
+        parse_seconds += parsed.parse_seconds
+        lookup_seconds += parsed.lookup_seconds
+        errors.extend(parsed.errors)
+        collector.timings['contexts'][str(context)]['entries'] = parsed.entries
+
+    rows.sort(key=lambda row: row.timestamp, reverse=True)
+    return ParsedOutput(rows, entries, parse_seconds, lookup_seconds, errors)
+
+
+def _configured_processes() -> int:
+    """COLLECTION_PARSE_PROCESSES, with -1 meaning one process per core"""
+    processes = Config.COLLECTION_PARSE_PROCESSES
+    return (os.cpu_count() or 1) if processes < 0 else processes
+
+
+# Pool used by process_single_switch when COLLECTION_PARSE_PROCESSES is set
+parse_pool = ParsePool(_configured_processes())
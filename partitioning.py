@@ -0,0 +1,501 @@
+"""
+Partition Management for Switch Log Analyzer
+Native PostgreSQL range partitioning of log_entries on timestamp: creation of
+upcoming partitions, retention by dropping partitions and online migration
+of an existing unpartitioned table
+"""
+
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import Config
+from models import db, AppConfig
+from rollups import prune_rollups
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'log_entries'
+STAGING_TABLE = 'log_entries_part'
+ARCHIVE_TABLE = 'log_entries_unpartitioned'
+# Ids of log_entries rows inserted, updated or deleted while the migration copies
+CHANGES_TABLE = 'log_entries_migration_changes'
+CHANGES_FUNCTION = 'log_entries_migration_capture'
+CHANGES_TRIGGER = 'log_entries_migration_capture'
+
+# Suffixes keeping index names unique while the old and new tables coexist
+STAGING_SUFFIX = '_part'
+ARCHIVE_SUFFIX = '_old'
+
+# pg_advisory lock key so only one process runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 73012
+
+# DDL on log_entries waits at most this long for running queries instead of
+# queueing every new query behind its exclusive lock
+DDL_LOCK_TIMEOUT = '10s'
+
+MIGRATION_PROGRESS_KEY = 'partition_migration_last_id'
+# Captured changes re-applied to the staging table per transaction
+CHANGES_BATCH = 10000
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_INDEXDEF_RE = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON \S+ ')
+
+
+def _scalar(sql: str, params: Dict = None):
+    """Run a read-only query and return the first column of the first row"""
+    with db.engine.connect() as conn:
+        return conn.execute(text(sql), params or {}).scalar()
+
+
+def _exists(name: str) -> bool:
+    return bool(_scalar("SELECT to_regclass(:n) IS NOT NULL", {'n': name}))
+
+
+def default_partition(table: str = PARENT_TABLE) -> str:
+    """Name of the DEFAULT partition catching rows outside every range"""
+    return f"{table}_default"
+
+
+class PartitionManager:
+    """Creates, lists, drops and migrates log_entries range partitions"""
+
+    def __init__(self, interval: str = None, ahead: int = None, retention_days: int = None,
+                 copy_batch_size: int = None):
+        self.interval = (interval or Config.LOG_PARTITION_INTERVAL).lower()
+        if self.interval not in ('day', 'week', 'month'):
+            raise ValueError(f"Unsupported partition interval: {self.interval}")
+        self.ahead = Config.LOG_PARTITIONS_AHEAD if ahead is None else ahead
+        self.retention_days = Config.LOG_RETENTION_DAYS if retention_days is None else retention_days
+        self.copy_batch_size = copy_batch_size or Config.LOG_PARTITION_COPY_BATCH
+
+    # Partition ranges
+
+    def period_start(self, moment: datetime) -> datetime:
+        """Start of the partition period containing moment"""
+        day = datetime(moment.year, moment.month, moment.day)
+        if self.interval == 'day':
+            return day
+        if self.interval == 'week':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    def next_period(self, start: datetime) -> datetime:
+        """Start of the period following the one beginning at start"""
+        if self.interval == 'day':
+            return start + timedelta(days=1)
+        if self.interval == 'week':
+            return start + timedelta(weeks=1)
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+
+    @staticmethod
+    def partition_name(start: datetime) -> str:
+        """Partition table name for a period, e.g. log_entries_p20261001"""
+        return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+    # Catalog inspection
+
+    @staticmethod
+    def is_partitioned(table: str = PARENT_TABLE) -> bool:
+        """True when table exists and is a partitioned table"""
+        return _scalar("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)", {'t': table}) == 'p'
+
+    @staticmethod
+    def list_partitions(table: str = PARENT_TABLE) -> List[Dict]:
+        """Partitions of table with their bounds, estimated rows and size"""
+        with db.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid),
+                       c.reltuples::bigint, pg_total_relation_size(c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(:t)
+                ORDER BY c.relname
+            """), {'t': table}).fetchall()
+
+        partitions = []
+        for name, bound, estimated_rows, size_bytes in rows:
+            match = _BOUND_RE.search(bound or '')
+            partitions.append({
+                'name': name,
+                'is_default': bound == 'DEFAULT',
+                'start': datetime.fromisoformat(match.group(1)) if match else None,
+                'end': datetime.fromisoformat(match.group(2)) if match else None,
+                'estimated_rows': max(estimated_rows or 0, 0),
+                'size_bytes': size_bytes,
+            })
+        return partitions
+
+    @staticmethod
+    def insert_columns(table: str = PARENT_TABLE) -> str:
+        """Column list for INSERT ... SELECT copies (generated columns are recomputed)"""
+        with db.engine.connect() as conn:
+            columns = [row[0] for row in conn.execute(text("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = :t AND is_generated = 'NEVER'
+                ORDER BY ordinal_position
+            """), {'t': table})]
+        return ', '.join(columns)
+
+    # Partition creation and retention
+
+    def create_partition(self, start: datetime, table: str = PARENT_TABLE) -> Optional[str]:
+        """
+        Create the partition for the period beginning at start
+
+        Rows of that period already sitting in the default partition are moved
+        into the new partition in the same transaction. Returns the partition
+        name when it was created, None when it already existed.
+        """
+        name = self.partition_name(start)
+        if _exists(name):
+            return None
+
+        end = self.next_period(start)
+        bounds = f"FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"
+        default_name = default_partition(table)
+        params = {'start': start, 'end': end}
+
+        with db.engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            stray = 0
+            if _exists(default_name):
+                stray = conn.execute(text(
+                    f"SELECT count(*) FROM {default_name} WHERE timestamp >= :start AND timestamp < :end"
+                ), params).scalar()
+
+            if not stray:
+                conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+            else:
+                # A range cannot be attached while the default partition holds rows for it
+                columns = self.insert_columns(table)
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default_name}"))
+                conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+                conn.execute(text(
+                    f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default_name} "
+                    f"WHERE timestamp >= :start AND timestamp < :end"
+                ), params)
+                conn.execute(text(
+                    f"DELETE FROM {default_name} WHERE timestamp >= :start AND timestamp < :end"
+                ), params)
+                conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default_name} DEFAULT"))
+                logger.info(f"PARTITIONS: Moved {stray} rows from {default_name} into {name}")
+
+        logger.info(f"PARTITIONS: Created {name} ({start:%Y-%m-%d} - {end:%Y-%m-%d})")
+        return name
+
+    def ensure_partitions(self, table: str = PARENT_TABLE, oldest: datetime = None) -> List[str]:
+        """Create the default partition and every period from oldest (default: now) to LOG_PARTITIONS_AHEAD"""
+        created = []
+        default_name = default_partition(table)
+        if not _exists(default_name):
+            with db.engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"CREATE TABLE {default_name} PARTITION OF {table} DEFAULT"))
+            created.append(default_name)
+
+        now = datetime.utcnow()
+        start = self.period_start(min(oldest, now) if oldest else now)
+        horizon = self.period_start(now)
+        for _ in range(self.ahead):
+            horizon = self.next_period(horizon)
+
+        while start <= horizon:
+            name = self.create_partition(start, table)
+            if name:
+                created.append(name)
+            start = self.next_period(start)
+        return created
+
+    def retention_boundary(self, now: datetime = None) -> Optional[datetime]:
+        """
+        Start of the period holding the LOG_RETENTION_DAYS cutoff (None keeps everything)
+
+        Partitions ending at or before it hold only expired rows; rows from
+        this boundary on are kept whichever partition they sit in.
+        """
+        if self.retention_days <= 0:
+            return None
+        return self.period_start((now or datetime.utcnow()) - timedelta(days=self.retention_days))
+
+    def oldest_default_row(self, table: str = PARENT_TABLE) -> Optional[datetime]:
+        """Oldest retained timestamp in the default partition, where rows land before their range exists"""
+        default_name = default_partition(table)
+        if not _exists(default_name):
+            return None
+        oldest = _scalar(f"SELECT min(timestamp) FROM {default_name}")
+        boundary = self.retention_boundary()
+        if oldest and boundary:
+            oldest = max(oldest, boundary)
+        return oldest
+
+    def apply_retention(self) -> List[str]:
+        """Drop partitions entirely older than LOG_RETENTION_DAYS (0 keeps everything)"""
+        boundary = self.retention_boundary()
+        if boundary is None:
+            return []
+
+        dropped = []
+        for partition in self.list_partitions():
+            if partition['is_default'] or not partition['end'] or partition['end'] > boundary:
+                continue
+            with db.engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition['name']}"))
+                conn.execute(text(f"DROP TABLE {partition['name']}"))
+            dropped.append(partition['name'])
+            logger.info(f"PARTITIONS: Dropped {partition['name']} (retention {self.retention_days} days)")
+
+        # Prune the default partition's expired stragglers and the rollups at the same
+        # boundary, never at the oldest partition: history may still sit in the default
+        with db.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {default_partition()} WHERE timestamp < :boundary"), {'boundary': boundary})
+        prune_rollups(boundary)
+        return dropped
+
+    # Online migration of an unpartitioned table
+
+    def migrate_to_partitioned(self) -> bool:
+        """
+        Convert an existing plain log_entries table into a partitioned one
+
+        Rows are copied into a partitioned staging table in id batches, each
+        committed on its own, while collections keep inserting into the old
+        table. A trigger records the id of every row inserted, updated or
+        deleted meanwhile, so rows committed late with an id below a copied
+        batch and updates to copied rows are re-applied from the old table.
+        Progress is stored in app_config so an interrupted migration resumes.
+        The final catch-up and the table swap run in one short transaction
+        under an exclusive lock; the old table is kept as
+        log_entries_unpartitioned until an operator drops it.
+        """
+        if self.is_partitioned() or not _exists(PARENT_TABLE):
+            return False
+
+        if _exists(STAGING_TABLE) and not _exists(CHANGES_TABLE):
+            # Copy started without change capture: its batches may miss rows
+            logger.warning(f"PARTITIONS: Restarting migration, {STAGING_TABLE} has no change capture")
+            with db.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE {STAGING_TABLE}"))
+
+        if not _exists(STAGING_TABLE):
+            self._create_change_capture()
+            self._create_staging_table()
+            AppConfig.set_value(MIGRATION_PROGRESS_KEY, 0)
+
+        columns = self.insert_columns(PARENT_TABLE)
+        last_id = int(AppConfig.get_value(MIGRATION_PROGRESS_KEY) or 0)
+
+        # Copy until the remaining tail is smaller than one batch
+        while True:
+            max_id = _scalar(f"SELECT coalesce(max(id), 0) FROM {PARENT_TABLE}")
+            if max_id - last_id <= self.copy_batch_size:
+                break
+            high = last_id + self.copy_batch_size
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    f"INSERT INTO {STAGING_TABLE} ({columns}) SELECT {columns} FROM {PARENT_TABLE} "
+                    f"WHERE id > :low AND id <= :high"
+                ), {'low': last_id, 'high': high})
+            last_id = high
+            AppConfig.set_value(MIGRATION_PROGRESS_KEY, last_id)
+            logger.info(f"PARTITIONS: Migration copied ids up to {last_id} of {max_id}")
+            # Keep the backlog for the locked final step short
+            with db.engine.begin() as conn:
+                self._apply_changes(conn, columns, last_id)
+
+        self._swap_tables(columns, last_id)
+        AppConfig.set_value(MIGRATION_PROGRESS_KEY, None)
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ANALYZE {PARENT_TABLE}"))
+        logger.info(f"PARTITIONS: {PARENT_TABLE} is now partitioned by {self.interval}, "
+                    f"old table kept as {ARCHIVE_TABLE}")
+        return True
+
+    def _create_change_capture(self):
+        """Table and row trigger recording the ids of rows changed during the copy"""
+        with db.engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {CHANGES_TABLE}"))
+            conn.execute(text(f"CREATE TABLE {CHANGES_TABLE} (id BIGINT NOT NULL)"))
+            conn.execute(text(f"CREATE INDEX {CHANGES_TABLE}_id ON {CHANGES_TABLE} (id)"))
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION {CHANGES_FUNCTION}() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        INSERT INTO {CHANGES_TABLE} (id) VALUES (OLD.id);
+                    ELSE
+                        INSERT INTO {CHANGES_TABLE} (id) VALUES (NEW.id);
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """))
+            # Waits for in-flight inserts, so every row committed before it is seen by the batches
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {CHANGES_TRIGGER} ON {PARENT_TABLE}"))
+            conn.execute(text(
+                f"CREATE TRIGGER {CHANGES_TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {PARENT_TABLE} "
+                f"FOR EACH ROW EXECUTE FUNCTION {CHANGES_FUNCTION}()"
+            ))
+
+    def _apply_changes(self, conn, columns: str, last_id: int) -> int:
+        """
+        Re-copy captured rows with ids up to last_id (higher ids are still
+        copied by a later batch); returns the number of distinct ids applied
+        """
+        applied = 0
+        while True:
+            # Taking the ids out first: a change committed after this still gets applied later
+            ids = sorted({row[0] for row in conn.execute(text(
+                f"DELETE FROM {CHANGES_TABLE} WHERE ctid IN "
+                f"(SELECT ctid FROM {CHANGES_TABLE} WHERE id <= :last LIMIT :n) RETURNING id"
+            ), {'last': last_id, 'n': CHANGES_BATCH})})
+            if not ids:
+                return applied
+            conn.execute(text(f"DELETE FROM {STAGING_TABLE} WHERE id = ANY(:ids)"), {'ids': ids})
+            conn.execute(text(
+                f"INSERT INTO {STAGING_TABLE} ({columns}) SELECT {columns} FROM {PARENT_TABLE} WHERE id = ANY(:ids)"
+            ), {'ids': ids})
+            applied += len(ids)
+
+    def _create_staging_table(self):
+        """Partitioned copy of log_entries with the same columns, indexes and partitions"""
+        oldest = _scalar(f"SELECT min(timestamp) FROM {PARENT_TABLE}")
+        with db.engine.connect() as conn:
+            index_defs = conn.execute(text("""
+                SELECT indexname, indexdef FROM pg_indexes
+                WHERE schemaname = current_schema() AND tablename = :t AND indexname <> :pkey
+            """), {'t': PARENT_TABLE, 'pkey': f"{PARENT_TABLE}_pkey"}).fetchall()
+
+        with db.engine.begin() as conn:
+            # INCLUDING DEFAULTS shares the id sequence, so ids stay unique across both tables
+            conn.execute(text(
+                f"CREATE TABLE {STAGING_TABLE} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED) "
+                f"PARTITION BY RANGE (timestamp)"
+            ))
+            # Unique constraints on a partitioned table must include the partition key
+            conn.execute(text(f"ALTER TABLE {STAGING_TABLE} ADD PRIMARY KEY (id, timestamp)"))
+            for index_name, index_def in index_defs:
+                conn.execute(text(_INDEXDEF_RE.sub(
+                    lambda m: f"CREATE {m.group(1) or ''}INDEX {index_name}{STAGING_SUFFIX} ON {STAGING_TABLE} ",
+                    index_def
+                )))
+
+        created = self.ensure_partitions(STAGING_TABLE, oldest)
+        logger.info(f"PARTITIONS: Created staging table {STAGING_TABLE} with {len(created)} partitions")
+
+    def _swap_tables(self, columns: str, last_id: int):
+        """Copy the last rows and swap the staging table in under a short exclusive lock"""
+        with db.engine.connect() as conn:
+            old_indexes = [row[0] for row in conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t"
+            ), {'t': PARENT_TABLE})]
+            staging_indexes = [row[0] for row in conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t"
+            ), {'t': STAGING_TABLE})]
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': PARENT_TABLE}).scalar()
+
+        with db.engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            conn.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+            applied = self._apply_changes(conn, columns, last_id)
+            conn.execute(text(
+                f"INSERT INTO {STAGING_TABLE} ({columns}) SELECT {columns} FROM {PARENT_TABLE} WHERE id > :low"
+            ), {'low': last_id})
+            logger.info(f"PARTITIONS: Final catch-up re-applied {applied} changed rows")
+            conn.execute(text(f"DROP TRIGGER {CHANGES_TRIGGER} ON {PARENT_TABLE}"))
+            conn.execute(text(f"DROP FUNCTION {CHANGES_FUNCTION}()"))
+            conn.execute(text(f"DROP TABLE {CHANGES_TABLE}"))
+
+            # CREATE TABLE LIKE copies no triggers: keep a trigger-maintained raw_tsv filled
+            from db_migrations import RAW_TSV_FUNCTION, raw_tsv_trigger_sql
+            if conn.execute(text(
+                f"SELECT 1 FROM pg_trigger WHERE tgrelid = '{PARENT_TABLE}'::regclass AND tgname = :name"
+            ), {'name': RAW_TSV_FUNCTION}).first():
+                conn.execute(text(f"DROP TRIGGER {RAW_TSV_FUNCTION} ON {PARENT_TABLE}"))
+                conn.execute(text(raw_tsv_trigger_sql(STAGING_TABLE)))
+
+            for index_name in old_indexes:
+                conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}{ARCHIVE_SUFFIX}"))
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {ARCHIVE_TABLE}"))
+            conn.execute(text(f"ALTER TABLE {STAGING_TABLE} RENAME TO {PARENT_TABLE}"))
+            conn.execute(text(
+                f"ALTER TABLE {default_partition(STAGING_TABLE)} RENAME TO {default_partition(PARENT_TABLE)}"
+            ))
+
+            for index_name in staging_indexes:
+                if index_name == f"{STAGING_TABLE}_pkey":
+                    final_name = f"{PARENT_TABLE}_pkey"
+                else:
+                    final_name = index_name[:-len(STAGING_SUFFIX)]
+                conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {final_name}"))
+
+            # Otherwise dropping the archived table would drop the shared sequence
+            if sequence:
+                conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+
+    # Entry points
+
+    def run_maintenance(self, migrate: Optional[bool] = None) -> Dict:
+        """
+        Scheduled maintenance (call inside an app context)
+
+        Migrates an unpartitioned table when asked to (migrate=True, defaults to
+        LOG_PARTITION_AUTO_MIGRATE), creates the partitions from the oldest retained
+        row still in the default partition to the upcoming ones and applies retention.
+        """
+        if migrate is None:
+            migrate = Config.LOG_PARTITION_AUTO_MIGRATE
+        result = {'migrated': False, 'created': [], 'dropped': [], 'skipped': False}
+
+        # Session-level advisory lock held on its own connection for the whole run
+        with db.engine.connect() as lock_conn:
+            lock_conn = lock_conn.execution_options(isolation_level='AUTOCOMMIT')
+            if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {'k': MAINTENANCE_LOCK_KEY}).scalar():
+                logger.info("PARTITIONS: Maintenance already running in another process")
+                result['skipped'] = True
+                return result
+            try:
+                if not self.is_partitioned():
+                    if not migrate:
+                        return result
+                    result['migrated'] = self.migrate_to_partitioned()
+                result['created'] = self.ensure_partitions(oldest=self.oldest_default_row())
+                result['dropped'] = self.apply_retention()
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {'k': MAINTENANCE_LOCK_KEY})
+        return result
+
+    def status(self) -> Dict:
+        """Partitioning state for the API"""
+        partitioned = self.is_partitioned()
+        migration_last_id = AppConfig.get_value(MIGRATION_PROGRESS_KEY)
+        return {
+            'partitioned': partitioned,
+            'interval': self.interval,
+            'ahead': self.ahead,
+            'retention_days': self.retention_days,
+            'migration_in_progress': migration_last_id is not None and not partitioned,
+            'migration_last_id': migration_last_id,
+            'archive_table_present': _exists(ARCHIVE_TABLE),
+            'partitions': [
+                dict(p, start=p['start'].isoformat() if p['start'] else None,
+                     end=p['end'].isoformat() if p['end'] else None)
+                for p in (self.list_partitions() if partitioned else [])
+            ],
+        }
+
+
+# Global instance
+partition_manager = PartitionManager()
+
+
+def ensure_log_partitions() -> List[str]:
+    """Create missing log_entries partitions when the table is partitioned (call inside an app context)"""
+    if not partition_manager.is_partitioned():
+        return []
+    return partition_manager.ensure_partitions()
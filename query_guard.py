@@ -0,0 +1,165 @@
+"""
+Query Guard for Switch Log Analyzer
+Statement timeouts, EXPLAIN-based cost budgets and cancellation on client
+disconnect for user-driven queries, so one broad search cannot stall a worker
+"""
+
+import json
+import logging
+import select
+import socket
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from rollups import count_matching, rollups_cover
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE of a statement stopped by statement_timeout or a cancel request
+QUERY_CANCELED = '57014'
+
+# Seconds between client socket checks while a query runs
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+class QueryBudgetExceeded(Exception):
+    """The planner estimates the query above the endpoint's cost budget"""
+
+    def __init__(self, cost: float, max_cost: float):
+        super().__init__(
+            f"Query too broad (estimated cost {cost:,.0f}, limit {max_cost:,.0f}): "
+            f"add a date range, switch or more specific filter"
+        )
+        self.cost = cost
+        self.max_cost = max_cost
+
+
+def is_query_canceled(error: Exception) -> bool:
+    """True for errors raised because the statement timed out or was cancelled"""
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == QUERY_CANCELED
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True when the database connection itself was lost (worth one retry)"""
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def explain(session, query) -> Tuple[float, int]:
+    """Planner total cost and estimated row count of an ORM query (no execution)"""
+    connection = session.connection()
+    compiled = query.statement.compile(
+        dialect=connection.dialect, compile_kwargs={'render_postcompile': True}
+    )
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]['Plan']
+    return float(top['Total Cost']), int(top['Plan Rows'])
+
+
+def _client_socket(environ) -> Optional[socket.socket]:
+    """Client socket of the current request (gunicorn sync/gthread or werkzeug dev server)"""
+    if environ is None:
+        return None
+    return environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+
+
+def _client_disconnected(sock: socket.socket) -> bool:
+    """A readable socket with nothing to read means the client closed the connection"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except BlockingIOError:
+        return False
+    except (OSError, ValueError):
+        return True
+
+
+class QueryGuard:
+    """
+    Budget for the queries of one request
+
+    Used as a context manager around the request's queries: sets a
+    transaction-local statement_timeout and, while inside the block, cancels
+    the running statement if the client goes away.
+    """
+
+    def __init__(self, session, timeout_ms: int, max_cost: float = 0,
+                 exact_count_max_cost: float = 0, environ=None):
+        self.session = session
+        self.timeout_ms = timeout_ms
+        self.max_cost = max_cost
+        self.exact_count_max_cost = exact_count_max_cost
+        self.environ = environ
+        self.cancelled = False
+        self._done = threading.Event()
+        self._watcher = None
+
+    def __enter__(self):
+        # SET LOCAL semantics: reverts when the request's transaction ends
+        self.session.execute(text("SELECT set_config('statement_timeout', :timeout, true)"),
+                             {'timeout': str(int(self.timeout_ms))})
+
+        sock = _client_socket(self.environ)
+        if sock is not None:
+            fairy = self.session.connection().connection
+            dbapi_connection = getattr(fairy, 'dbapi_connection', None) or fairy.connection
+            self._watcher = threading.Thread(target=self._watch, args=(sock, dbapi_connection),
+                                             name='query-guard', daemon=True)
+            self._watcher.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._done.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        return False
+
+    def _watch(self, sock, dbapi_connection):
+        while not self._done.wait(DISCONNECT_POLL_INTERVAL):
+            if _client_disconnected(sock):
+                self.cancelled = True
+                logger.info("QUERY GUARD: Client disconnected, cancelling running query")
+                try:
+                    dbapi_connection.cancel()
+                except Exception as e:
+                    logger.warning(f"QUERY GUARD: Cancel failed: {e}")
+                return
+
+    def check_cost(self, query) -> float:
+        """Raise QueryBudgetExceeded when the planner estimate is above max_cost"""
+        if not self.max_cost:
+            return 0.0
+        cost, _ = explain(self.session, query)
+        if cost > self.max_cost:
+            logger.warning(f"QUERY GUARD: Rejected query with estimated cost {cost:,.0f} > {self.max_cost:,.0f}")
+            raise QueryBudgetExceeded(cost, self.max_cost)
+        return cost
+
+    def within_count_budget(self, query) -> bool:
+        """True when an exact COUNT over query is cheap enough to run"""
+        if not self.exact_count_max_cost:
+            return True
+        cost, _ = explain(self.session, query.order_by(None))
+        return cost <= self.exact_count_max_cost
+
+    def count(self, query, filters: Dict) -> Dict:
+        """
+        Total for a search: exact from the rollups when they cover the filters,
+        exact COUNT when affordable, otherwise the planner's row estimate
+        """
+        if rollups_cover(filters):
+            return {'total': count_matching(filters), 'total_estimated': False}
+
+        unordered = query.order_by(None)
+        if self.exact_count_max_cost:
+            cost, rows = explain(self.session, unordered)
+            if cost > self.exact_count_max_cost:
+                logger.info(f"QUERY GUARD: Count cost {cost:,.0f} over budget, using estimate of {rows} rows")
+                return {'total': rows, 'total_estimated': True}
+        return {'total': unordered.count(), 'total_estimated': False}
@@ -0,0 +1,278 @@
+"""
+Log Rollups for Switch Log Analyzer
+Hourly and daily entry counts per switch, context and event type, updated at
+ingest time so statistics, top-N and trend queries never scan log_entries once
+the first rebuild has counted the rows stored before them
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db, AppConfig, LogEntry, LogRollupHourly, LogRollupDaily
+from search_cache import notify_log_entries_changed
+from search_filters import contains_pattern, parse_date_from, parse_date_to
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MODELS = {'hour': LogRollupHourly, 'day': LogRollupDaily}
+
+# API dimension name -> rollup column
+DIMENSIONS = {'switch': 'switch_name', 'context': 'context', 'event': 'event_type'}
+
+# Windows up to this many hours are answered from the hourly table
+HOURLY_WINDOW_LIMIT = 72
+
+ROLLUPS_BUILT_KEY = 'rollups_built'
+
+# /api/db/search filters that only involve rollup dimensions (dates are whole days)
+ROLLUP_SEARCH_FILTERS = {'switches', 'context', 'event', 'date_from', 'date_to'}
+
+# Set once rollups_built is seen: the rollups never go back to not counting older rows
+_rollups_built = False
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupBatch:
+    """
+    Rollup increments for the log entries added in the current transaction
+
+    Call add() for every inserted entry and flush() right before each commit,
+    so the counters are updated atomically with the rows they count.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, timestamp: datetime, switch_name: str, context: int, event_type: Optional[str]):
+        self.counts[(hour_bucket(timestamp), switch_name, context, event_type or '')] += 1
+
+    def flush(self, session):
+        """Upsert the accumulated counts through session (same transaction as the entries)"""
+        if not self.counts:
+            return
+
+        daily = Counter()
+        for (bucket, switch_name, context, event_type), count in self.counts.items():
+            daily[(day_bucket(bucket), switch_name, context, event_type)] += count
+
+        for model, counts in ((LogRollupHourly, self.counts), (LogRollupDaily, daily)):
+            # Sorted keys give concurrent collector threads a consistent row lock order
+            rows = [
+                {'bucket': bucket, 'switch_name': switch_name, 'context': context,
+                 'event_type': event_type, 'count': count}
+                for (bucket, switch_name, context, event_type), count in sorted(counts.items())
+            ]
+            stmt = pg_insert(model).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['bucket', 'switch_name', 'context', 'event_type'],
+                set_={'count': model.count + stmt.excluded['count']}
+            )
+            session.execute(stmt)
+
+        self.counts.clear()
+
+
+def rebuild_rollups():
+    """
+    Recompute both rollup tables from log_entries (call inside an app context)
+
+    The rollup tables are locked for the duration, so concurrent ingest
+    waits at its flush and its increments apply on top of the rebuilt counts.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(text("LOCK TABLE log_rollup_hourly, log_rollup_daily IN EXCLUSIVE MODE"))
+        conn.execute(text("DELETE FROM log_rollup_hourly"))
+        conn.execute(text("DELETE FROM log_rollup_daily"))
+        conn.execute(text("""
+            INSERT INTO log_rollup_hourly (bucket, switch_name, context, event_type, count)
+            SELECT date_trunc('hour', timestamp), switch_name, context, coalesce(event_type, ''), count(*)
+            FROM log_entries
+            GROUP BY 1, 2, 3, 4
+        """))
+        conn.execute(text("""
+            INSERT INTO log_rollup_daily (bucket, switch_name, context, event_type, count)
+            SELECT date_trunc('day', bucket), switch_name, context, event_type, sum(count)
+            FROM log_rollup_hourly
+            GROUP BY 1, 2, 3, 4
+        """))
+        notify_log_entries_changed(conn, 'rollups rebuilt', rewritten=True)
+    AppConfig.set_value(ROLLUPS_BUILT_KEY, 'done')
+    logger.info("ROLLUPS: Rebuilt hourly and daily rollups from log_entries")
+
+
+def ensure_rollups():
+    """Build the rollups once for data stored before they existed (a data migration, never at startup)"""
+    if AppConfig.get_value(ROLLUPS_BUILT_KEY) != 'done':
+        rebuild_rollups()
+
+
+def rollups_ready() -> bool:
+    """True once rebuild_rollups() has counted the rows stored before the rollups existed"""
+    global _rollups_built
+    if not _rollups_built:
+        _rollups_built = AppConfig.get_value(ROLLUPS_BUILT_KEY) == 'done'
+    return _rollups_built
+
+
+class LogEntriesSource:
+    """
+    log_entries with the columns of a rollup table, each row counting once
+
+    Answers statistics, top-N and trends until the first rebuild_rollups()
+    has run; used with select_from() like a rollup model.
+    """
+
+    def __init__(self, granularity: str):
+        self.bucket = func.date_trunc(granularity, LogEntry.timestamp)
+        self.switch_name = LogEntry.switch_name
+        self.context = LogEntry.context
+        self.event_type = func.coalesce(LogEntry.event_type, '')
+        self.count = literal_column('1')
+
+    def __clause_element__(self):
+        return LogEntry.__table__
+
+
+def rollup_source(granularity: str):
+    """Rollup model for 'hour' or 'day', or log_entries until the rollups are built"""
+    if rollups_ready():
+        return ROLLUP_MODELS[granularity]
+    return LogEntriesSource(granularity)
+
+
+def prune_rollups(before: datetime):
+    """Drop rollup buckets older than before (day aligned), mirroring log_entries retention"""
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM log_rollup_hourly WHERE bucket < :before"), {'before': before})
+        conn.execute(text("DELETE FROM log_rollup_daily WHERE bucket < :before"), {'before': before})
+        notify_log_entries_changed(conn, 'retention', rewritten=True)
+
+
+def rollup_for_window(hours: Optional[int]):
+    """Rollup model and first bucket covering the last hours (all time when hours is None)"""
+    if hours is None:
+        return rollup_source('day'), None
+    since = datetime.utcnow() - timedelta(hours=hours)
+    if hours <= HOURLY_WINDOW_LIMIT:
+        return rollup_source('hour'), hour_bucket(since)
+    return rollup_source('day'), day_bucket(since)
+
+
+def apply_rollup_filters(query, model, since: Optional[datetime] = None, switches: List[str] = None,
+                         context: Optional[int] = None, event_type: Optional[str] = None):
+    """Restrict a rollup query by window start and the usual search dimensions (event as a substring, like search)"""
+    if since is not None:
+        query = query.filter(model.bucket >= since)
+    if switches:
+        query = query.filter(model.switch_name.in_(switches))
+    if context is not None:
+        query = query.filter(model.context == context)
+    if event_type is not None:
+        query = query.filter(model.event_type.ilike(contains_pattern(event_type), escape='\\'))
+    return query
+
+
+def rollups_cover(filters: Dict) -> bool:
+    """True when the rollups are built and every active search filter can be evaluated on them"""
+    active = {name for name, value in filters.items() if value}
+    return active <= ROLLUP_SEARCH_FILTERS and rollups_ready()
+
+
+def apply_rollup_search_filters(query, model, filters: Dict):
+    """Rollup equivalent of search_filters.apply_search_filters() for ROLLUP_SEARCH_FILTERS"""
+    if filters.get('switches'):
+        query = query.filter(model.switch_name.in_(filters['switches']))
+
+    if filters.get('event'):
+        query = query.filter(model.event_type.ilike(contains_pattern(filters['event']), escape='\\'))
+
+    if filters.get('context'):
+        query = query.filter(model.context == int(filters['context']))
+
+    # Date bounds are whole days, so they fall on hourly and daily bucket boundaries
+    date_from_obj = parse_date_from(filters.get('date_from'))
+    if date_from_obj:
+        query = query.filter(model.bucket >= date_from_obj)
+
+    date_to_obj = parse_date_to(filters.get('date_to'))
+    if date_to_obj:
+        query = query.filter(model.bucket <= date_to_obj)
+
+    return query
+
+
+def count_matching(filters: Dict) -> int:
+    """Exact number of log entries matching rollup-covered search filters"""
+    model = LogRollupDaily
+    query = db.session.query(func.coalesce(func.sum(model.count), 0))
+    return int(apply_rollup_search_filters(query, model, filters).scalar())
+
+
+def _event_value(value):
+    """Rollups store a missing event type as ''; the API reports it as null like log_entries"""
+    return value if value != '' else None
+
+
+def get_totals() -> Dict:
+    """All-time totals for /api/db/stats"""
+    model = rollup_source('day')
+    total = db.session.query(func.coalesce(func.sum(model.count), 0)).select_from(model).scalar()
+    switches = db.session.query(model.switch_name, func.sum(model.count)).select_from(model) \
+        .group_by(model.switch_name).order_by(model.switch_name).all()
+    contexts = db.session.query(model.context, func.sum(model.count)).select_from(model) \
+        .group_by(model.context).order_by(model.context).all()
+    return {
+        'total_entries': int(total),
+        'switches': [{'name': s, 'count': int(c)} for s, c in switches],
+        'contexts': [{'context': ctx, 'count': int(c)} for ctx, c in contexts],
+        'top_events': get_top('event', limit=10),
+    }
+
+
+def get_top(dimension: str, hours: Optional[int] = None, limit: int = 10, **filters) -> List[Dict]:
+    """Largest counts per dimension ('switch', 'context' or 'event') over the last hours"""
+    model, since = rollup_for_window(hours)
+    column = getattr(model, DIMENSIONS[dimension])
+    total = func.sum(model.count)
+    query = apply_rollup_filters(db.session.query(column, total).select_from(model), model, since, **filters)
+    rows = query.group_by(column).order_by(total.desc()).limit(limit).all()
+
+    key = 'name' if dimension == 'switch' else dimension
+    return [
+        {key: _event_value(value) if dimension == 'event' else value, 'count': int(count)}
+        for value, count in rows
+    ]
+
+
+def get_trend(granularity: str, hours: int, group_by: Optional[str] = None, **filters) -> List[Dict]:
+    """Entry counts per hour or day over the last hours, optionally split by a dimension"""
+    model = rollup_source(granularity)
+    since_time = datetime.utcnow() - timedelta(hours=hours)
+    since = hour_bucket(since_time) if granularity == 'hour' else day_bucket(since_time)
+
+    columns = [model.bucket]
+    if group_by:
+        columns.append(getattr(model, DIMENSIONS[group_by]))
+    query = db.session.query(*columns, func.sum(model.count)).select_from(model)
+    query = apply_rollup_filters(query, model, since, **filters)
+    rows = query.group_by(*columns).order_by(*columns).all()
+
+    points = []
+    for row in rows:
+        point = {'bucket': row[0].isoformat(), 'count': int(row[-1])}
+        if group_by:
+            point[group_by] = _event_value(row[1]) if group_by == 'event' else row[1]
+        points.append(point)
+    return points
@@ -0,0 +1,305 @@
+"""
+Scheduled Jobs for Switch Log Analyzer
+Collection, backup, cleanup and maintenance jobs shared by the web app's scheduler
+and collector_daemon.py; they only need the database app from app_factory.py.
+"""
+
+import fnmatch
+import logging
+import os
+import time
+from datetime import datetime
+
+from app_factory import get_app
+from capture_archive import capture_archive
+from db_migrations import apply_schema_upgrades, run_data_migrations
+from device_lookup_optimized import device_lookup
+from final_working_collector import run_simple_collection as run_clean_collection
+from models import db, LogEntry, CollectionRun, AliasMapping, SwitchStatus, ScheduledJob
+from partitioning import partition_manager
+from work_queue import expire_collection_requests
+
+logger = logging.getLogger(__name__)
+
+app = get_app()
+
+def cleanup_temporary_log_files():
+    """Clean up temporary log files, keep the capture archive within its budgets and expire stale collection requests"""
+    capture_archive.enforce_budgets()
+    try:
+        with app.app_context():
+            expire_collection_requests()
+    except Exception as e:
+        logger.error(f"Failed to expire collection requests: {e}")
+    try:
+        logs_dir = 'logs'
+        if not os.path.exists(logs_dir):
+            return
+        
+        # Define patterns for temporary files to clean up (only safe patterns)
+        temp_patterns = [
+            'aliases_test_*.txt',        # Test alias files
+            'simple_collection_test*.json',  # Test collection files
+            'scheduler_config*.json',    # Temporary scheduler configs
+            '*_temp.log',               # Explicitly temporary logs
+            '*_debug.log',              # Debug logs
+            'collection_*.tmp',         # Collection temporary files
+            'context_*_ctx*.json',      # Per-context output files written before the capture archive
+            'aliases_*.txt',            # Alias files from collections
+            'simple_collection_*.json'  # Collection result files
+        ]
+        
+        # Protected files that should NEVER be deleted
+        protected_files = [
+            'app.log',
+            'main.log', 
+            'error.log',
+            'access.log',
+            'production.log'
+        ]
+        
+        # One pass over logs/ for all patterns (captures live in their own directory with a manifest)
+        cleaned_files = []
+        with os.scandir(logs_dir) as entries:
+            for entry in entries:
+                filename = entry.name
+                if not any(fnmatch.fnmatchcase(filename, pattern) for pattern in temp_patterns):
+                    continue
+                try:
+                    # Check if file is in protected list
+                    if filename not in protected_files and not any(filename.endswith(pf) for pf in protected_files):
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        # Additional safety check: only delete files older than 1 hour
+                        file_age = time.time() - entry.stat().st_mtime
+                        if file_age > 3600:  # 1 hour = 3600 seconds
+                            os.remove(entry.path)
+                            cleaned_files.append(filename)
+                        else:
+                            logger.debug(f"Skipping recent file {filename} (age: {file_age/60:.1f} minutes)")
+                except OSError as e:
+                    logger.warning(f"Failed to remove temporary file {entry.path}: {e}")
+        
+        if cleaned_files:
+            logger.info(f"Cleaned up {len(cleaned_files)} temporary log files: {', '.join(cleaned_files)}")
+        else:
+            logger.debug("No temporary log files to clean up")
+            
+    except Exception as e:
+        logger.error(f"Error during log cleanup: {e}")
+
+def create_native_backup():
+    """Create backup using native Python without external tools"""
+    try:
+        backup_dir = 'backups'
+        os.makedirs(backup_dir, exist_ok=True)
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_filename = f'switch_analyzer_backup_{timestamp}.json'
+        backup_path = os.path.join(backup_dir, backup_filename)
+        
+        # Export data using SQLAlchemy
+        backup_data = {
+            'timestamp': timestamp,
+            'log_entries': [],
+            'collection_runs': [],
+            'scheduled_jobs': [],
+            'switch_status': [],
+            'alias_mappings': []
+        }
+        
+        # Export log entries (limit to recent entries to avoid huge files)
+        recent_entries = LogEntry.query.order_by(LogEntry.timestamp.desc()).limit(50000).all()
+        backup_data['log_entries'] = [entry.to_dict() for entry in recent_entries]
+        
+        # Export collection runs
+        collections = CollectionRun.query.all()
+        backup_data['collection_runs'] = [collection.to_dict() for collection in collections]
+        
+        # Export scheduled jobs
+        jobs = ScheduledJob.query.all()
+        backup_data['scheduled_jobs'] = [job.to_dict() for job in jobs]
+        
+        # Export switch status
+        switches = SwitchStatus.query.all()
+        backup_data['switch_status'] = [switch.to_dict() for switch in switches]
+        
+        # Export alias mappings
+        aliases = AliasMapping.query.all()
+        backup_data['alias_mappings'] = [alias.to_dict() for alias in aliases]
+        
+        # Write to file with compression
+        import gzip
+        import json
+        
+        with gzip.open(backup_path + '.gz', 'wt', encoding='utf-8') as f:
+            json.dump(backup_data, f, indent=2, default=str)
+        
+        # Get file size
+        stat = os.stat(backup_path + '.gz')
+        logger.info(f"Native backup completed: {backup_filename}.gz ({stat.st_size} bytes)")
+        logger.info(f"Backed up {len(backup_data['log_entries'])} log entries")
+        
+        return backup_path + '.gz'
+        
+    except Exception as e:
+        logger.error(f"Native backup failed: {str(e)}")
+        return None
+
+def scheduled_data_migrations():
+    """Backfill rows stored before a schema upgrade, in batches, outside startup"""
+    try:
+        with app.app_context():
+            run_data_migrations()
+    except Exception as e:
+        logger.error(f"Data migrations failed: {str(e)}")
+
+def scheduled_partition_maintenance(migrate=None):
+    """Pre-create upcoming log_entries partitions, apply retention and migrate an unpartitioned table"""
+    try:
+        with app.app_context():
+            result = partition_manager.run_maintenance(migrate)
+            if result['migrated'] or result['created'] or result['dropped']:
+                logger.info(f"PARTITIONS: Maintenance completed - {result}")
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {str(e)}")
+
+def scheduled_backup_job():
+    """Execute a scheduled backup using native method with lock protection"""
+    backup_lock_file = 'logs/backup.lock'
+    
+    try:
+        with app.app_context():
+            # Check for existing lock file to prevent multiple simultaneous backups
+            if os.path.exists(backup_lock_file):
+                # Check if lock is stale (older than 10 minutes)
+                lock_age = time.time() - os.path.getmtime(backup_lock_file)
+                if lock_age < 600:  # 10 minutes
+                    logger.warning(f"Scheduled backup skipped - already running (lock age: {lock_age/60:.1f} minutes)")
+                    return
+                else:
+                    logger.info("Removing stale backup lock file")
+                    os.remove(backup_lock_file)
+            
+            # Create lock file
+            os.makedirs('logs', exist_ok=True)
+            with open(backup_lock_file, 'w') as f:
+                f.write(f"{os.getpid()}\n{time.time()}\n")
+            
+            logger.info("Scheduled backup lock acquired")
+            
+            try:
+                logger.info("Starting scheduled backup...")
+                
+                # Try native backup first
+                backup_path = create_native_backup()
+                
+                if backup_path:
+                    logger.info("Scheduled backup completed successfully")
+                    # Clean up temporary log files after successful backup
+                    cleanup_temporary_log_files()
+                else:
+                    logger.error("Scheduled backup failed")
+                    
+            finally:
+                # Always remove lock file
+                try:
+                    if os.path.exists(backup_lock_file):
+                        os.remove(backup_lock_file)
+                        logger.info("Scheduled backup lock released")
+                except Exception as e:
+                    logger.warning(f"Failed to remove backup lock: {e}")
+                
+    except Exception as e:
+        logger.error(f"Scheduled backup job failed: {str(e)}")
+        # Ensure lock is cleaned up on error
+        try:
+            if os.path.exists(backup_lock_file):
+                os.remove(backup_lock_file)
+        except:
+            pass
+
+def scheduled_collection_job(username=None, password=None):
+    """Execute a scheduled collection using clean system with database lock protection
+
+    Returns the collection result, or None when another collection holds the lock.
+    """
+    try:
+        with app.app_context():
+            # Use database lock to prevent multiple simultaneous collections across all workers
+            from sqlalchemy import text
+            
+            # Check if a collection is already running using database lock
+            try:
+                result = db.session.execute(text(
+                    "SELECT pg_try_advisory_lock(12345) as acquired"
+                )).fetchone()
+                
+                if not result.acquired:
+                    logger.warning(f"Scheduled collection skipped - already running in another process (PID: {os.getpid()})")
+                    return
+                
+                logger.info(f"🔒 DATABASE LOCK ACQUIRED: Scheduled collection starting (PID: {os.getpid()})")
+                
+                try:
+                    # Use provided credentials if available, otherwise fall back to environment
+                    if not username or not password:
+                        username = os.getenv('SWITCH_USERNAME', '')
+                        password = os.getenv('SWITCH_PASSWORD', '')
+
+                    if not username or not password:
+                        logger.error("Scheduled collection failed: No credentials configured")
+                        return {'success': False, 'error': 'No credentials configured'}
+
+                    logger.info(f"Starting scheduled collection with PID {os.getpid()}")
+                    result = run_clean_collection(username, password)
+
+                    if result['success']:
+                        logger.info(f"Scheduled collection completed: {result['new_entries']} new entries")
+                        # Clean up temporary log files after successful scheduled collection
+                        cleanup_temporary_log_files()
+                    else:
+                        logger.error(f"Scheduled collection failed: {result.get('error', 'Unknown error')}")
+                    return result
+                        
+                finally:
+                    # Always release database lock
+                    try:
+                        db.session.execute(text("SELECT pg_advisory_unlock(12345)"))
+                        db.session.commit()
+                        logger.info(f"Database lock released (PID: {os.getpid()})")
+                    except Exception as e:
+                        logger.warning(f"Failed to release database lock: {e}")
+                        
+            except Exception as e:
+                logger.error(f"Database lock operation failed: {e}")
+                return
+
+    except Exception as e:
+        logger.error(f"Scheduled collection error: {str(e)}")
+        # Try to release lock on error
+        try:
+            with app.app_context():
+                db.session.execute(text("SELECT pg_advisory_unlock(12345)"))
+                db.session.commit()
+        except:
+            pass
+
+def create_tables():
+    """Create database tables on startup"""
+    try:
+        with app.app_context():
+            db.create_all()
+            logger.info("DATABASE: Tables initialized successfully")
+
+            # Indexes and schema changes that create_all() cannot express
+            apply_schema_upgrades()
+
+            # Initialize device lookup optimization
+            logger.info("Initializing device lookup optimization...")
+            device_lookup.refresh_index()
+            logger.info("Device lookup optimization ready")
+
+            # Jobs will be loaded after scheduler initialization
+    except Exception as e:
+        logger.error(f"DATABASE: Failed to initialize - {str(e)}")
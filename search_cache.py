@@ -0,0 +1,216 @@
+"""
+Search Cache for Switch Log Analyzer
+In-process caches for search results, totals/facets and stats, keyed by the
+normalized parameters and invalidated in every worker through LISTEN/NOTIFY
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from config import Config
+from metrics import SEARCH_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Channel notified in the same transaction as every log_entries change
+NOTIFY_CHANNEL = 'log_entries_changed'
+
+# app_config key holding the time rows were last deleted or rewritten (appends are
+# tracked by the id sequence); part of the HTTP ETag data version
+DATA_REWRITTEN_KEY = 'log_data_rewritten_at'
+
+# Seconds between listener connection health checks and reconnect attempts
+LISTEN_POLL_INTERVAL = 5
+LISTEN_RETRY_DELAY = 10
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return sorted(_normalize(v) for v in value)
+    return value
+
+
+def cache_key(*parts) -> str:
+    """Stable key for filter dicts and lists (key order and list order do not matter)"""
+    return json.dumps([_normalize(p) for p in parts], sort_keys=True, default=str)
+
+
+class SearchCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ttl seconds
+
+    generation changes on every clear(): a value computed before an
+    invalidation is not stored afterwards (pass the generation read before
+    querying to set()). A disabled cache never hits and stores nothing.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True, name: str = 'search'):
+        self.name = name  # Label of the cache in /metrics
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                SEARCH_CACHE_REQUESTS.labels(self.name, 'miss').inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            SEARCH_CACHE_REQUESTS.labels(self.name, 'hit').inc()
+            return entry[1]
+
+    def set(self, key: str, value: Any, generation: Optional[int] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {'enabled': self.enabled, 'size': len(self._entries), 'maxsize': self.maxsize,
+                    'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+def notify_log_entries_changed(connection, reason: str = '', rewritten: bool = False):
+    """
+    Queue a cache invalidation for every worker (session or connection)
+
+    NOTIFY is delivered when the surrounding transaction commits, so listeners
+    never drop their caches before the new rows are visible. rewritten=True
+    marks deletes/recounts, which the id sequence watermark does not reveal.
+    """
+    connection.execute(text("SELECT pg_notify(:channel, :reason)"),
+                       {'channel': NOTIFY_CHANNEL, 'reason': reason})
+    if rewritten:
+        connection.execute(text("""
+            INSERT INTO app_config (config_key, config_value, updated_at)
+            VALUES (:key, now()::text, now())
+            ON CONFLICT (config_key) DO UPDATE
+            SET config_value = excluded.config_value, updated_at = excluded.updated_at
+        """), {'key': DATA_REWRITTEN_KEY})
+
+
+class CacheInvalidationListener:
+    """
+    Per-process LISTEN thread that clears the caches on every notification
+
+    Caches listed in guarded are enabled only while the LISTEN connection is
+    up, so a missed notification can never leave a stale page cached.
+    """
+
+    def __init__(self, caches: List[SearchCache], guarded: List[SearchCache], channel: str = NOTIFY_CHANNEL):
+        self.caches = caches
+        self.guarded = guarded
+        self.channel = channel
+        self.listening = False
+        self.invalidations = 0
+        self._engine = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self, engine):
+        """Start the listener once per process (workers forked after preload start their own)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._engine = engine
+            self._set_listening(False)
+            threading.Thread(target=self._run, name='cache-invalidation', daemon=True).start()
+
+    def _set_listening(self, listening: bool):
+        self.listening = listening
+        self.invalidate()
+        for cache in self.guarded:
+            cache.enabled = listening
+
+    def invalidate(self):
+        for cache in self.caches:
+            cache.clear()
+
+    def _connect(self):
+        """Dedicated DBAPI connection outside the pool (held for the process lifetime)"""
+        dialect = self._engine.dialect
+        cargs, cparams = dialect.create_connect_args(self._engine.url)
+        connection = dialect.dbapi.connect(*cargs, **cparams)
+        connection.autocommit = True
+        connection.cursor().execute(f"LISTEN {self.channel}")
+        return connection
+
+    def _run(self):
+        while True:
+            connection = None
+            try:
+                connection = self._connect()
+                self._set_listening(True)
+                logger.info(f"CACHE: Listening on {self.channel} (pid {os.getpid()})")
+                while True:
+                    if select.select([connection], [], [], LISTEN_POLL_INTERVAL)[0]:
+                        connection.poll()
+                    else:
+                        # Idle: round trip to detect a dead connection
+                        connection.cursor().execute("SELECT 1")
+                    if connection.notifies:
+                        reasons = {n.payload for n in connection.notifies}
+                        connection.notifies.clear()
+                        self.invalidations += 1
+                        self.invalidate()
+                        logger.debug(f"CACHE: Invalidated ({', '.join(sorted(r for r in reasons if r))})")
+            except Exception as e:
+                self._set_listening(False)
+                logger.warning(f"CACHE: Invalidation listener down, caching disabled: {e}")
+                time.sleep(LISTEN_RETRY_DELAY)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def info(self) -> Dict:
+        return {'listening': self.listening, 'invalidations': self.invalidations}
+
+
+# Totals and facets of recent searches: paging through results reuses them
+count_cache = SearchCache(maxsize=Config.SEARCH_COUNT_CACHE_SIZE, ttl=Config.SEARCH_COUNT_CACHE_TTL,
+                          name='counts')
+
+# Search pages and stats responses; only served while invalidation is listening
+result_cache = SearchCache(maxsize=Config.SEARCH_RESULT_CACHE_SIZE, ttl=Config.SEARCH_RESULT_CACHE_TTL,
+                           enabled=False, name='results')
+
+cache_listener = CacheInvalidationListener(caches=[result_cache, count_cache], guarded=[result_cache])
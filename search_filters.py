@@ -0,0 +1,170 @@
+"""
+Search Filters for Switch Log Analyzer
+Shared parsing of search parameters and query filtering for search and export endpoints
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import or_, func
+
+from models import LogEntry, AppConfig
+from wwn_utils import db_to_wwn, format_wwn, wwn_search_range
+
+# Text search configuration used for raw_tsv: no stemming or stop words, so
+# PIDs, hex values and event keywords are indexed exactly as they appear
+FULLTEXT_CONFIG = 'simple'
+
+# Colon-separated hex groups (WWNs, times) are split into several tokens by the
+# parser; quoting them turns the search into a phrase so the groups stay adjacent
+_COLON_GROUPS = re.compile(r'\b[0-9A-Za-z]{2}(?::[0-9A-Za-z]{2})+\b')
+
+# app_config progress of db_migrations.backfill_wwn_int() ('done' once every row has wwn_int)
+WWN_INT_BACKFILL_KEY = 'migration_wwn_int_backfill'
+# Set once the backfill is seen done: it never goes back to leaving rows without wwn_int
+_wwn_int_backfilled = False
+
+
+def get_search_filters(args) -> Dict:
+    """
+    Read search filters from request arguments
+
+    Uses the same parameter names as /api/db/search so every endpoint that
+    filters log entries accepts identical query strings.
+    """
+    return {
+        'wwn': args.get('wwn', '').strip(),
+        'alias': args.get('alias', '').strip(),
+        'node_symbol': args.get('node_symbol', '').strip(),
+        'switches': [s.strip() for s in args.get('switches', '').split(',') if s.strip()],
+        'event': args.get('event', '').strip(),
+        'context': args.get('context', '').strip(),
+        'date_from': args.get('date_from', '').strip(),
+        'date_to': args.get('date_to', '').strip(),
+        'q': args.get('q', '').strip(),
+    }
+
+
+def contains_pattern(term: str) -> str:
+    """
+    Build an ILIKE '%term%' pattern with LIKE wildcards in the term escaped
+
+    Substring patterns on wwn, alias, node_symbol and event_type are served by
+    the pg_trgm GIN indexes (see db_migrations.py) once the term is at least
+    3 characters long; user-typed '%' and '_' are matched literally.
+    """
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def wwn_int_backfilled() -> bool:
+    """True once rows stored before wwn_int existed have been backfilled"""
+    global _wwn_int_backfilled
+    if not _wwn_int_backfilled:
+        _wwn_int_backfilled = AppConfig.get_value(WWN_INT_BACKFILL_KEY) == 'done'
+    return _wwn_int_backfilled
+
+
+def wwn_filter(term: str, model=LogEntry):
+    """
+    Build the WWN predicate for a search term
+
+    A full WWN becomes an equality probe on wwn_int, OR-ed with the canonical
+    text and substring matches until backfill_wwn_int() is done; a leading hex
+    fragment becomes a wwn_int range, OR-ed with the substring match so
+    fragments from the middle of a WWN still find rows. Anything else is a
+    substring match.
+    """
+    substring = model.wwn.ilike(contains_pattern(term), escape='\\')
+    wwn_range = wwn_search_range(term)
+    if not wwn_range:
+        return substring
+
+    low, high = wwn_range
+    if low == high:
+        if wwn_int_backfilled():
+            return model.wwn_int == low
+        return or_(model.wwn_int == low, model.wwn == format_wwn(db_to_wwn(low)), substring)
+    return or_(model.wwn_int.between(low, high), substring)
+
+
+def fulltext_query(q: str):
+    """
+    Build the tsquery for a free-text search over raw_line
+
+    Accepts web search syntax: words are AND-ed, "quoted text" is a phrase,
+    'or' between words and '-word' for exclusion.
+    """
+    # Only quote outside of phrases the user already quoted
+    parts = q.split('"')
+    for i in range(0, len(parts), 2):
+        parts[i] = _COLON_GROUPS.sub(lambda m: f'"{m.group(0)}"', parts[i])
+    return func.websearch_to_tsquery(FULLTEXT_CONFIG, '"'.join(parts))
+
+
+def apply_search_filters(query, filters: Dict, model=LogEntry):
+    """Apply search filters to a LogEntry query (ORM query or column query)"""
+    if filters.get('wwn'):
+        query = query.filter(wwn_filter(filters['wwn'], model))
+
+    if filters.get('alias'):
+        query = query.filter(model.alias.ilike(contains_pattern(filters['alias']), escape='\\'))
+
+    if filters.get('node_symbol'):
+        query = query.filter(model.node_symbol.ilike(contains_pattern(filters['node_symbol']), escape='\\'))
+
+    if filters.get('switches'):
+        query = query.filter(model.switch_name.in_(filters['switches']))
+
+    if filters.get('event'):
+        query = query.filter(model.event_type.ilike(contains_pattern(filters['event']), escape='\\'))
+
+    if filters.get('context'):
+        query = query.filter(model.context == int(filters['context']))
+
+    if filters.get('q'):
+        query = query.filter(model.raw_tsv.op('@@')(fulltext_query(filters['q'])))
+
+    # Date filtering
+    date_from_obj = parse_date_from(filters.get('date_from'))
+    if date_from_obj:
+        query = query.filter(model.timestamp >= date_from_obj)
+
+    date_to_obj = parse_date_to(filters.get('date_to'))
+    if date_to_obj:
+        query = query.filter(model.timestamp <= date_to_obj)
+
+    return query
+
+
+def apply_search_sort(query, sort_column: str, sort_direction: str, model=LogEntry, q: str = ''):
+    """Apply sorting to a LogEntry query, defaulting to timestamp
+
+    sort_column='relevance' ranks full-text matches of q (newest first on ties).
+    """
+    if sort_column == 'relevance':
+        if q:
+            rank = func.ts_rank_cd(model.raw_tsv, fulltext_query(q))
+            return query.order_by(rank.desc(), model.timestamp.desc())
+        sort_column = 'timestamp'
+
+    sort_attr = getattr(model, sort_column or 'timestamp', model.timestamp)
+    if sort_direction and sort_direction.lower() == 'desc':
+        return query.order_by(sort_attr.desc())
+    return query.order_by(sort_attr.asc())
+
+
+def parse_date_from(value: Optional[str]) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD lower date bound"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def parse_date_to(value: Optional[str]) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD upper date bound, inclusive of the entire day"""
+    if not value:
+        return None
+    date_to_obj = datetime.strptime(value, '%Y-%m-%d')
+    return date_to_obj.replace(hour=23, minute=59, second=59)
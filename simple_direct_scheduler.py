@@ -8,6 +8,7 @@ from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from scheduler_config import SchedulerConfig
+from metrics import instrument_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,7 @@ class DirectScheduler:
             # Create scheduler with configuration
             config = SchedulerConfig.get_scheduler_config()
             self.scheduler = BackgroundScheduler(**config)
+            instrument_scheduler(self.scheduler)
             self.scheduler.start()
             self._initialized = True
             logger.info("DirectScheduler initialized and started")
@@ -7,10 +7,19 @@ Worker 2: SSH Collections
 import os
 import logging
 
+# Prometheus multiprocess mode: each worker writes its samples here and /metrics merges them.
+# Set before the app (and prometheus_client) is imported; stale files from the last run are removed.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/switch-analyzer-metrics')
+from metrics import clear_multiproc_dir, mark_worker_dead
+clear_multiproc_dir()
+
 # Basic configuration
 bind = "0.0.0.0:5000"
 workers = 1
-worker_class = "sync"
+# Sync worker by default. GUNICORN_THREADS > 1 opts into the gthread worker, which
+# serves live progress streams (SSE) next to other requests; the UI polls otherwise
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+worker_class = "gthread" if threads > 1 else "sync"
 worker_connections = 1000
 timeout = 120
 keepalive = 5
@@ -34,6 +43,16 @@ def on_starting(server):
 
 def when_ready(server):
     """Called just after the server is started"""
+    # Apply idempotent schema upgrades once in the master, before workers are forked
+    try:
+        from main import app
+        from models import db
+        from db_migrations import apply_schema_upgrades
+        with app.app_context():
+            apply_schema_upgrades()
+            db.engine.dispose()  # Never share pooled connections with forked workers
+    except Exception as e:
+        logging.error(f"Schema upgrades failed at startup: {e}")
     logging.info("Switch Log Analyzer ready - Worker 1: Scheduler, Worker 2: Collections")
 
 def worker_int(worker):
@@ -58,6 +77,11 @@ def post_fork(server, worker):
     else:
         logging.info(f"Worker {worker_id} (PID {worker.pid}): Collection worker started")
 
+def child_exit(server, worker):
+    """Called just after a worker has been exited, in the master process"""
+    # Drop the dead worker's live gauges from /metrics
+    mark_worker_dead(worker.pid)
+
 def worker_abort(worker):
     """Called when a worker receives the SIGABRT signal"""
     logging.error(f"Worker {worker.pid} aborted")
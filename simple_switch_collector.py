@@ -8,11 +8,12 @@ import paramiko
 import time
 import logging
 import re
-import json
 import os
 import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+
+from capture_archive import capture_archive
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +21,12 @@ logger = logging.getLogger(__name__)
 class SimpleLogCollector:
     """Simple collector that works exactly like the successful debug test"""
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str, progress=None, port: int = 22):
         self.username = username
         self.password = password
+        self.port = port
+        self.progress = progress  # Optional CollectionProgress fed while collecting
+        self.timings = self._empty_timings()
         self.contexts = [1, 2, 3, 4, 5, 128]
 
         # Flexible regex pattern to capture ALL log entries with timestamps
@@ -35,8 +39,14 @@ class SimpleLogCollector:
             r'(.+)$'              # event description
         )
 
+    @staticmethod
+    def _empty_timings() -> Dict:
+        """Stage timings of the last collect_from_switch_simple() call (seconds)"""
+        return {'connect_seconds': 0.0, 'parse_seconds': 0.0, 'contexts': {}}
+
     def connect_to_switch(self, switch_address: str) -> paramiko.SSHClient:
         """Connect to switch"""
+        connect_start = time.perf_counter()
         ssh_client = paramiko.SSHClient()
         ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -44,11 +54,13 @@ class SimpleLogCollector:
         connection_id = str(uuid.uuid4())[:8]
         logger.info(f"🔌 CONNECTION-{connection_id}: Connecting to {switch_address} (PID: {os.getpid()})")
         ssh_client.connect(hostname=switch_address,
+                           port=self.port,
                            username=self.username,
                            password=self.password,
                            timeout=30,
                            look_for_keys=False,
                            allow_agent=False)
+        self.timings['connect_seconds'] = time.perf_counter() - connect_start
         return ssh_client
 
     def collect_from_context_simple(self, ssh_client: paramiko.SSHClient,
@@ -57,6 +69,8 @@ class SimpleLogCollector:
         Collect logs using the EXACT approach that worked in debug test
         This collected 2312 chars with real logs vs 1164 chars of just table
         """
+        wait_start = time.perf_counter()
+        received = 0
         try:
             logger.info(
                 f"🎯 SIMPLE: Collecting from {switch_name} context {context}")
@@ -90,7 +104,11 @@ class SimpleLogCollector:
 
             while not command_complete:
                 if shell.recv_ready():
-                    chunk = shell.recv(8192).decode('utf-8', errors='ignore')
+                    data = shell.recv(8192)
+                    received += len(data)
+                    if self.progress:
+                        self.progress.add_bytes(switch_name, context, len(data))
+                    chunk = data.decode('utf-8', errors='ignore')
                     output += chunk
                     last_activity = time.time()
                     elapsed = time.time() - start_time
@@ -122,8 +140,11 @@ class SimpleLogCollector:
                         # Collect any remaining data
                         time.sleep(0.5)
                         while shell.recv_ready():
-                            final_chunk = shell.recv(8192).decode(
-                                'utf-8', errors='ignore')
+                            data = shell.recv(8192)
+                            received += len(data)
+                            if self.progress:
+                                self.progress.add_bytes(switch_name, context, len(data))
+                            final_chunk = data.decode('utf-8', errors='ignore')
                             output += final_chunk
                         break
 
@@ -150,8 +171,16 @@ class SimpleLogCollector:
 
         except Exception as e:
             logger.error(f"❌ SIMPLE: Collection failed: {str(e)}")
+            if self.progress:
+                self.progress.add_error(switch_name, str(e), context)
             return ""
 
+        finally:
+            self.timings['contexts'][str(context)] = {
+                'wait_seconds': round(time.perf_counter() - wait_start, 3),
+                'bytes': received,
+            }
+
 
 
 
@@ -227,14 +256,15 @@ class SimpleLogCollector:
         
         return entries
 
-    def fix_timestamps_with_years(self, entries: List[Dict]) -> List[Dict]:
+    def fix_timestamps_with_years(self, entries: List[Dict], current_year: Optional[int] = None) -> List[Dict]:
         """
         Intelligent year deduction: recent entries = current year, detect year boundaries going backward
+        (current_year is the year the output was read, for replayed captures)
         """
         if not entries:
             return entries
 
-        current_year = datetime.now().year
+        current_year = current_year or datetime.now().year
         
         # Month name to number mapping
         month_names = {
@@ -314,12 +344,41 @@ class SimpleLogCollector:
 
         return entries
 
-    def collect_from_switch_simple(self, switch_info) -> List[Dict]:
+    def process_context_output(self, raw_output: str, site: str, switch_address: str, context: int,
+                               generation: str, captured_at: Optional[datetime] = None) -> List[Dict]:
         """
-        Collect from all contexts of a switch using simple approach
-        Returns all parsed log entries
+        Parse one context's raw output: entries with site and deduced years
+        (relative to captured_at when replaying an archived capture)
         """
-        all_entries = []
+        context_entries = self.parse_log_output_with_verification(raw_output, switch_address, context)
+        logger.info(f"🔍 DEBUG: After parsing - {len(context_entries)} entries")
+
+        # Add site info to entries
+        for entry in context_entries:
+            entry['site'] = site
+
+        # Fix timestamps with intelligent year assignment
+        if context_entries:
+            original_count = len(context_entries)
+            context_entries = self.fix_timestamps_with_years(context_entries,
+                                                             captured_at.year if captured_at else None)
+            new_count = len(context_entries)
+            if original_count != new_count:
+                logger.warning(f"⚠️ DEBUG: Year assignment changed entry count from {original_count} to {new_count}")
+
+        logger.info(
+            f"✅ SIMPLE: Context {context}: {len(context_entries)} entries from {len(raw_output)} chars"
+        )
+        return context_entries
+
+    def collect_contexts(self, switch_info, handle_output: Callable[[str, str, str, int, str], None]):
+        """
+        Read every context of a switch over one SSH connection, passing
+        (site, switch_address, generation, context, raw_output) to handle_output
+        as each one completes; every output is also appended to the capture archive
+        """
+        self.timings = self._empty_timings()
+        session = uuid.uuid4().hex  # Groups this run's contexts in the capture archive
 
         try:
             # Parse string format "SITE:SWITCH:GEN"
@@ -338,6 +397,8 @@ class SimpleLogCollector:
             # Collect from each context
             for context in self.contexts:
                 logger.info(f"📂 SIMPLE: Context {context}...")
+                if self.progress:
+                    self.progress.context_started(switch_address, context)
 
                 # Reset flags for each context
                 if hasattr(self, '_found_summary'):
@@ -347,84 +408,49 @@ class SimpleLogCollector:
 
                 raw_output = self.collect_from_context_simple(
                     ssh_client, switch_address, context)
-
-                # Parse entries and verify count
-                context_entries = self.parse_log_output_with_verification(raw_output, switch_address, context)
-                logger.info(f"🔍 DEBUG: After parsing - {len(context_entries)} entries")
-                
-                # Add site info to entries
-                for entry in context_entries:
-                    entry['site'] = site
-                
-                # Fix timestamps with intelligent year assignment
-                if context_entries:
-                    original_count = len(context_entries)
-                    context_entries = self.fix_timestamps_with_years(context_entries)
-                    new_count = len(context_entries)
-                    if original_count != new_count:
-                        logger.warning(f"⚠️ DEBUG: Year assignment changed entry count from {original_count} to {new_count}")
-                
-                logger.info(f"🔍 DEBUG: Before extend - all_entries has {len(all_entries)}, adding {len(context_entries)}")
-                all_entries.extend(context_entries)
-                logger.info(f"🔍 DEBUG: After extend - all_entries has {len(all_entries)}")
-
-                # Save temporary files for this context
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                context_filename = f"logs/context_{site}_{switch_address}_ctx{context}_{timestamp}.json"
-
-                try:
-                    os.makedirs('logs', exist_ok=True)
-
-                    # Save log entries
-                    with open(context_filename, 'w') as f:
-                        json.dump(
-                            {
-                                'metadata': {
-                                    'switch': switch_address,
-                                    'site': site,
-                                    'context': context,
-                                    'generation': generation,
-                                    'timestamp': timestamp,
-                                    'total_entries': len(context_entries),
-                                    'raw_output_length': len(raw_output)
-                                },
-                                'entries': context_entries
-                            },
-                            f,
-                            indent=2)
-
-                    logger.info(
-                        f"💾 SIMPLE: Saved context file: {context_filename}")
-
-                except Exception as save_error:
-                    logger.error(
-                        f"❌ Failed to save context file: {save_error}")
-
-                logger.info(
-                    f"✅ SIMPLE: Context {context}: {len(context_entries)} entries from {len(raw_output)} chars"
-                )
+                capture_archive.append(session, site, switch_address, generation, context, raw_output)
+                handle_output(site, switch_address, generation, context, raw_output)
 
                 # Small delay between contexts
                 time.sleep(1)
 
             ssh_client.close()
-            logger.info(
-                f"🎉 SIMPLE: Total collected from {switch_address}: {len(all_entries)} entries"
-            )
-
-            # Sort all entries by timestamp in descending order (newest first)
-            if all_entries:
-                all_entries.sort(
-                    key=lambda entry: self._parse_timestamp_for_sort(
-                        entry.get('timestamp', '')),
-                    reverse=True)
-                logger.info(
-                    f"📊 SIMPLE: Sorted {len(all_entries)} entries by timestamp (newest first)"
-                )
 
         except Exception as e:
             logger.error(
                 f"❌ SIMPLE: Failed to collect from {switch_info}: {str(e)}")
+            if self.progress:
+                self.progress.add_error(switch_info.split(':')[1] if ':' in switch_info else switch_info, str(e))
+
+    def collect_from_switch_simple(self, switch_info) -> List[Dict]:
+        """
+        Collect from all contexts of a switch using simple approach
+        Returns all parsed log entries
+        """
+        all_entries = []
+
+        def handle_output(site, switch_address, generation, context, raw_output):
+            # Parse entries and verify count
+            parse_start = time.perf_counter()
+            context_entries = self.process_context_output(raw_output, site, switch_address, context, generation)
+            if self.progress:
+                self.progress.context_parsed(switch_address, context, len(context_entries))
+            self.timings['parse_seconds'] += time.perf_counter() - parse_start
+            self.timings['contexts'][str(context)]['entries'] = len(context_entries)
+            all_entries.extend(context_entries)
+
+        self.collect_contexts(switch_info, handle_output)
+        logger.info(f"🎉 SIMPLE: Total collected from {switch_info}: {len(all_entries)} entries")
+
+        # Sort all entries by timestamp in descending order (newest first)
+        if all_entries:
+            all_entries.sort(
+                key=lambda entry: self._parse_timestamp_for_sort(
+                    entry.get('timestamp', '')),
+                reverse=True)
+            logger.info(
+                f"📊 SIMPLE: Sorted {len(all_entries)} entries by timestamp (newest first)"
+            )
 
         return all_entries
 
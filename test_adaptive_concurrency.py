@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test del controllo adattivo del parallelismo delle raccolte
+Crescita con il throughput, back-off sulla latenza e limite per sito
+"""
+
+import pytest
+
+import adaptive_concurrency
+from adaptive_concurrency import AdaptiveConcurrency, switch_site
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(adaptive_concurrency.time, 'monotonic', fake)
+    return fake
+
+
+def run_epoch(controller, clock, bytes_per_switch, seconds=10.0, connect_seconds=0.2):
+    """Avvia tanti switch quanti il limite corrente e li completa dopo seconds"""
+    switches = [f"S{i % 3}:sw{i}:gen7" for i in range(controller.limit)]
+    for switch_info in switches:
+        assert controller.has_slot()
+        controller.started(switch_info)
+    assert not controller.has_slot()
+    clock.now += seconds
+    for switch_info in switches:
+        controller.finished(switch_info, {'connect_seconds': connect_seconds, 'bytes_received': bytes_per_switch})
+
+
+def test_limit_grows_while_throughput_improves(clock):
+    controller = AdaptiveConcurrency(min_workers=2, max_workers=5, max_per_site=10)
+    assert controller.limit == 2
+    run_epoch(controller, clock, 1000)
+    assert controller.limit == 3
+    run_epoch(controller, clock, 1000)  # 3 switch nello stesso tempo: throughput più alto
+    assert controller.limit == 4
+
+
+def test_limit_holds_when_throughput_stalls(clock):
+    controller = AdaptiveConcurrency(min_workers=2, max_workers=5, max_per_site=10)
+    run_epoch(controller, clock, 1500)
+    assert controller.limit == 3
+    run_epoch(controller, clock, 1000)  # Stessi byte totali con un worker in più
+    assert controller.limit == 3
+
+
+def test_limit_never_exceeds_max_workers(clock):
+    controller = AdaptiveConcurrency(min_workers=1, max_workers=3, max_per_site=10)
+    for _ in range(5):
+        run_epoch(controller, clock, 1000 * 10 ** controller.limit)
+    assert controller.limit == 3
+    assert controller.history == [1, 2, 3]
+
+
+def test_backs_off_when_connect_latency_rises(clock):
+    controller = AdaptiveConcurrency(min_workers=1, max_workers=10, max_per_site=10, initial_workers=8)
+    controller.started('S1:sw1:gen7')
+    controller.finished('S1:sw1:gen7', {'connect_seconds': 0.4})
+    assert controller.limit == 8
+    controller.started('S1:sw2:gen7')
+    controller.finished('S1:sw2:gen7', {'connect_seconds': 3.0})
+    assert controller.limit == 4
+    # La media congestionata è azzerata: un campione normale non dimezza di nuovo
+    controller.started('S1:sw3:gen7')
+    controller.finished('S1:sw3:gen7', {'connect_seconds': 0.5})
+    assert controller.limit == 4
+
+
+def test_backoff_respects_min_workers(clock):
+    controller = AdaptiveConcurrency(min_workers=3, max_workers=10, max_per_site=10, initial_workers=4)
+    controller.started('S1:sw1:gen7')
+    controller.finished('S1:sw1:gen7', None, pool_wait_seconds=0.01)
+    controller.started('S1:sw2:gen7')
+    controller.finished('S1:sw2:gen7', None, pool_wait_seconds=1.0)
+    assert controller.limit == 3
+
+
+def test_small_latencies_are_not_congestion(clock):
+    """Sotto la soglia minima un aumento relativo è rumore"""
+    controller = AdaptiveConcurrency(min_workers=1, max_workers=10, max_per_site=10, initial_workers=8)
+    for connect_seconds in (0.01, 0.2, 0.4):
+        controller.started('S1:sw1:gen7')
+        controller.finished('S1:sw1:gen7', {'connect_seconds': connect_seconds})
+    assert controller.limit == 8
+
+
+def test_per_site_cap():
+    controller = AdaptiveConcurrency(min_workers=4, max_workers=4, max_per_site=2)
+    controller.started('S1:sw1:gen7')
+    controller.started('S1:sw2:gen7')
+    controller.started('S2:sw3:gen7')
+    assert controller.full_sites() == ['S1']
+    assert controller.has_slot()
+    controller.finished('S1:sw1:gen7', None)
+    assert controller.full_sites() == []
+
+
+def test_switch_site():
+    assert switch_site('S1:sw1:gen7') == 'S1'
+    assert switch_site('sw1') == ''
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test dell'archivio delle catture e del replay
+Scrittura e lettura dei segmenti, record troncati, budget di dimensione/età e raggruppamento per sessione nel replay
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import final_working_collector
+from capture_archive import CaptureArchive, segment_hour
+from parse_pool import ParsedOutput
+from simple_switch_collector import SimpleLogCollector
+
+CONTEXTS = SimpleLogCollector('', '').contexts
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return CaptureArchive(str(tmp_path / 'captures'))
+
+
+def test_append_and_read_back(archive):
+    path = archive.append('s1', 'site0', '10.0.0.1', 'gen7', 128, 'output 128\n')
+    archive.append('s1', 'site0', '10.0.0.1', 'gen7', 1, 'output 1\n')
+    archive.append('s2', 'site0', '10.0.0.2', 'gen6', 1, 'other switch\n')
+    assert archive.segments() == [path]
+    assert segment_hour(path) == datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    records = list(archive.records())
+    assert [(r['session'], r['switch'], r['context'], r['raw_output']) for r in records] == [
+        ('s1', '10.0.0.1', 128, 'output 128\n'),
+        ('s1', '10.0.0.1', 1, 'output 1\n'),
+        ('s2', '10.0.0.2', 1, 'other switch\n'),
+    ]
+    assert isinstance(records[0]['captured_at'], datetime)
+    assert [r['context'] for r in archive.records(switches=['10.0.0.2'])] == [1]
+    assert list(archive.records(since=datetime.now() + timedelta(minutes=1))) == []
+
+    # Ogni record è un membro gzip: il segmento resta leggibile con zcat
+    with gzip.open(path, 'rt') as f:
+        assert len(f.read().splitlines()) == 3
+    assert archive.stats()['segments'] == 1
+
+
+def test_disabled_archive_writes_nothing(tmp_path):
+    archive = CaptureArchive(str(tmp_path / 'captures'), enabled=False)
+    assert archive.append('s1', 'site0', '10.0.0.1', 'gen7', 1, 'output') is None
+    assert not os.path.exists(archive.directory)
+
+
+def test_truncated_last_record_ends_the_segment(archive):
+    """Un record troncato da un crash termina il segmento senza perdere i precedenti"""
+    path = archive.append('s1', 'site0', '10.0.0.1', 'gen7', 1, 'complete')
+    partial = gzip.compress(json.dumps({'session': 's1', 'raw_output': 'x' * 1000}).encode())
+    with open(path, 'ab') as f:
+        f.write(partial[:len(partial) // 2])
+    assert [r['raw_output'] for r in archive.read_segment(path)] == ['complete']
+
+
+def test_unreadable_json_line_is_skipped(archive):
+    path = archive.append('s1', 'site0', '10.0.0.1', 'gen7', 1, 'first')
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(b'not json\n'))
+    archive.append('s1', 'site0', '10.0.0.1', 'gen7', 2, 'second')
+    assert [r['raw_output'] for r in archive.read_segment(path)] == ['first', 'second']
+
+
+def write_segment(archive, hour, size):
+    os.makedirs(archive.directory, exist_ok=True)
+    path = archive.segment_path(hour)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return os.path.basename(path)
+
+
+def test_enforce_budgets_evicts_oldest_by_size(tmp_path):
+    archive = CaptureArchive(str(tmp_path / 'captures'), max_bytes=2500)
+    now = datetime(2026, 10, 18, 12)
+    names = [write_segment(archive, now - timedelta(hours=h), 1000) for h in (3, 2, 1, 0)]
+    assert archive.enforce_budgets(now) == names[:2]
+    assert sorted(archive.segments()) == [os.path.join(archive.directory, name) for name in names[2:]]
+    assert not os.path.exists(os.path.join(archive.directory, names[0]))
+    assert archive.stats()['bytes'] == 2000
+
+
+def test_enforce_budgets_evicts_by_age(tmp_path):
+    archive = CaptureArchive(str(tmp_path / 'captures'), max_age_days=1)
+    now = datetime(2026, 10, 18, 12)
+    old = write_segment(archive, now - timedelta(days=2), 10)
+    recent = write_segment(archive, now - timedelta(hours=2), 10)
+    newest = write_segment(archive, now, 10)
+    assert archive.enforce_budgets(now) == [old]
+    assert archive.segments() == [os.path.join(archive.directory, name) for name in (recent, newest)]
+
+
+def test_enforce_budgets_keeps_newest_segment_over_budget(tmp_path):
+    """Il segmento corrente può ancora essere scritto: resta anche se da solo supera il budget"""
+    archive = CaptureArchive(str(tmp_path / 'captures'), max_bytes=100)
+    now = datetime(2026, 10, 18, 12)
+    older = write_segment(archive, now - timedelta(hours=1), 10)
+    newest = write_segment(archive, now, 500)
+    assert archive.enforce_budgets(now) == [older]
+    assert archive.segments() == [os.path.join(archive.directory, newest)]
+
+
+def test_enforce_budgets_without_budgets_is_noop(archive):
+    write_segment(archive, datetime(2020, 1, 1), 10)
+    assert archive.enforce_budgets() == []
+    assert len(archive.segments()) == 1
+
+
+class RecordingSession:
+    def add(self, instance):
+        pass
+
+    def commit(self):
+        pass
+
+
+class RecordingDb:
+    session = RecordingSession()
+
+
+@pytest.fixture
+def replay_stores(monkeypatch):
+    """Replay senza database: ogni sessione ricostruita è registrata invece che inserita"""
+    stored = []
+
+    def parse_context_output(raw_output, site, switch_name, context, generation, since, captured_at):
+        return ParsedOutput([], 1, 0.0, 0.0, [])
+
+    def store_switch_rows(switch_name, collection_id, parsed, timings, progress, started_at, switch_start):
+        stored.append((switch_name, sorted(int(c) for c in timings['contexts']), parsed.entries))
+        return {'switch_name': switch_name, 'success': True, 'inserted_count': 0,
+                'total_entries': parsed.entries, 'error': None}
+
+    monkeypatch.setattr(final_working_collector, 'db', RecordingDb())
+    monkeypatch.setattr(final_working_collector, 'last_entry_timestamp', lambda switch_name: None)
+    monkeypatch.setattr(final_working_collector, 'parse_context_output', parse_context_output)
+    monkeypatch.setattr(final_working_collector, 'store_switch_rows', store_switch_rows)
+    monkeypatch.setattr(final_working_collector, 'notify_log_entries_changed', lambda *args: None)
+    monkeypatch.setattr(final_working_collector.parse_pool, 'processes', 0)
+    return stored
+
+
+def capture(session, switch, context):
+    return {'session': session, 'switch': switch, 'context': context, 'site': 'site0', 'generation': 'gen7',
+            'raw_output': f'{switch} {context}', 'captured_at': datetime(2026, 10, 18, 12)}
+
+
+def test_replay_regroups_interleaved_sessions(replay_stores):
+    """Contesti di switch diversi interleaved tornano sessioni complete, ognuna salvata appena completa"""
+    records = []
+    for context in CONTEXTS:
+        records += [capture('a', '10.0.0.1', context), capture('b', '10.0.0.2', context)]
+    result = final_working_collector.replay_captures(records)
+    assert result['success'] and result['sessions'] == 2
+    assert replay_stores == [('10.0.0.1', sorted(CONTEXTS), len(CONTEXTS)),
+                             ('10.0.0.2', sorted(CONTEXTS), len(CONTEXTS))]
+
+
+def test_replay_stores_cut_short_session_before_next_run(replay_stores):
+    """Una raccolta interrotta è salvata prima della sessione successiva dello stesso switch"""
+    records = [capture('a', '10.0.0.1', CONTEXTS[0]), capture('a', '10.0.0.1', CONTEXTS[1]),
+               capture('c', '10.0.0.3', CONTEXTS[0])]
+    records += [capture('b', '10.0.0.1', context) for context in CONTEXTS]
+    result = final_working_collector.replay_captures(records)
+    assert result['sessions'] == 3
+    assert replay_stores == [('10.0.0.1', sorted(CONTEXTS[:2]), 2),
+                             ('10.0.0.1', sorted(CONTEXTS), len(CONTEXTS)),
+                             ('10.0.0.3', [CONTEXTS[0]], 1)]
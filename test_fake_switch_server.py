@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test del server SSH che simula gli switch Brocade
+Output nsdevlog generato, guasti e protocollo prompt/fosexec su una connessione reale
+"""
+
+import asyncio
+import re
+
+import pytest
+
+from fake_switch_server import HEADER, MAX_ENTRIES, FakeSwitchServer, asyncssh, loopback_switches, parse_faults
+
+requires_asyncssh = pytest.mark.skipif(asyncssh is None, reason='asyncssh not installed')
+
+ENTRY_LINE = re.compile(r'^\w{3} \w{3} \d{2} \d{2}:\d{2}:\d{2}\.\d{3}  \S+\s+0x[0-9a-f]{6}  '
+                        r'([0-9a-f]{2}:){7}[0-9a-f]{2}  ([0-9a-f]{2}:){7}[0-9a-f]{2}  .+$')
+
+
+def test_render_is_deterministic_and_declares_total():
+    server = FakeSwitchServer(entries=30, context_entries={128: 5})
+    text, cut = server.render('fake_127_0_1_1', 1)
+    assert cut is None
+    assert text.startswith(HEADER)
+    lines = text[len(HEADER):].splitlines()
+    assert all(ENTRY_LINE.match(line) for line in lines[:30])
+    assert 'Total number of Entries displayed = 30' in text
+    assert server.render('fake_127_0_1_1', 1)[0] == text
+    assert 'Total number of Entries displayed = 5' in server.render('fake_127_0_1_1', 128)[0]
+    assert server.render('fake_127_0_1_2', 1)[0] != text
+
+
+def test_entry_count_is_capped_like_fos():
+    server = FakeSwitchServer(entries=MAX_ENTRIES + 100)
+    assert len(server.nsdevlog_lines('fake_127_0_1_1', 1)) == MAX_ENTRIES
+
+
+def test_faults_cut_or_alter_the_output():
+    server = FakeSwitchServer(entries=40, faults=parse_faults(['no-summary', 'truncate']))
+    text, cut = server.render('fake_127_0_1_1', 1)
+    assert cut is None
+    assert 'Total number of Entries' not in text
+    assert len(text[len(HEADER):].splitlines()) == 36
+    text, cut = FakeSwitchServer(entries=40, faults={'disconnect': 1.0}).render('fake_127_0_1_1', 1)
+    assert cut == 'disconnect'
+    with pytest.raises(Exception):
+        parse_faults(['meltdown'])
+
+
+def test_loopback_switches_spread_over_sites():
+    assert loopback_switches(3, sites=2) == ['site0:127.0.1.1:gen7', 'site1:127.0.1.2:gen7', 'site0:127.0.1.3:gen7']
+
+
+async def _session(port, commands, password='password'):
+    async with asyncssh.connect('127.0.0.1', port, username='admin', password=password,
+                                known_hosts=None) as conn:
+        process = await conn.create_process(term_type='vt100')
+        for command in commands:
+            process.stdin.write(command + '\n')
+        return await asyncio.wait_for(process.stdout.read(), 30)
+
+
+@pytest.fixture
+def server():
+    fake = FakeSwitchServer(port=0, entries=20, username='admin', password='password').start_in_thread()
+    yield fake
+    fake.stop_thread()
+
+
+@requires_asyncssh
+def test_ssh_prompt_and_fosexec(server):
+    output = asyncio.run(_session(server.port, [
+        'fosexec --fid 128 -cmd "nsdevlog --show"', 'fosexec --fid 9 -cmd "nsdevlog --show"', 'ls', 'exit']))
+    prompt = 'fake_127_0_0_1:FID128:admin> '
+    assert output.startswith(prompt)
+    assert server.render('fake_127_0_0_1', 128)[0].replace('\n', '\r\n') in output
+    assert 'Invalid FID 9' in output
+    assert 'rbash: ls: command not found' in output
+    assert output.count(prompt) == 4
+    assert server.stats['commands'] == 2
+
+
+@requires_asyncssh
+def test_ssh_rejects_wrong_password(server):
+    with pytest.raises(asyncssh.PermissionDenied):
+        asyncio.run(_session(server.port, ['exit'], password='wrong'))
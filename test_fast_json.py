@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test della proiezione dei campi e della serializzazione JSON delle ricerche
+parse_fields, shape_rows e dumps con e senza orjson
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+import fast_json
+from fast_json import ENTRY_FIELDS, dumps, parse_fields, shape_rows
+
+
+def test_parse_fields_defaults_to_all_fields():
+    assert parse_fields('') == list(ENTRY_FIELDS)
+    assert parse_fields(None) == list(ENTRY_FIELDS)
+
+
+def test_parse_fields_keeps_requested_order_without_duplicates():
+    assert parse_fields(' wwn,timestamp ,wwn,,switch_name') == ['wwn', 'timestamp', 'switch_name']
+
+
+def test_parse_fields_rejects_unknown_fields():
+    with pytest.raises(ValueError, match='password'):
+        parse_fields('timestamp,password')
+
+
+def test_shape_rows_objects_and_columns():
+    fields = ['timestamp', 'switch_name']
+    rows = [('2026-10-18T10:05:00', 'sw1'), ('2026-10-18T10:06:00', 'sw2')]
+    assert shape_rows(fields, rows) == {'entries': [
+        {'timestamp': '2026-10-18T10:05:00', 'switch_name': 'sw1'},
+        {'timestamp': '2026-10-18T10:06:00', 'switch_name': 'sw2'},
+    ]}
+    assert shape_rows(fields, rows, 'columns') == {
+        'columns': ['timestamp', 'switch_name'],
+        'rows': [['2026-10-18T10:05:00', 'sw1'], ['2026-10-18T10:06:00', 'sw2']],
+    }
+    assert shape_rows(fields, [], 'columns') == {'columns': fields, 'rows': []}
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_datetimes_like_to_dict(monkeypatch, use_orjson):
+    """Date in ISO 8601 come LogEntry.to_dict(), con orjson o con il fallback json"""
+    if use_orjson and fast_json.orjson is None:
+        pytest.skip('orjson not installed')
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, 'orjson', None)
+    moment = datetime(2026, 10, 18, 10, 5, 0, 885000)
+    payload = {'entries': [{'timestamp': moment, 'context': 128, 'alias': None}], 'total': 1}
+    assert json.loads(dumps(payload)) == {
+        'entries': [{'timestamp': moment.isoformat(), 'context': 128, 'alias': None}], 'total': 1}
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test dei periodi delle partizioni di log_entries
+Inizio periodo, periodo successivo e nomi delle partizioni per intervalli day/week/month, confine della retention
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import partitioning
+from partitioning import PartitionManager
+
+
+def test_period_start_day():
+    manager = PartitionManager('day')
+    assert manager.period_start(datetime(2026, 10, 18, 23, 59, 59, 999999)) == datetime(2026, 10, 18)
+    assert manager.next_period(datetime(2026, 12, 31)) == datetime(2027, 1, 1)
+
+
+def test_period_start_week_begins_on_monday():
+    manager = PartitionManager('week')
+    monday = datetime(2026, 10, 12)
+    for day in range(7):
+        assert manager.period_start(datetime(2026, 10, 12 + day, 12, 30)) == monday
+    assert manager.next_period(monday) == datetime(2026, 10, 19)
+    # Settimana a cavallo dell'anno
+    assert manager.period_start(datetime(2027, 1, 1)) == datetime(2026, 12, 28)
+
+
+def test_period_start_month():
+    manager = PartitionManager('MONTH')
+    assert manager.period_start(datetime(2026, 2, 28, 8)) == datetime(2026, 2, 1)
+    assert manager.next_period(datetime(2026, 1, 1)) == datetime(2026, 2, 1)
+    assert manager.next_period(datetime(2026, 12, 1)) == datetime(2027, 1, 1)
+
+
+def test_periods_are_contiguous():
+    """Ogni istante cade nel periodo [start, next_period(start))"""
+    for interval in ('day', 'week', 'month'):
+        manager = PartitionManager(interval)
+        moment = datetime(2026, 12, 31, 23, 59)
+        start = manager.period_start(moment)
+        assert start <= moment < manager.next_period(start)
+        assert manager.period_start(manager.next_period(start)) == manager.next_period(start)
+
+
+def test_partition_name():
+    assert PartitionManager.partition_name(datetime(2026, 10, 1)) == 'log_entries_p20261001'
+
+
+def test_unsupported_interval():
+    with pytest.raises(ValueError):
+        PartitionManager('year')
+
+
+def test_retention_boundary_is_the_period_of_the_cutoff():
+    now = datetime(2026, 10, 18, 12)
+    assert PartitionManager('month', retention_days=90).retention_boundary(now) == datetime(2026, 7, 1)
+    assert PartitionManager('day', retention_days=1).retention_boundary(now) == datetime(2026, 10, 17)
+    assert PartitionManager('month', retention_days=0).retention_boundary(now) is None
+
+
+class RecordingEngine:
+    """Engine finto: registra gli statement eseguiti con i loro parametri"""
+
+    def __init__(self):
+        self.statements = []
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+class RecordingDb:
+    def __init__(self):
+        self.engine = RecordingEngine()
+
+
+def test_retention_keeps_history_in_the_default_partition(monkeypatch):
+    """Installazione nuova: solo le partizioni correnti, lo storico nella default resta entro LOG_RETENTION_DAYS"""
+    manager = PartitionManager('month', retention_days=90)
+    current = manager.period_start(datetime.utcnow())
+    old = manager.period_start(current - timedelta(days=200))
+    partitions = [
+        {'name': 'log_entries_default', 'is_default': True, 'start': None, 'end': None},
+        {'name': manager.partition_name(old), 'is_default': False, 'start': old, 'end': manager.next_period(old)},
+        {'name': manager.partition_name(current), 'is_default': False,
+         'start': current, 'end': manager.next_period(current)},
+    ]
+    db = RecordingDb()
+    pruned = []
+    monkeypatch.setattr(partitioning, 'db', db)
+    monkeypatch.setattr(partitioning, 'prune_rollups', pruned.append)
+    monkeypatch.setattr(manager, 'list_partitions', lambda: partitions)
+
+    boundary = manager.retention_boundary()
+    assert manager.apply_retention() == [manager.partition_name(old)]
+    assert boundary < current
+    assert ('DELETE FROM log_entries_default WHERE timestamp < :boundary', {'boundary': boundary}) in db.engine.statements
+    assert pruned == [boundary]
+
+
+def test_oldest_default_row_stops_at_the_retention_horizon(monkeypatch):
+    manager = PartitionManager('month', retention_days=90)
+    monkeypatch.setattr(partitioning, '_exists', lambda name: True)
+    monkeypatch.setattr(partitioning, '_scalar', lambda sql, params=None: datetime(2000, 1, 1))
+    assert manager.oldest_default_row() == manager.retention_boundary()
+
+    recent = datetime.utcnow() - timedelta(days=3)
+    monkeypatch.setattr(partitioning, '_scalar', lambda sql, params=None: recent)
+    assert manager.oldest_default_row() == recent
+    assert PartitionManager('month', retention_days=0).oldest_default_row() == recent
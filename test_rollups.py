@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test dell'aggregazione RollupBatch per le tabelle di rollup
+Conteggi orari e giornalieri accumulati durante l'insert e ripiego su log_entries finché i rollup non sono costruiti
+(nessun database richiesto)
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+import rollups
+from models import LogRollupHourly
+from rollups import LogEntriesSource, RollupBatch, apply_rollup_filters, rollup_source, rollups_cover
+
+
+class RecordingSession:
+    """Sessione finta: raccoglie le righe degli upsert eseguiti da flush()"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def execute(self, statement):
+        params = statement.compile(dialect=postgresql.dialect()).params
+        rows = []
+        index = 0
+        while f'bucket_m{index}' in params:
+            rows.append(tuple(params[f'{column}_m{index}']
+                              for column in ('bucket', 'switch_name', 'context', 'event_type', 'count')))
+            index += 1
+        self.rows[statement.table.name] = rows
+
+
+def test_rollup_batch_counts_per_hour_and_day():
+    batch = RollupBatch()
+    batch.add(datetime(2026, 10, 18, 10, 5), 'sw1', 128, 'FLOGI')
+    batch.add(datetime(2026, 10, 18, 10, 55, 30), 'sw1', 128, 'FLOGI')
+    batch.add(datetime(2026, 10, 18, 11, 0), 'sw1', 128, 'FLOGI')
+    batch.add(datetime(2026, 10, 18, 11, 0), 'sw2', 128, None)
+    batch.add(datetime(2026, 10, 19, 0, 1), 'sw1', 128, 'FLOGI')
+
+    session = RecordingSession()
+    batch.flush(session)
+
+    assert session.rows['log_rollup_hourly'] == [
+        (datetime(2026, 10, 18, 10), 'sw1', 128, 'FLOGI', 2),
+        (datetime(2026, 10, 18, 11), 'sw1', 128, 'FLOGI', 1),
+        (datetime(2026, 10, 18, 11), 'sw2', 128, '', 1),
+        (datetime(2026, 10, 19, 0), 'sw1', 128, 'FLOGI', 1),
+    ]
+    assert session.rows['log_rollup_daily'] == [
+        (datetime(2026, 10, 18), 'sw1', 128, 'FLOGI', 3),
+        (datetime(2026, 10, 18), 'sw2', 128, '', 1),
+        (datetime(2026, 10, 19), 'sw1', 128, 'FLOGI', 1),
+    ]
+
+
+def test_rollup_batch_flush_clears_and_skips_empty():
+    """Dopo flush() il batch è vuoto e un flush vuoto non esegue nulla"""
+    batch = RollupBatch()
+    batch.add(datetime(2026, 10, 18, 10, 5), 'sw1', 1, 'FLOGI')
+    batch.flush(RecordingSession())
+    assert not batch.counts
+
+    session = RecordingSession()
+    batch.flush(session)
+    assert session.rows == {}
+
+
+@pytest.fixture
+def rollups_built(monkeypatch):
+    """Stato di rollups_built in app_config, senza database"""
+    state = {'value': None}
+    monkeypatch.setattr(rollups, '_rollups_built', False)
+    monkeypatch.setattr(rollups.AppConfig, 'get_value', staticmethod(lambda key, default=None: state['value']))
+    return state
+
+
+def test_statistics_read_log_entries_until_rollups_are_built(rollups_built):
+    source = rollup_source('hour')
+    assert isinstance(source, LogEntriesSource)
+    assert not rollups_cover({'switches': ['sw1']})
+
+    sql = str(select(source.event_type, func.sum(source.count)).select_from(source)
+              .compile(dialect=postgresql.dialect()))
+    assert 'FROM log_entries' in sql and 'coalesce(log_entries.event_type' in sql
+
+    rollups_built['value'] = 'done'
+    assert rollup_source('hour') is LogRollupHourly
+    assert rollups_cover({'switches': ['sw1']})
+    assert not rollups_cover({'wwn': '10:00'})
+
+
+def test_event_filter_matches_a_substring_like_search():
+    """Top e trend filtrano l'evento come /api/db/search: sottostringa senza maiuscole, wildcard letterali"""
+    query = apply_rollup_filters(select(LogRollupHourly.event_type), LogRollupHourly, event_type='flogi_%')
+    compiled = query.compile(dialect=postgresql.dialect())
+    assert 'log_rollup_hourly.event_type ILIKE %(event_type_1)s ESCAPE' in str(compiled)
+    assert compiled.params['event_type_1'] == '%flogi\\_\\%%'
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test della cache in-process delle ricerche e dei parametri delle facet
+TTL, ordine LRU, invalidazione per generation e chiavi normalizzate
+"""
+
+import pytest
+
+import search_cache
+from facets import parse_facets
+from search_cache import SearchCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(search_cache.time, 'monotonic', fake)
+    return fake
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SearchCache(maxsize=10, ttl=30)
+    cache.set('page', [1, 2, 3])
+    clock.now += 29
+    assert cache.get('page') == [1, 2, 3]
+    clock.now += 2
+    assert cache.get('page') is None
+    assert cache.info()['size'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = SearchCache(maxsize=2, ttl=30)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' diventa il meno recente
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_value_computed_before_clear_is_not_stored(clock):
+    """Un risultato calcolato prima di un'invalidazione non entra in cache"""
+    cache = SearchCache(maxsize=10, ttl=30)
+    cache.set('old', 1)
+    generation = cache.generation
+    cache.clear()
+    assert cache.get('old') is None
+    cache.set('stale', 2, generation)
+    assert cache.get('stale') is None
+    cache.set('fresh', 3, cache.generation)
+    assert cache.get('fresh') == 3
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = SearchCache(maxsize=10, ttl=30, enabled=False)
+    cache.set('page', 1)
+    assert cache.get('page') is None
+    assert cache.misses == 0
+
+
+def test_cache_key_ignores_key_and_list_order():
+    assert cache_key({'switches': ['sw2', 'sw1'], 'q': 'FLOGI'}, 1) == \
+        cache_key({'q': 'FLOGI', 'switches': ['sw1', 'sw2']}, 1)
+    assert cache_key({'q': 'FLOGI'}, 1) != cache_key({'q': 'FLOGI'}, 2)
+
+
+def test_parse_facets_fixed_order():
+    """Colonne in ordine fisso, spazi e duplicati ignorati"""
+    assert parse_facets('event_type, switch_name,event_type') == ['switch_name', 'event_type']
+    assert parse_facets('') == []
+    assert parse_facets(None) == []
+
+
+def test_parse_facets_rejects_unknown_columns():
+    with pytest.raises(ValueError, match='raw_line'):
+        parse_facets('switch_name,raw_line')
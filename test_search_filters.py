@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test dei filtri di ricerca condivisi da search ed export
+Verificano i pattern ILIKE per gli indici pg_trgm, le tsquery full-text e il filtro WWN (nessun database richiesto)
+"""
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import search_filters
+from search_filters import FULLTEXT_CONFIG, contains_pattern, fulltext_query, wwn_filter
+from wwn_utils import wwn_to_db
+
+
+def websearch_text(q):
+    """Testo passato a websearch_to_tsquery per la ricerca q"""
+    expression = fulltext_query(q)
+    assert expression.name == 'websearch_to_tsquery'
+    config, text = (clause.value for clause in expression.clauses.clauses)
+    assert config == FULLTEXT_CONFIG
+    return text
+
+
+def test_contains_pattern_wraps_term():
+    """Il termine diventa una ricerca per sottostringa"""
+    assert contains_pattern('FLOGI') == '%FLOGI%'
+
+
+def test_contains_pattern_escapes_wildcards():
+    """'%' e '_' digitati dall'utente sono cercati letteralmente"""
+    assert contains_pattern('100%') == '%100\\%%'
+    assert contains_pattern('HOST_A') == '%HOST\\_A%'
+
+
+def test_contains_pattern_escapes_backslash_first():
+    """Il backslash (carattere di escape) è raddoppiato prima degli altri escape"""
+    assert contains_pattern('a\\_b') == '%a\\\\\\_b%'
+
+
+def test_fulltext_query_quotes_colon_hex_groups():
+    """WWN e orari restano una frase, quindi gruppi adiacenti"""
+    assert websearch_text('port 10:00:00:10:9b:01:86:aa') == 'port "10:00:00:10:9b:01:86:aa"'
+    assert websearch_text('12:34:56 offline') == '"12:34:56" offline'
+
+
+def test_fulltext_query_keeps_user_phrases_and_operators():
+    """Le frasi già quotate dall'utente non sono quotate di nuovo; or e -parola restano invariati"""
+    assert websearch_text('"link down 12:34" or 0a:1b -offline') == '"link down 12:34" or "0a:1b" -offline'
+    assert websearch_text('FLOGI PLOGI') == 'FLOGI PLOGI'
+
+
+@pytest.fixture
+def wwn_backfill(monkeypatch):
+    """Stato del backfill di wwn_int in app_config, senza database"""
+    state = {'value': 12345}
+    monkeypatch.setattr(search_filters, '_wwn_int_backfilled', False)
+    monkeypatch.setattr(search_filters.AppConfig, 'get_value', staticmethod(lambda key, default=None: state['value']))
+    return state
+
+
+def compiled(predicate):
+    compiled = predicate.compile(dialect=postgresql.dialect())
+    return str(compiled), sorted(compiled.params.values(), key=str)
+
+
+def test_full_wwn_also_matches_text_until_backfill_is_done(wwn_backfill):
+    """Le righe salvate prima di wwn_int hanno solo il testo: vanno trovate anche durante il backfill"""
+    sql, params = compiled(wwn_filter('10:00:00:10:9B:01:86:AA'))
+    assert 'log_entries.wwn_int = ' in sql and 'log_entries.wwn = ' in sql and 'ILIKE' in sql
+    assert wwn_to_db(0x100000109b0186aa) in params
+    assert '10:00:00:10:9b:01:86:aa' in params
+
+    wwn_backfill['value'] = 'done'
+    sql, params = compiled(wwn_filter('10:00:00:10:9B:01:86:AA'))
+    assert sql == 'log_entries.wwn_int = %(wwn_int_1)s'
+    assert params == [wwn_to_db(0x100000109b0186aa)]
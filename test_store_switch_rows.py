@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test dell'insert delle righe di uno switch
+Righe inserite dalla più vecchia a batch che non dividono un timestamp, così un lease perso a metà non perde righe
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import final_working_collector
+from collection_progress import CollectionProgress
+from parse_pool import LogRow, ParsedOutput
+from work_queue import LeaseLost
+
+
+class TransactionSession:
+    """Sessione finta: le righe aggiunte diventano visibili solo al commit"""
+
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+
+    def add(self, obj):
+        self.pending.append(obj)
+
+    def execute(self, *args, **kwargs):
+        pass
+
+    def commit(self):
+        self.committed += self.pending
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+class TransactionDb:
+    def __init__(self):
+        self.session = TransactionSession()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    db = TransactionDb()
+    monkeypatch.setattr(final_working_collector, 'db', db)
+    monkeypatch.setattr(final_working_collector, 'notify_log_entries_changed', lambda *args: None)
+    monkeypatch.setattr(final_working_collector, 'worker_id', lambda: 'worker-a')
+    return db.session
+
+
+def make_rows(count):
+    """Righe newest-first come le restituisce il parse, dalla seconda a coppie con lo stesso timestamp"""
+    start = datetime(2026, 10, 18, 12)
+    rows = [LogRow(start + timedelta(seconds=(i + 1) // 2), 1, 'event', None, None, '', f'line {i}', None, None)
+            for i in range(count)]
+    return sorted(rows, key=lambda row: row.timestamp, reverse=True)
+
+
+def store_rows(rows, task_id=None):
+    parsed = ParsedOutput(rows, len(rows), 0.0, 0.0, [])
+    return final_working_collector.store_switch_rows(
+        'sw1', 'c1', parsed, {'parse_seconds': 0.0}, CollectionProgress(), datetime.utcnow(), 0.0, task_id)
+
+
+def test_lease_lost_halfway_leaves_a_clean_high_water_mark(store, monkeypatch):
+    """Il nuovo owner riparte dall'ultimo timestamp committato e insieme coprono tutte le righe"""
+    checks = []
+
+    def check_lease(task_id, owner):
+        checks.append((task_id, owner))
+        if len(checks) == 3:
+            raise LeaseLost(f"Task {task_id} lease lost")
+
+    monkeypatch.setattr(final_working_collector, 'check_lease', check_lease)
+    rows = make_rows(401)
+    result = store_rows(rows, task_id=7)
+
+    assert not result['success'] and 'lease lost' in result['error']
+    assert checks == [(7, 'worker-a')] * 3
+    committed = [(entry.timestamp, entry.raw_line) for entry in store.committed]
+    assert len(committed) == 201
+    assert store.pending == []
+
+    # Come build_rows con since = last_entry_timestamp(): solo le righe più recenti dell'ultima committata
+    since = max(timestamp for timestamp, _ in committed)
+    remaining = [(row.timestamp, row.raw_line) for row in rows if row.timestamp > since]
+    assert sorted(committed + remaining) == sorted((row.timestamp, row.raw_line) for row in rows)
+
+
+class StoredStatus:
+    """SwitchStatus finto già presente: store_switch_rows ne aggiorna solo i campi"""
+
+    class query:
+        @staticmethod
+        def filter_by(**kwargs):
+            return StoredStatus.query
+
+        @staticmethod
+        def first():
+            return StoredStatus()
+
+
+def test_batches_never_split_a_timestamp(store, monkeypatch):
+    batches = []
+    monkeypatch.setattr(final_working_collector, 'check_lease',
+                        lambda task_id, owner: batches.append(len(store.pending)))
+    monkeypatch.setattr(final_working_collector, 'SwitchStatus', StoredStatus)
+    monkeypatch.setattr(final_working_collector, 'record_switch_run', lambda *args, **kwargs: {})
+
+    # Le righe 100 e 101 hanno lo stesso timestamp: il primo batch cresce a 101 invece di dividerle
+    rows = make_rows(103)
+    result = store_rows(rows, task_id=7)
+
+    assert result['success'] and result['inserted_count'] == 103
+    assert batches == [101, 2]
+    assert [entry.timestamp for entry in store.committed] == sorted(row.timestamp for row in rows)
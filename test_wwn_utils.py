@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test della normalizzazione WWN in interi BIGINT ordinati
+Parsing, formato canonico, bias signed/unsigned e range di ricerca per prefisso
+"""
+
+from wwn_utils import (WWN_BIAS, db_to_wwn, format_wwn, normalize_wwn, parse_wwn, wwn_search_range,
+                       wwn_to_db)
+
+BIGINT_MIN = -(1 << 63)
+BIGINT_MAX = (1 << 63) - 1
+
+
+def test_parse_wwn_accepts_common_notations():
+    """Due punti, trattini, punti, spazi e maiuscole danno lo stesso valore"""
+    expected = 0x100000109b0186aa
+    for text in ('10:00:00:10:9b:01:86:aa', '10-00-00-10-9B-01-86-AA', '1000.0010.9b01.86aa',
+                 '100000109b0186aa', ' 10 00 00 10 9b 01 86 aa '):
+        assert parse_wwn(text) == expected
+
+
+def test_parse_wwn_rejects_non_wwn_values():
+    """Valori non WWN (NA, troppo corti/lunghi, non esadecimali) non hanno forma intera"""
+    for text in (None, '', 'NA', '10:00:00:10:9b:01:86', '10:00:00:10:9b:01:86:aa:00', 'zz:00:00:10:9b:01:86:aa'):
+        assert parse_wwn(text) is None
+
+
+def test_format_wwn_is_canonical():
+    assert format_wwn(0x100000109b0186aa) == '10:00:00:10:9b:01:86:aa'
+    assert format_wwn(0) == '00:00:00:00:00:00:00:00'
+
+
+def test_bias_round_trip_and_bigint_bounds():
+    """Il bias mantiene l'ordine e gli estremi rientrano nel BIGINT signed"""
+    for wwn in (0, 1, WWN_BIAS - 1, WWN_BIAS, (1 << 64) - 1, 0x100000109b0186aa, 0xc05076ffe5004b21):
+        assert db_to_wwn(wwn_to_db(wwn)) == wwn
+        assert BIGINT_MIN <= wwn_to_db(wwn) <= BIGINT_MAX
+    assert wwn_to_db(0) == BIGINT_MIN
+    assert wwn_to_db((1 << 64) - 1) == BIGINT_MAX
+    values = [0x100000109b0186aa, 0x200000109b0186aa, 0xc05076ffe5004b21, 0xffffffffffffffff]
+    assert sorted(values, key=wwn_to_db) == values
+
+
+def test_normalize_wwn():
+    """Un WWN diventa (intero per il database, testo canonico); il resto resta invariato"""
+    assert normalize_wwn('10-00-00-10-9B-01-86-AA') == (0x100000109b0186aa - WWN_BIAS, '10:00:00:10:9b:01:86:aa')
+    assert normalize_wwn('NA') == (None, 'NA')
+    assert normalize_wwn(None) == (None, None)
+
+
+def test_wwn_search_range_full_wwn_is_equality():
+    value = wwn_to_db(0x100000109b0186aa)
+    assert wwn_search_range('10:00:00:10:9b:01:86:aa') == (value, value)
+
+
+def test_wwn_search_range_prefix_covers_every_match():
+    """Un prefisso copre esattamente i WWN che iniziano con esso"""
+    low, high = wwn_search_range('10:00:00:10')
+    assert (low, high) == (wwn_to_db(0x1000001000000000), wwn_to_db(0x10000010ffffffff))
+    assert low <= wwn_to_db(parse_wwn('10:00:00:10:9b:01:86:aa')) <= high
+    assert not low <= wwn_to_db(parse_wwn('10:00:00:11:00:00:00:00')) <= high
+
+
+def test_wwn_search_range_extremes():
+    """Prefissi agli estremi dello spazio WWN restano dentro il BIGINT"""
+    assert wwn_search_range('f') == (wwn_to_db(0xf000000000000000), BIGINT_MAX)
+    assert wwn_search_range('0') == (BIGINT_MIN, wwn_to_db(0x0fffffffffffffff))
+
+
+def test_wwn_search_range_rejects_non_hex():
+    for term in (None, '', 'HOST_A', '10:00:00:10:9b:01:86:aa:00', 'xyz'):
+        assert wwn_search_range(term) is None
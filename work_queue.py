@@ -0,0 +1,428 @@
+"""
+Collection Work Queue for Switch Log Analyzer
+Per-switch tasks of a collection run in collection_tasks, claimed with
+FOR UPDATE SKIP LOCKED under a heartbeated lease, so any number of processes
+on any host can drain one run; the last task to finish completes the CollectionRun.
+Runs submitted by the web app for collector_daemon.py wait in collection_requests.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import text
+
+from adaptive_concurrency import switch_site
+from config import Config
+from models import db, CollectionRequest, CollectionRun, CollectionTask
+from search_cache import notify_log_entries_changed
+
+logger = logging.getLogger(__name__)
+
+# A running task whose lease is not extended for this long is given to another process
+LEASE_SECONDS = Config.COLLECTION_TASK_LEASE_SECONDS
+
+# Leases are extended several times per lease so one slow heartbeat never loses a task
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+
+# Claims per task (first run plus requeues after an expired lease) before it is failed
+MAX_ATTEMPTS = Config.COLLECTION_TASK_MAX_ATTEMPTS
+
+# Seconds between queue polls while idle or waiting for other processes' tasks
+POLL_INTERVAL = 5
+
+UNFINISHED = ('pending', 'running')
+
+# Times are taken from the database clock, never from the (possibly skewed) host clock
+DB_NOW = "(now() AT TIME ZONE 'utc')"
+
+CLAIM_SQL = text(f"""
+    WITH next AS (
+        SELECT id FROM collection_tasks
+        WHERE status = 'pending'
+          AND (CAST(:collection_id AS varchar) IS NULL OR collection_id = :collection_id)
+          AND NOT (site = ANY(CAST(:full_sites AS varchar[])))
+        ORDER BY position, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE collection_tasks t
+    SET status = 'running', lease_owner = :owner, attempts = t.attempts + 1,
+        claimed_at = {DB_NOW}, heartbeat_at = {DB_NOW},
+        lease_expires_at = {DB_NOW} + make_interval(secs => :lease)
+    FROM next
+    WHERE t.id = next.id
+    RETURNING t.id, t.collection_id, t.switch_info, t.switch_name, t.attempts
+""")
+
+HEARTBEAT_SQL = text(f"""
+    UPDATE collection_tasks
+    SET heartbeat_at = {DB_NOW}, lease_expires_at = {DB_NOW} + make_interval(secs => :lease)
+    WHERE id = ANY(:ids) AND lease_owner = :owner AND status = 'running'
+    RETURNING id
+""")
+
+COMPLETE_SQL = text(f"""
+    UPDATE collection_tasks
+    SET status = :status, completed_at = {DB_NOW}, lease_expires_at = NULL,
+        inserted_count = :inserted_count, total_entries = :total_entries, error = :error
+    WHERE id = :id AND lease_owner = :owner AND status = 'running'
+""")
+
+# Taken in each insert transaction: the row lock holds off requeue_expired until that batch is committed
+LEASE_CHECK_SQL = text(f"""
+    SELECT id FROM collection_tasks
+    WHERE id = :id AND lease_owner = :owner AND status = 'running' AND lease_expires_at > {DB_NOW}
+    FOR SHARE
+""")
+
+REQUEUE_SQL = text(f"""
+    UPDATE collection_tasks
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+        error = CASE WHEN attempts >= :max_attempts
+                     THEN 'Lease expired after ' || attempts || ' attempts (last owner ' || lease_owner || ')'
+                     ELSE error END,
+        completed_at = CASE WHEN attempts >= :max_attempts THEN {DB_NOW} END,
+        lease_owner = NULL, lease_expires_at = NULL
+    WHERE status = 'running' AND lease_expires_at < {DB_NOW}
+    RETURNING collection_id, switch_name, status
+""")
+
+# Oldest queued request first; its password is returned once and cleared in the same statement
+CLAIM_REQUEST_SQL = text(f"""
+    WITH next AS (
+        SELECT id, password FROM collection_requests
+        WHERE status = 'queued' AND requested_at > {DB_NOW} - make_interval(mins => :ttl)
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE collection_requests r
+    SET status = 'started', claimed_by = :owner, started_at = {DB_NOW}, password = NULL
+    FROM next
+    WHERE r.id = next.id
+    RETURNING r.id, r.source, r.username, next.password
+""")
+
+# Requests the daemon did not claim within the TTL lose their password; no other row keeps one
+EXPIRE_REQUESTS_SQL = text(f"""
+    UPDATE collection_requests
+    SET status = CASE WHEN status = 'queued' THEN 'expired' ELSE status END,
+        error = CASE WHEN status = 'queued'
+                     THEN 'Not claimed by a collector daemon within ' || :ttl || ' minutes'
+                     ELSE error END,
+        completed_at = CASE WHEN status = 'queued' THEN {DB_NOW} ELSE completed_at END,
+        password = NULL
+    WHERE password IS NOT NULL
+      AND (status <> 'queued' OR requested_at <= {DB_NOW} - make_interval(mins => :ttl))
+    RETURNING id, status
+""")
+
+
+def worker_id() -> str:
+    """Lease owner of this process (host:pid, recomputed after fork)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_tasks(collection_id: str, switches: List[str]) -> int:
+    """One pending task per switches.conf entry, claimed in list order"""
+    for position, switch_info in enumerate(switches):
+        parts = switch_info.split(':')
+        db.session.add(CollectionTask(
+            collection_id=collection_id,
+            switch_info=switch_info,
+            switch_name=parts[1] if len(parts) >= 2 else switch_info,
+            site=switch_site(switch_info),
+            position=position
+        ))
+    db.session.commit()
+    logger.info(f"QUEUE: Enqueued {len(switches)} tasks for collection {collection_id}")
+    return len(switches)
+
+
+def claim_task(owner: str, collection_id: Optional[str] = None,
+               full_sites: Iterable[str] = ()) -> Optional[Dict]:
+    """
+    Atomically take the next pending task (of one run, or of any run)
+
+    Rows locked by a concurrent claim are skipped rather than waited for, so
+    claimers on any number of hosts never block each other. Tasks of sites in
+    full_sites are left for later.
+    """
+    row = db.session.execute(CLAIM_SQL, {
+        'owner': owner, 'lease': LEASE_SECONDS, 'collection_id': collection_id,
+        'full_sites': list(full_sites),
+    }).first()
+    db.session.commit()
+    return dict(row._mapping) if row else None
+
+
+def complete_task(task_id: int, owner: str, result: Dict) -> bool:
+    """
+    Store a task's outcome; False when its lease was lost (another process may redo it)
+
+    process_single_switch results are stored as is; the run is completed
+    here when this was its last unfinished task.
+    """
+    updated = db.session.execute(COMPLETE_SQL, {
+        'id': task_id, 'owner': owner,
+        'status': 'completed' if result.get('success') else 'failed',
+        'inserted_count': result.get('inserted_count', 0),
+        'total_entries': result.get('total_entries', 0),
+        'error': result.get('error'),
+    }).rowcount
+    db.session.commit()
+    if not updated:
+        logger.warning(f"QUEUE: Lease of task {task_id} was lost before completion, outcome discarded")
+    return bool(updated)
+
+
+class LeaseLost(Exception):
+    """The task's lease expired; another process may be collecting its switch now"""
+
+
+def check_lease(task_id: int, owner: str):
+    """Raise LeaseLost unless owner still holds the task (call inside the transaction it guards)"""
+    if lease_keeper.is_lost(task_id) or db.session.execute(LEASE_CHECK_SQL, {
+            'id': task_id, 'owner': owner}).first() is None:
+        raise LeaseLost(f"Lease of task {task_id} lost, stopped storing rows")
+
+
+def requeue_expired() -> int:
+    """Give tasks whose owner stopped heartbeating back to the queue (or fail them after MAX_ATTEMPTS)"""
+    rows = db.session.execute(REQUEUE_SQL, {'max_attempts': MAX_ATTEMPTS}).fetchall()
+    db.session.commit()
+    for row in rows:
+        logger.warning(f"QUEUE: Lease of {row.switch_name} ({row.collection_id}) expired, task {row.status}")
+    for collection_id in {row.collection_id for row in rows if row.status == 'failed'}:
+        finalize_collection(collection_id)
+    return len(rows)
+
+
+def unfinished_task_count(collection_id: str) -> int:
+    return CollectionTask.query.filter(
+        CollectionTask.collection_id == collection_id,
+        CollectionTask.status.in_(UNFINISHED)
+    ).count()
+
+
+def get_collection_tasks(collection_id: str) -> List[Dict]:
+    """Tasks of one run in claim order"""
+    tasks = (CollectionTask.query
+             .filter(CollectionTask.collection_id == collection_id)
+             .order_by(CollectionTask.position, CollectionTask.id)
+             .all())
+    return [task.to_dict() for task in tasks]
+
+
+def get_task_progress(collection_id: str) -> Dict:
+    """Switch counts of a run from its tasks, for progress shown by processes not running it"""
+    tasks = (db.session.query(CollectionTask.switch_name, CollectionTask.status,
+                              CollectionTask.lease_owner, CollectionTask.inserted_count)
+             .filter(CollectionTask.collection_id == collection_id)
+             .all())
+    return {
+        'switches_total': sum(1 for t in tasks if t.status != 'canceled'),
+        'switches_done': sum(1 for t in tasks if t.status in ('completed', 'failed')),
+        'switches_failed': sum(1 for t in tasks if t.status == 'failed'),
+        'inserted': sum(t.inserted_count or 0 for t in tasks),
+        'running': [{'switch_name': t.switch_name, 'worker': t.lease_owner} for t in tasks if t.status == 'running'],
+    }
+
+
+def finalize_collection(collection_id: str) -> bool:
+    """
+    Complete a running CollectionRun once none of its tasks is pending or running
+
+    The run row is locked first, so among processes finishing their last
+    tasks at the same time exactly one aggregates the result.
+    """
+    try:
+        run = (CollectionRun.query
+               .filter(CollectionRun.id == collection_id, CollectionRun.status == 'running')
+               .with_for_update()
+               .first())
+        if run is None or unfinished_task_count(collection_id):
+            db.session.rollback()
+            return False
+
+        tasks = (CollectionTask.query
+                 .filter(CollectionTask.collection_id == collection_id)
+                 .order_by(CollectionTask.completed_at, CollectionTask.id)
+                 .all())
+        total_inserted = sum(task.inserted_count or 0 for task in tasks)
+        run.status = 'completed'
+        run.completed_at = db.session.execute(text(f"SELECT {DB_NOW}")).scalar()
+        run.total_entries = total_inserted
+        run.new_entries = total_inserted
+        run.switches_processed = [
+            task.switch_name if task.status == 'completed' else f"{task.switch_name} (failed)"
+            for task in tasks if task.status != 'canceled'
+        ]
+        notify_log_entries_changed(db.session, 'collection completed')
+        db.session.commit()
+        logger.info(f"QUEUE: Collection {collection_id} completed by {worker_id()}: "
+                    f"{total_inserted} entries from {len(tasks)} switches")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"QUEUE: Could not finalize collection {collection_id}: {e}")
+        return False
+
+
+def cancel_pending_tasks(collection_id: str, reason: str) -> int:
+    """Withdraw the tasks nobody claimed yet (the run failed or was aborted)"""
+    count = (CollectionTask.query
+             .filter(CollectionTask.collection_id == collection_id, CollectionTask.status == 'pending')
+             .update({'status': 'canceled', 'error': reason}, synchronize_session=False))
+    db.session.commit()
+    return count
+
+
+def _credential_cipher() -> Fernet:
+    """Fernet key derived from SECRET_KEY, which the web app and the collector daemon share"""
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(Config.SECRET_KEY.encode('utf-8')).digest()))
+
+
+def submit_collection_request(username: str, password: str, source: str = 'manual') -> int:
+    """Queue a collection for the collector daemon"""
+    expire_collection_requests()
+    collection_request = CollectionRequest(
+        source=source,
+        username=username,
+        password=_credential_cipher().encrypt(password.encode('utf-8')).decode('ascii')
+    )
+    db.session.add(collection_request)
+    db.session.commit()
+    logger.info(f"QUEUE: Collection request {collection_request.id} ({source}) queued for the collector daemon")
+    return collection_request.id
+
+
+def get_queued_collection_request() -> Optional[CollectionRequest]:
+    """Oldest request still waiting for the daemon (expired ones are retired first)"""
+    expire_collection_requests()
+    return (CollectionRequest.query
+            .filter(CollectionRequest.status == 'queued')
+            .order_by(CollectionRequest.id)
+            .first())
+
+
+def claim_collection_request(owner: str) -> Optional[Dict]:
+    """Take the oldest unexpired queued request with its decrypted credentials"""
+    expire_collection_requests()
+    row = db.session.execute(CLAIM_REQUEST_SQL, {'owner': owner, 'ttl': Config.COLLECTION_REQUEST_TTL_MINUTES}).first()
+    db.session.commit()
+    if row is None:
+        return None
+    claimed = dict(row._mapping)
+    try:
+        claimed['password'] = _credential_cipher().decrypt((claimed['password'] or '').encode('ascii')).decode('utf-8')
+    except InvalidToken:
+        logger.error(f"QUEUE: Collection request {claimed['id']} credentials could not be decrypted")
+        finish_collection_request(claimed['id'], {
+            'success': False,
+            'error': 'Stored credentials could not be decrypted (SECRET_KEY differs from the web app?)'
+        })
+        return None
+    return claimed
+
+
+def expire_collection_requests() -> int:
+    """Expire queued requests older than COLLECTION_REQUEST_TTL_MINUTES and drop any leftover password"""
+    rows = db.session.execute(EXPIRE_REQUESTS_SQL, {'ttl': Config.COLLECTION_REQUEST_TTL_MINUTES}).fetchall()
+    db.session.commit()
+    expired = [row.id for row in rows if row.status == 'expired']
+    if expired:
+        logger.warning(f"QUEUE: Collection requests {expired} expired before a collector daemon claimed them")
+    return len(expired)
+
+
+def finish_collection_request(request_id: int, result: Optional[Dict]):
+    """Record a request's outcome (result None = skipped, another collection was running)"""
+    collection_request = db.session.get(CollectionRequest, request_id)
+    if collection_request is None:
+        return
+    if result is None:
+        collection_request.status = 'skipped'
+        collection_request.error = 'Another collection was already running'
+    else:
+        collection_request.status = 'completed' if result.get('success') else 'failed'
+        collection_request.collection_id = result.get('collection_id')
+        collection_request.error = result.get('error')
+    collection_request.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+class LeaseKeeper:
+    """
+    Per-process heartbeat thread extending the leases of the tasks this process runs
+
+    Uses its own pooled connection, so heartbeats go on while the collector
+    threads are busy (or stuck) in SSH reads and inserts.
+    """
+
+    def __init__(self):
+        self._held = set()
+        self._lost = set()
+        self._lock = threading.Lock()
+        self._engine = None
+        self._pid = None
+
+    def start(self, engine):
+        """Start the heartbeat thread once per process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._engine = engine
+            self._held = set()
+            self._lost = set()
+            threading.Thread(target=self._run, name='collection-leases', daemon=True).start()
+
+    def hold(self, task_id: int):
+        with self._lock:
+            self._held.add(task_id)
+            self._lost.discard(task_id)
+
+    def release(self, task_id: int):
+        with self._lock:
+            self._held.discard(task_id)
+            self._lost.discard(task_id)
+
+    def is_lost(self, task_id: int) -> bool:
+        """True once a heartbeat found the task's lease taken away"""
+        with self._lock:
+            return task_id in self._lost
+
+    def _run(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                ids = list(self._held)
+            if not ids:
+                continue
+            try:
+                with self._engine.begin() as conn:
+                    renewed = {row.id for row in conn.execute(HEARTBEAT_SQL, {
+                        'ids': ids, 'owner': worker_id(), 'lease': LEASE_SECONDS})}
+                lost = set(ids) - renewed
+                with self._lock:
+                    # Checked by store_switch_rows before its next batch
+                    self._lost.update(lost & self._held)
+                for task_id in lost:
+                    logger.warning(f"QUEUE: Lease of task {task_id} lost (expired and requeued)")
+            except Exception as e:
+                logger.warning(f"QUEUE: Heartbeat failed: {e}")
+
+
+# Leases of the tasks running in this process
+lease_keeper = LeaseKeeper()
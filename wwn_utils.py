@@ -0,0 +1,78 @@
+"""
+WWN Utilities for Switch Log Analyzer
+Normalization of Fibre Channel World Wide Names to a compact 64-bit integer form
+"""
+
+import re
+from typing import Optional, Tuple
+
+# WWNs are unsigned 64-bit values but PostgreSQL BIGINT is signed. Storing
+# (wwn - 2**63) keeps the numeric order identical to the hex order, so a WWN
+# prefix always maps to one contiguous BIGINT range.
+WWN_BIAS = 1 << 63
+WWN_HEX_DIGITS = 16
+
+_SEPARATORS = re.compile(r'[:\-\.\s]')
+_HEX = re.compile(r'^[0-9a-f]+$')
+
+
+def _strip_wwn(value: str) -> str:
+    """Lowercase hex digits of a WWN with separators removed"""
+    return _SEPARATORS.sub('', value.strip().lower())
+
+
+def parse_wwn(value: Optional[str]) -> Optional[int]:
+    """Parse a full WWN in any common notation into its unsigned 64-bit value"""
+    if not value:
+        return None
+    digits = _strip_wwn(value)
+    if len(digits) != WWN_HEX_DIGITS or not _HEX.match(digits):
+        return None
+    return int(digits, 16)
+
+
+def format_wwn(wwn: int) -> str:
+    """Canonical text form: lowercase, colon separated (10:00:00:10:9b:01:86:aa)"""
+    digits = f"{wwn:016x}"
+    return ':'.join(digits[i:i + 2] for i in range(0, WWN_HEX_DIGITS, 2))
+
+
+def wwn_to_db(wwn: int) -> int:
+    """Unsigned WWN value -> order-preserving signed BIGINT"""
+    return wwn - WWN_BIAS
+
+
+def db_to_wwn(value: int) -> int:
+    """Signed BIGINT column value -> unsigned WWN value"""
+    return value + WWN_BIAS
+
+
+def normalize_wwn(value: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Normalize a WWN once at ingest
+
+    Returns (db_int, canonical_text). Values that are not a WWN (e.g. 'NA')
+    keep their original text and have no integer form.
+    """
+    wwn = parse_wwn(value)
+    if wwn is None:
+        return None, value
+    return wwn_to_db(wwn), format_wwn(wwn)
+
+
+def wwn_search_range(term: str) -> Optional[Tuple[int, int]]:
+    """
+    Translate WWN search input into an inclusive BIGINT range
+
+    A full WWN yields a single value (equality), a leading fragment such as
+    '10:00:00:10' yields the range of every WWN starting with it. Returns
+    None when the input is not hex digits and separators only.
+    """
+    digits = _strip_wwn(term or '')
+    if not digits or len(digits) > WWN_HEX_DIGITS or not _HEX.match(digits):
+        return None
+
+    free_bits = (WWN_HEX_DIGITS - len(digits)) * 4
+    low = int(digits, 16) << free_bits
+    high = low | ((1 << free_bits) - 1)
+    return wwn_to_db(low), wwn_to_db(high)